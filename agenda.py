@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from flask import abort
+
+from models import db, Artist, Venue, Show
+
+# ----------------------------------------------------------------------------#
+# Date-range calendar.
+#
+# Shows between two instants, optionally for one venue, artist or city,
+# ordered by (start_time, id) so that the range is read straight off
+# ix_shows_start_time_id (or ix_shows_venue_id_start_time for a venue), and
+# grouped by day as the rows stream out. Used by /calendar and
+# /api/v1/calendar.
+# ----------------------------------------------------------------------------#
+
+WINDOWS = ('today', 'weekend', 'week')
+DEFAULT_WINDOW = 'week'
+
+
+def named_window(name, now):
+    """ [start, end) of a named window around <now>. """
+    today = datetime.combine(now.date(), time.min)
+    if name == 'today':
+        return today, today + timedelta(days=1)
+    if name == 'weekend':
+        # Friday through Sunday; from today once the weekend has started.
+        weekday = today.weekday()
+        start = today + timedelta(days=4 - weekday) if weekday < 4 else today
+        return start, today + timedelta(days=7 - weekday)
+    return today, today + timedelta(days=7)
+
+
+def _parse_bound(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, '{} must be an ISO 8601 date or datetime'.format(name))
+
+
+def date_range(args, now=None):
+    """ [start, end) from ?from=&to= (ISO dates or datetimes, `to` exclusive)
+    or ?window=today|weekend|week.
+    """
+    now = now or datetime.now()
+    window = args.get('window')
+    if window:
+        if window not in WINDOWS:
+            abort(400, 'window must be one of {}'.format(', '.join(WINDOWS)))
+        return named_window(window, now)
+    if not args.get('from') and not args.get('to'):
+        return named_window(DEFAULT_WINDOW, now)
+
+    start = _parse_bound(args['from'], 'from') if args.get('from') else datetime.combine(now.date(), time.min)
+    if args.get('to'):
+        end = _parse_bound(args['to'], 'to')
+    else:
+        end = start + timedelta(days=7)
+    if end <= start:
+        abort(400, 'to must be after from')
+    return start, end
+
+
+def calendar_query(start, end, venue_id=None, artist_id=None, city=None, state=None):
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.duration_minutes,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.city,
+        Venue.state,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).filter(
+        Venue.id == Show.venue_id,
+        Artist.id == Show.artist_id,
+        Show.start_time >= start,
+        Show.start_time < end
+    )
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    return query
+
+
+def calendar_filters(args):
+    return {
+        'venue_id': args.get('venue_id', type=int),
+        'artist_id': args.get('artist_id', type=int),
+        'city': args.get('city') or None,
+        'state': args.get('state') or None,
+    }
+
+
+def show_key(show):
+    return show.start_time, show.id
+
+
+def group_by_day(shows):
+    """ (date, [shows]) pairs from shows ordered by start time. """
+    for day, day_shows in groupby(shows, key=lambda show: show.start_time.date()):
+        yield day, list(day_shows)
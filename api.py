@@ -0,0 +1,265 @@
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from agenda import calendar_filters, calendar_query, date_range, group_by_day, show_key
+from facets import facet_counts, facet_criteria, parse_facet_args
+from genres import genre_filter, genre_names, parse_genres
+from models import db, Artist, Venue, Show
+from pagination import KeysetPage, parse_cursor
+from query_budget import query_budget
+
+# ----------------------------------------------------------------------------#
+# JSON read API, version 1.
+#
+# Every resource is described by a Schema mapping public field names to the
+# columns they are read from. `?fields=` narrows the SELECT to the requested
+# columns (and only joins the tables those columns live in), and `?ids=`
+# fetches a batch of entities in a single query. Venue and artist listings
+# take `?genre=` (comma separated, any of); /browse/venues and
+# /browse/artists add the state, city and seeking filters and facet counts
+# (facets.py).
+# ----------------------------------------------------------------------------#
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+MAX_BATCH_IDS = 100
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Field(object):
+
+    def __init__(self, column, join=None, serialize=None):
+        self.column = column
+        # (model, onclause) the column needs joined in, if any.
+        self.join = join
+        self.serialize = serialize
+
+
+class Schema(object):
+
+    def __init__(self, model, fields, default_fields):
+        self.model = model
+        self.fields = fields
+        self.default_fields = default_fields
+
+    def select(self, requested):
+        """ The (name, Field) pairs named in a ?fields= value. """
+        if not requested:
+            names = self.default_fields
+        else:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                abort(400, 'Unknown fields: {}'.format(', '.join(unknown)))
+        # The id is always returned so that clients can correlate results.
+        if 'id' not in names:
+            names = ['id'] + list(names)
+        return [(name, self.fields[name]) for name in names]
+
+    def query(self, selected):
+        query = db.session.query(*[field.column.label(name) for name, field in selected]) \
+            .select_from(self.model)
+        joined = []
+        for _, field in selected:
+            if field.join is not None and field.join[0] not in joined:
+                query = query.join(*field.join)
+                joined.append(field.join[0])
+        return query
+
+    def dump(self, selected, row):
+        return {
+            name: field.serialize(value) if field.serialize else value
+            for (name, field), value in zip(selected, row)
+        }
+
+
+def _genre_list(value):
+    return sorted(value.split(',')) if value else []
+
+
+def _entity_fields(model, *names):
+    fields = {name: Field(getattr(model, name)) for name in names}
+    fields['genres'] = Field(genre_names(model), serialize=_genre_list)
+    return fields
+
+
+VENUE_SCHEMA = Schema(Venue, _entity_fields(
+    Venue, 'id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+    'website', 'seeking_talent', 'seeking_description', 'upcoming_shows_count',
+    'past_shows_count'
+), default_fields=['id', 'name', 'city', 'state', 'upcoming_shows_count'])
+
+ARTIST_SCHEMA = Schema(Artist, _entity_fields(
+    Artist, 'id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website',
+    'seeking_venue', 'seeking_description', 'upcoming_shows_count', 'past_shows_count'
+), default_fields=['id', 'name', 'city', 'state', 'upcoming_shows_count'])
+
+SHOW_SCHEMA = Schema(Show, {
+    'id': Field(Show.id),
+    'start_time': Field(Show.start_time, serialize=_isoformat),
+    'duration_minutes': Field(Show.duration_minutes),
+    'upcoming': Field(Show.upcoming),
+    'venue_id': Field(Show.venue_id),
+    'artist_id': Field(Show.artist_id),
+    'venue_name': Field(Venue.name, join=(Venue, Venue.id == Show.venue_id)),
+    'venue_image_link': Field(Venue.image_link, join=(Venue, Venue.id == Show.venue_id)),
+    'artist_name': Field(Artist.name, join=(Artist, Artist.id == Show.artist_id)),
+    'artist_image_link': Field(Artist.image_link, join=(Artist, Artist.id == Show.artist_id)),
+}, default_fields=['id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name'])
+
+
+def _int_list(value, name):
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        abort(400, '{} must be a comma separated list of integers'.format(name))
+    if len(ids) > MAX_BATCH_IDS:
+        abort(400, 'At most {} ids per request'.format(MAX_BATCH_IDS))
+    return ids
+
+
+def _list(schema, key_columns, after, row_key, filters=(), **extra):
+    """ Batch lookup when ?ids= is given, a keyset-paginated listing otherwise.
+    <extra> is added to the response.
+    """
+    selected = schema.select(request.args.get('fields'))
+    query = schema.query(selected).filter(*filters)
+
+    ids = request.args.get('ids')
+    if ids is not None:
+        rows = query.filter(schema.model.id.in_(_int_list(ids, 'ids'))) \
+            .order_by(schema.model.id).all()
+        return jsonify(data=[schema.dump(selected, row) for row in rows], **extra)
+
+    limit = request.args.get('limit', current_app.config['PER_PAGE'], type=int)
+    limit = max(1, min(limit, current_app.config['PER_PAGE'] * 10))
+    # The keyset needs the sort columns in every row, selected or not.
+    query = query.add_columns(*[column.label('_key_{}'.format(i)) for i, column in enumerate(key_columns)])
+    page = KeysetPage(query, key_columns, after, limit, row_key)
+    data = [schema.dump(selected, row) for row in page]
+    return jsonify(data=data, next=page.next_cursor, **extra)
+
+
+def _detail(schema, entity_id):
+    selected = schema.select(request.args.get('fields'))
+    row = schema.query(selected).filter(schema.model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    return jsonify(data=schema.dump(selected, row))
+
+
+def _entity_key(row):
+    return (row._key_0,)
+
+
+def _genre_filters(model):
+    genres = parse_genres(request.args.get('genre'))
+    return [genre_filter(model, genres)] if genres else []
+
+
+def _browse(schema):
+    """ A listing filtered by ?state=, ?city=, ?genre= and the seeking flag,
+    with the facet counts of the whole selection.
+    """
+    try:
+        selection = parse_facet_args(schema.model, request.args)
+    except ValueError as error:
+        abort(400, str(error))
+    after = parse_cursor(request.args.get('after'), int)
+    return _list(schema, (schema.model.id,), after, _entity_key, facet_criteria(schema.model, selection),
+                 facets=facet_counts(schema.model, selection))
+
+
+@api_v1.route('/venues')
+@query_budget(1)
+def list_venues():
+    after = parse_cursor(request.args.get('after'), int)
+    return _list(VENUE_SCHEMA, (Venue.id,), after, _entity_key, _genre_filters(Venue))
+
+
+@api_v1.route('/browse/venues')
+@query_budget(3)
+def browse_venues():
+    return _browse(VENUE_SCHEMA)
+
+
+@api_v1.route('/venues/<int:venue_id>')
+@query_budget(1)
+def get_venue(venue_id):
+    return _detail(VENUE_SCHEMA, venue_id)
+
+
+@api_v1.route('/artists')
+@query_budget(1)
+def list_artists():
+    after = parse_cursor(request.args.get('after'), int)
+    return _list(ARTIST_SCHEMA, (Artist.id,), after, _entity_key, _genre_filters(Artist))
+
+
+@api_v1.route('/browse/artists')
+@query_budget(3)
+def browse_artists():
+    return _browse(ARTIST_SCHEMA)
+
+
+@api_v1.route('/artists/<int:artist_id>')
+@query_budget(1)
+def get_artist(artist_id):
+    return _detail(ARTIST_SCHEMA, artist_id)
+
+
+@api_v1.route('/shows')
+@query_budget(1)
+def list_shows():
+    filters = []
+    for param, column in (('venue_id', Show.venue_id), ('artist_id', Show.artist_id)):
+        if request.args.get(param):
+            filters.append(column.in_(_int_list(request.args[param], param)))
+    after = parse_cursor(request.args.get('after'), datetime.fromisoformat, int)
+    return _list(SHOW_SCHEMA, (Show.start_time, Show.id), after,
+                 lambda row: (row._key_0, row._key_1), filters)
+
+
+@api_v1.route('/shows/<int:show_id>')
+@query_budget(1)
+def get_show(show_id):
+    return _detail(SHOW_SCHEMA, show_id)
+
+
+@api_v1.route('/calendar')
+@query_budget(1)
+def calendar():
+    start, end = date_range(request.args)
+    after = parse_cursor(request.args.get('after'), datetime.fromisoformat, int)
+    limit = request.args.get('limit', current_app.config['PER_PAGE'], type=int)
+    limit = max(1, min(limit, current_app.config['PER_PAGE'] * 10))
+    page = KeysetPage(calendar_query(start, end, **calendar_filters(request.args)),
+                      (Show.start_time, Show.id), after, limit, show_key)
+    days = [{
+        'date': day.isoformat(),
+        'shows': [{
+            'id': show.id,
+            'start_time': show.start_time.isoformat(),
+            'duration_minutes': show.duration_minutes,
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'city': show.city,
+            'state': show.state,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+        } for show in day_shows]
+    } for day, day_shows in group_by_day(page)]
+    return jsonify(data=days, next=page.next_cursor, start=start.isoformat(), end=end.isoformat())
+
+
+# Registered per code: the app's own 404/500 handlers render HTML pages and
+# would otherwise take precedence over a class-based handler.
+@api_v1.errorhandler(400)
+@api_v1.errorhandler(404)
+@api_v1.errorhandler(405)
+def api_error(error):
+    return jsonify(error=error.name, message=error.description), error.code
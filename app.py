@@ -2,12 +2,15 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
+from datetime import datetime
+from functools import lru_cache
+import os
 from flask import (
+    Blueprint,
     Flask,
+    current_app,
     render_template,
+    stream_template,
     request,
     Response,
     flash,
@@ -15,52 +18,171 @@ from flask import (
     url_for,
     abort
 )
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
+from agenda import calendar_filters, calendar_query, date_range, group_by_day, show_key
+from api import api_v1
+from config import get_config
+from exporter import exports
+from facets import init_facets
+from forms import ArtistForm, ShowForm, VenueForm, apply_rules
+from genres import genre_names, genres_named, parse_genres
 from models import db, Artist, Venue, Show
+from pages import (
+    artist_list_query,
+    entity_page,
+    entity_query,
+    entity_shows_queries,
+    name_search_query,
+    search_results,
+    show_item,
+    show_list_query,
+    venue_areas,
+    venue_directory_query
+)
+from page_cache import (
+    artist_page_keys,
+    cached_page,
+    init_page_cache,
+    invalidate_pages,
+    page_key,
+    venue_page_keys
+)
+from importer import init_importer
+from matchmaking import init_matchmaking
+from metrics import init_metrics
+from pagination import KeysetPage, parse_cursor
+from query_budget import init_query_budget, query_budget
+from replicas import init_replicas, replica_read
+from scheduling import DEFAULT_SHOW_DURATION, find_conflicts
+from seed import init_seed
+from show_counters import init_show_counters
+from typeahead import count_upcoming_show, index_name, init_typeahead, unindex_name
+from validation import ARTIST_RULES, SHOW_RULES, VENUE_RULES
+from venue_directory import directory_state_query, init_venue_directory, serve_venue_directory
 
 # ----------------------------------------------------------------------------#
 # App Config.
+#
+# create_app() builds an app per call; nothing touches the database or the
+# filesystem at import time. The schema is managed by migrations
+# (`flask db upgrade`); `flask init-db` builds it on an empty database.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-# TODO: connect to a local postgresql database
-db.init_app(app)
-migrate = Migrate(app, db)
-
-with app.app_context():
-    db.create_all()
+main = Blueprint('main', __name__)
+
+
+def create_app(config=None):
+    """ The app for a config class or object, or a config name from
+    config.py; $FYYUR_ENV picks one by default.
+    """
+    app = Flask(__name__)
+    if config is None or isinstance(config, str):
+        config = get_config(config)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    init_replicas(app, db)
+    init_migrations(app)
+    init_show_counters(app)
+    init_venue_directory(app)
+    init_metrics(app, db)
+    init_query_budget(app)
+    init_page_cache(app)
+    init_facets(app)
+    init_typeahead(app)
+    init_matchmaking(app)
+    init_seed(app)
+    init_importer(app)
+    init_database_commands(app)
+    app.register_blueprint(main)
+    app.register_blueprint(api_v1)
+    app.register_blueprint(exports)
+    app.jinja_env.filters['datetime'] = format_datetime
+
+    if not app.debug and not app.testing:
+        init_file_logging(app)
+    return app
+
+
+def init_migrations(app):
+    """ Flask-Migrate, for `flask db ...` only.
+
+    Importing it imports alembic, which is most of the import time left after
+    deferring babel. The `db` command group is loaded by the flask CLI, which
+    sets FLASK_RUN_FROM_CLI before creating the app; app servers never need it.
+    """
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+
+def init_database_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the schema on an empty database and mark it as migrated.
+
+        The first migration expects tables from before migrations were
+        used, so an empty database cannot be built by upgrading.
+        """
+        from flask_migrate import stamp
+        db.create_all()
+        stamp()
+
+
+def init_file_logging(app):
+    file_handler = FileHandler('error.log')
+    file_handler.setFormatter(
+        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    )
+    app.logger.setLevel(logging.INFO)
+    file_handler.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+    app.logger.info('errors')
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def compiled_datetime_format(format, locale):
+    """ Parsed babel pattern and locale for a (format, locale) pair. """
+    # Babel is imported on first use; it is slow to import.
+    import babel
+    import babel.dates
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+def format_datetime(value, format='medium'):
+    # Views pass datetimes straight through; strings are still accepted.
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    pattern, locale = compiled_datetime_format(format, 'en')
+    return pattern.apply(value, locale)
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
-@app.route('/')
+def flash_form_errors(form):
+    for name, messages in form.errors.items():
+        for message in messages:
+            flash('{}: {}'.format(form[name].label.text, message))
+
+
+@main.route('/')
+@query_budget(0)
 def index():
     return render_template('pages/home.html')
 
@@ -68,125 +190,72 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@replica_read
+@query_budget(2)
 def venues():
     # TODO: replace with real venues' data.
     #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
+    genres = request.args.getlist('genre')
+    precomputed = serve_venue_directory(db.session.execute(directory_state_query()).first())
+    data = venue_areas(venue_directory_query(genres, precomputed))
+    return render_template('pages/venues.html', areas=data, genres=genres)
+
 
-    venue_areas = Venue.query.all()
-    data = []
-    locations = Venue.query.distinct(Venue.city, Venue.state).all()
-    for location in locations:
-        data.append({
-            "city": location.city,
-            "state": location.state,
-            "venues": [{
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len([show for show in venue.shows if show.start_time > datetime.now()])
-            } for venue in venue_areas if
-                venue.city == location.city and venue.state == location.state]
-        })
-
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
+@replica_read
+@query_budget(1)
 def search_venues():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # search for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
     search_term = request.form['search_term']
-    search = "%{}%".format(search_term)
-
-    venues = Venue.query.with_entities(Venue.id, Venue.name) \
-        .filter(Venue.name.match(search)).all()
-    response = {
-        "count": len(search_term),
-        "data": []
-    }
-    for venue in venues:
-        upcoming_shows = db.session.query(Show).filter(Show.venue_id == venue.id) \
-            .filter(Show.start_time > datetime.now()).all()
-
-        response["data"].append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(upcoming_shows)
-        })
-    return render_template('pages/search_venues.html', results=response,
+    venues = name_search_query(Venue, search_term, request.form.getlist('genre'),
+                               db.engine.dialect.name).all()
+    return render_template('pages/search_venues.html', results=search_results(venues),
                            search_term=search_term)
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@replica_read
+@query_budget(3)
+@cached_page('venue')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
-
-    venue = Venue.query.get(venue_id)
-    past_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(
-        Show.start_time < datetime.now()).all()
-
-    past_shows_data = []
-
-    for show in past_shows_query:
-        temp_shows_data = {
-            'venue_id': show.artist_id,
-            'venue_name': show.artist.name,
-            'venue_image_link': show.artist.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        past_shows_data.append(temp_shows_data)
-
-    upcoming_shows_query = db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(
-        Show.start_time > datetime.now()).all()
-
-    upcoming_shows_data = []
-    for show in upcoming_shows_query:
-        temp_shows_data = {
-            'venue_id': show.artist_id,
-            'venue_name': show.artist.name,
-            'venue_image_link': show.artist.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        upcoming_shows_data.append(temp_shows_data)
-
-    past_shows_count = len(past_shows_data)
-    upcoming_shows_count = len(upcoming_shows_data)
-
-    data = vars(venue)
-
-    data['past_shows'] = past_shows_data
-    data['upcoming_shows'] = upcoming_shows_data
-    data['past_shows_count'] = past_shows_count
-    data['upcoming_shows_count'] = upcoming_shows_count
-
-    return render_template('pages/show_artist.html', artist=data)
+    venue, venue_genres = entity_query(Venue, venue_id).first_or_404()
+    past_shows, upcoming_shows = entity_shows_queries(Venue, venue_id, datetime.now())
+    data = entity_page(Venue, venue, venue_genres, past_shows, upcoming_shows)
+    return render_template('pages/show_venue.html', venue=data)
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
+    form = VenueForm(request.form)
+    if not apply_rules(form, VENUE_RULES):
+        flash_form_errors(form)
+        return render_template('forms/new_venue.html', form=form)
+
     try:
-        form = VenueForm(request.form)
         venue = Venue(
             name=form.name.data,
             city=form.city.data,
             state=form.state.data,
             address=form.address.data,
             phone=form.phone.data,
-            genres=form.genres.data,
+            genres=genres_named(form.genres.data),
             facebook_link=form.facebook_link.data,
             image_link=form.image_link.data,
             website=form.website_link.data,
@@ -195,6 +264,7 @@ def create_venue_submission():
         )
         db.session.add(venue)
         db.session.commit()
+        index_name('venue', venue.id, form.name.data, 0)
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
 
@@ -210,17 +280,25 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
     error = False
 
-    deleted_venue = Venue.query.get(venue_id)
+    # The cascade deletes every show, so fetch them in one extra query.
+    deleted_venue = Venue.query.options(selectinload(Venue.shows)).get_or_404(venue_id)
     venueName = deleted_venue.name
+    stale_pages = [page_key('venue', venue_id)] + \
+                  [page_key('artist', show.artist_id) for show in deleted_venue.shows]
+    upcoming_artists = [show.artist_id for show in deleted_venue.shows if show.upcoming]
     try:
         db.session.delete(deleted_venue)
         db.session.commit()
+        invalidate_pages(stale_pages)
+        unindex_name('venue', venue_id)
+        for artist_id in upcoming_artists:
+            count_upcoming_show(venue_id, artist_id, -1)
         flash('Venue ' + venueName + ' was successfully deleted!')
     except():
         db.session.rollback()
@@ -234,107 +312,67 @@ def delete_venue(venue_id):
 
         # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
         # clicking that button deletes it from the db then redirect the user to the homepage
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@replica_read
+@query_budget(1)
 def artists():
     # TODO: replace with real data returned from querying the database
 
-    data = []
-
-    artist_data = Artist.query.with_entities(Artist.id, Artist.name).order_by('id').all()
+    after = parse_cursor(request.args.get('after'), int)
+    genres = request.args.getlist('genre')
+    page = KeysetPage(
+        artist_list_query(genres),
+        (Artist.id,), after, current_app.config['PER_PAGE'],
+        row_key=lambda artist: (artist.id,)
+    )
 
-    for artist in artist_data:
-        data.append({
-            'id': artist.id,
-            'name': artist.name
-        })
-    return render_template('pages/artists.html', artists=data)
+    data = ({
+        'id': artist.id,
+        'name': artist.name
+    } for artist in page)
+    return Response(stream_template('pages/artists.html', artists=data, page=page, genres=genres))
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@replica_read
+@query_budget(1)
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
 
     search_term = request.form['search_term']
-    search = "%{}%".format(search_term)
-
-    artists = Artist.query.with_entities(Artist.id, Artist.name) \
-        .filter(Artist.name.match(search)).all()
-    response = {
-        "count": len(search_term),
-        "data": []
-    }
-    for artist in artists:
-        upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist.id) \
-            .filter(Show.start_time > datetime.now()).all()
-
-        response["data"].append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len(upcoming_shows)
-        })
-
-    return render_template('pages/search_artists.html', results=response,
+    artists = name_search_query(Artist, search_term, request.form.getlist('genre'),
+                                db.engine.dialect.name).all()
+    return render_template('pages/search_artists.html', results=search_results(artists),
                            search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@replica_read
+@query_budget(3)
+@cached_page('artist')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     # TODO: replace with real artist data from the artist table, using artist_id
-
-    artist = Artist.query.get(artist_id)
-    past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(
-        Show.start_time < datetime.now()).all()
-
-    past_shows_data = []
-
-    for show in past_shows_query:
-        temp_shows_data = {
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'venue_image_link': show.venue.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        past_shows_data.append(temp_shows_data)
-
-    upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(
-        Show.start_time > datetime.now()).all()
-
-    upcoming_shows_data = []
-    for show in upcoming_shows_query:
-        temp_shows_data = {
-            'venue_id': show.venue_id,
-            'venue_name': show.venue.name,
-            'venue_image_link': show.venue.image_link,
-            'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        upcoming_shows_data.append(temp_shows_data)
-
-    past_shows_count = len(past_shows_data)
-    upcoming_shows_count = len(upcoming_shows_data)
-
-    data = vars(artist)
-
-    data['past_shows'] = past_shows_data
-    data['upcoming_shows'] = upcoming_shows_data
-    data['past_shows_count'] = past_shows_count
-    data['upcoming_shows_count'] = upcoming_shows_count
-
+    artist, artist_genres = entity_query(Artist, artist_id).first_or_404()
+    past_shows, upcoming_shows = entity_shows_queries(Artist, artist_id, datetime.now())
+    data = entity_page(Artist, artist, artist_genres, past_shows, upcoming_shows)
     return render_template('pages/show_artist.html', artist=data)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_artist(artist_id):
-    artist = Artist.query.filter(Artist.id == artist_id).first()
+    artist, artist_genres = Artist.query.add_columns(genre_names(Artist)) \
+        .options(raiseload(Artist.shows)).filter(Artist.id == artist_id).first_or_404()
 
     form = ArtistForm()
 
@@ -342,10 +380,10 @@ def edit_artist(artist_id):
     form.city.data = artist.city
     form.state.data = artist.state
     form.phone.data = artist.phone
-    form.genres.data = artist.genres
+    form.genres.data = parse_genres(artist_genres)
     form.image_link.data = artist.image_link
     form.facebook_link.data = artist.facebook_link
-    form.website.data = artist.website
+    form.website_link.data = artist.website
     form.seeking_venue.data = artist.seeking_venue
     form.seeking_description.data = artist.seeking_description
 
@@ -354,24 +392,30 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
-    try:
+    artist = Artist.query.options(raiseload(Artist.shows)).get_or_404(artist_id)
+    form = ArtistForm(request.form)
+    if not apply_rules(form, ARTIST_RULES):
+        flash_form_errors(form)
+        return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-        artist = Artist.query.get(artist_id)
+    try:
         artist.name = request.form['name']
         artist.city = request.form['city']
         artist.state = request.form['state']
         artist.phone = request.form['phone']
         artist.facebook_link = request.form['facebook_link']
-        artist.genres = request.form.getlist('genres')
+        artist.genres = genres_named(request.form.getlist('genres'))
         artist.image_link = request.form['image_link']
-        artist.website = request.form['website']
+        artist.website = request.form['website_link']
 
         db.session.add(artist)
         db.session.commit()
+        invalidate_pages(artist_page_keys(artist_id))
+        index_name('artist', artist_id, request.form['name'])
         flash("Artist {} is updated successfully".format(artist.name))
     except():
         db.session.rollback()
@@ -379,12 +423,14 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(1)
 def edit_venue(venue_id):
-    venue = Venue.query.filter(Venue.id == venue_id).first()
+    venue, venue_genres = Venue.query.add_columns(genre_names(Venue)) \
+        .options(raiseload(Venue.shows)).filter(Venue.id == venue_id).first_or_404()
     form = VenueForm()
 
     form.name.data = venue.name
@@ -392,10 +438,10 @@ def edit_venue(venue_id):
     form.state.data = venue.state
     form.address.data = venue.address
     form.phone.data = venue.phone
-    form.genres.data = venue.genres
+    form.genres.data = parse_genres(venue_genres)
     form.image_link.data = venue.image_link
     form.facebook_link.data = venue.facebook_link
-    form.website.data = venue.website
+    form.website_link.data = venue.website
     form.seeking_talent.data = venue.seeking_talent
     form.seeking_description.data = venue.seeking_description
 
@@ -404,24 +450,30 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
+    venue = Venue.query.options(raiseload(Venue.shows)).get_or_404(venue_id)
+    form = VenueForm(request.form)
+    if not apply_rules(form, VENUE_RULES):
+        flash_form_errors(form)
+        return render_template('forms/edit_venue.html', form=form, venue=venue)
 
     try:
-        venue = Venue.query.get(venue_id)
         venue.name = request.form['name']
         venue.city = request.form['city']
         venue.state = request.form['state']
         venue.address = request.form['address']
         venue.phone = request.form['phone']
         venue.facebook_link = request.form['facebook_link']
-        venue.genres = request.form.getlist('genres')
+        venue.genres = genres_named(request.form.getlist('genres'))
         venue.image_link = request.form['image_link']
-        venue.website = request.form['website']
+        venue.website = request.form['website_link']
 
         db.session.commit()
+        invalidate_pages(venue_page_keys(venue_id))
+        index_name('venue', venue_id, request.form['name'])
         flash('Venue ' + venue.name + ' was successfully updated!')
     except():
         db.session.rollback()
@@ -429,19 +481,19 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
@@ -449,13 +501,16 @@ def create_artist_submission():
     error = False
 
     form = ArtistForm(request.form)
+    if not apply_rules(form, ARTIST_RULES):
+        flash_form_errors(form)
+        return render_template('forms/new_artist.html', form=form)
 
     try:
         artist = Artist(
             name=form.name.data,
             city=form.city.data,
             state=form.state.data,
-            genres=form.genres.data,
+            genres=genres_named(form.genres.data),
             phone=form.phone.data,
             facebook_link=form.facebook_link.data,
             image_link=form.image_link.data,
@@ -466,6 +521,7 @@ def create_artist_submission():
 
         db.session.add(artist)
         db.session.commit()
+        index_name('artist', artist.id, form.name.data, 0)
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except():
@@ -485,62 +541,95 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@replica_read
+@query_budget(1)
 def shows():
     # displays list of shows at /shows
     # TODO: replace with real venues' data.
 
-    data = []
-
-    show_data = db.session.query(
-        Venue.name,
-        Artist.name,
-        Artist.image_link,
-        Show.venue_id,
-        Show.artist_id,
-        Show.start_time
-    ).filter(Venue.id == Show.venue_id, Artist.id == Show.artist_id)
-
-    for show in show_data:
-        data.append({
-            'venue_id': show[3],
-            'venue_name': show[0],
-            'artist_id': show[4],
-            'artist_name': show[1],
-            'artist_image_link': show[2],
-            'start_time': str(show[5])
-        })
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
+    after = parse_cursor(request.args.get('after'), datetime.fromisoformat, int)
+    page = KeysetPage(
+        show_list_query(), (Show.start_time, Show.id), after, current_app.config['PER_PAGE'],
+        row_key=lambda show: (show.start_time, show.id)
+    )
+
+    # Rows are fetched and rendered as the response streams out.
+    data = (show_item(show) for show in page)
+    return Response(stream_template('pages/shows.html', shows=data, page=page))
+
+
+@main.route('/calendar')
+@replica_read
+@query_budget(1)
+def calendar():
+    # Shows in a date range (?from=&to= or ?window=today|weekend|week), by day.
+    start, end = date_range(request.args)
+    filters = calendar_filters(request.args)
+    after = parse_cursor(request.args.get('after'), datetime.fromisoformat, int)
+    page = KeysetPage(
+        calendar_query(start, end, **filters), (Show.start_time, Show.id), after,
+        current_app.config['PER_PAGE'], row_key=show_key
+    )
+    return Response(stream_template('pages/calendar.html', days=group_by_day(page), page=page,
+                                    start=start, end=end, filters=filters))
+
+
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
     error = False
 
     form = ShowForm(request.form)
+    # The importer's rules, so a show is accepted here exactly when it would
+    # be in a batch. find_conflicts() relies on the duration bound they enforce.
+    record = apply_rules(form, SHOW_RULES)
+    if record is not None:
+        venue_id, artist_id = record['venue_id'], record['artist_id']
+        if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+            form.venue_id.errors = ['Unknown venue.']
+        if db.session.query(Artist.id).filter(Artist.id == artist_id).scalar() is None:
+            form.artist_id.errors = ['Unknown artist.']
+    if record is None or form.venue_id.errors or form.artist_id.errors:
+        flash_form_errors(form)
+        return render_template('forms/new_show.html', form=form)
+
+    start_time = record['start_time']
+    duration_minutes = record['duration_minutes'] or DEFAULT_SHOW_DURATION
+    conflicts = find_conflicts(venue_id, artist_id, start_time, duration_minutes)
+    if conflicts:
+        for conflict in conflicts:
+            owner = 'venue' if conflict.venue_id == venue_id else 'artist'
+            flash('The {} already has a show at {} (show {}).'.format(owner, conflict.start_time, conflict.id))
+        return render_template('forms/new_show.html', form=form)
 
     try:
         show = Show(
-            artist_id=form.artist_id.data,
-            venue_id=form.venue_id,
-            start_time=form.start_time,
+            artist_id=artist_id,
+            venue_id=venue_id,
+            start_time=start_time,
+            duration_minutes=duration_minutes,
         )
 
         db.session.add(show)
         db.session.commit()
+        invalidate_pages([page_key('venue', venue_id), page_key('artist', artist_id)])
+        if start_time > datetime.now():
+            count_upcoming_show(venue_id, artist_id)
         # on successful db insert, flash success
         flash('Show was successfully listed!')
 
-    except():
+    # A booking committed since the conflict check (the exclusion constraints
+    # on PostgreSQL), or a venue or artist deleted since it was looked up.
+    except IntegrityError:
         error = True
         db.session.rollback()
         # TODO: on unsuccessful db insert, flash an error instead.
@@ -552,42 +641,32 @@ def create_show_submission():
         db.session.close()
 
     if error:
-        abort(500)
+        return render_template('forms/new_show.html', form=form)
     else:
         return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,414 @@
+import asyncio
+import functools
+import io
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from flask import render_template
+from itsdangerous import BadSignature
+from sqlalchemy.orm import sessionmaker
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_cookie
+
+from app import create_app
+from models import Artist, Show, Venue
+from page_cache import page_key
+from pages import (
+    artist_list_query,
+    entity_page,
+    entity_query,
+    entity_shows_queries,
+    name_search_query,
+    search_results,
+    show_item,
+    show_list_query,
+    venue_areas,
+    venue_directory_query
+)
+from pagination import KeysetPage, parse_cursor
+from venue_directory import directory_state_query, serve_venue_directory
+
+# ----------------------------------------------------------------------------#
+# ASGI mode.
+#
+# An optional way to serve the app when the database is slow to respond:
+#
+#     uvicorn --factory asgi:create_asgi_app
+#
+# The read pages (venue directory, artist list, searches, venue and artist
+# pages, /shows) are served by coroutines running the queries from pages.py
+# on an AsyncSession, over asyncpg on PostgreSQL and aiosqlite on SQLite, so
+# a worker waiting on the database keeps serving other requests. Independent
+# queries of a page run concurrently, each on its own connection. Every other
+# request, and any read whose session holds pending flash messages, is passed
+# to the Flask app on a thread pool, and its response body is forwarded
+# chunk by chunk as the app produces it (exports, streamed templates). The
+# blocking parts of the coroutine pages (reading the session cookie,
+# building statements in an app context, rendering, page cache reads and
+# writes, directory refreshes) run on that pool too, so the event loop only
+# waits on the async engine, whose pool is asyncio's (AsyncAdaptedQueuePool).
+#
+# Requests served by coroutines skip Flask's request hooks: they are not in
+# /_metrics and have no query budget.
+#
+# Needs SQLAlchemy's asyncio extension (greenlet) and aiosqlite or asyncpg
+# (requirements-asgi.txt).
+# `python benchmarks/asgi_check.py` checks the pages against the Flask app's.
+# ----------------------------------------------------------------------------#
+
+# Body chunks of a Flask response held while the client is slower than the app.
+WSGI_BUFFERED_CHUNKS = 16
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_uri(database_uri):
+    """ <database_uri> with its driver swapped for the async one. """
+    scheme, rest = database_uri.split('://', 1)
+    dialect = scheme.split('+')[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError('No async driver configured for {} databases'.format(dialect))
+    if dialect == 'sqlite' and rest in ('', '/', '/:memory:'):
+        # A second connection would open another, empty, database.
+        raise ValueError('ASGI mode needs a SQLite file, not an in-memory database')
+    return '{}://{}'.format(ASYNC_DRIVERS[dialect], rest)
+
+
+def async_engine_options(options):
+    """ The Flask engine's <options> for the async engine. The poolclass
+    metrics.init_metrics() sets is a synchronous QueuePool, whose checkouts
+    would block the event loop; without it create_async_engine() uses
+    AsyncAdaptedQueuePool with the same sizing.
+    """
+    options = dict(options or {})
+    options.pop('poolclass', None)
+    return options
+
+
+class ReadRequest(object):
+    """ What the read handlers need from an ASGI HTTP request. """
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'')
+        self.args = MultiDict(parse_qsl(self.query_string.decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1'): value.decode('latin-1')
+                        for name, value in scope.get('headers', ())}
+        self.form = MultiDict()
+        if self.headers.get('content-type', '').startswith('application/x-www-form-urlencoded'):
+            self.form = MultiDict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+    @property
+    def cookies(self):
+        return parse_cookie(self.headers.get('cookie', ''))
+
+
+def wsgi_environ(scope, body):
+    """ A WSGI environ for an ASGI HTTP request. """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(body)
+
+
+class AsyncReadApp(object):
+    """ The ASGI application: read routes served from an async engine, the
+    rest by <flask_app> on <threads> threads.
+    """
+
+    def __init__(self, flask_app, engine, threads):
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        self.flask_app = flask_app
+        self.engine = engine
+        self.session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+        self.routes = [
+            ('GET', re.compile(r'^/venues$'), self.venues),
+            ('POST', re.compile(r'^/venues/search$'), self.search_venues),
+            ('GET', re.compile(r'^/venues/(?P<entity_id>\d+)$'), self.show_venue),
+            ('GET', re.compile(r'^/artists$'), self.artists),
+            ('POST', re.compile(r'^/artists/search$'), self.search_artists),
+            ('GET', re.compile(r'^/artists/(?P<entity_id>\d+)$'), self.show_artist),
+            ('GET', re.compile(r'^/shows$'), self.shows),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = await read_body(receive)
+        request = ReadRequest(scope, body)
+        route = await self.run_sync(self.match, request)
+        if route is not None:
+            handler, kwargs = route
+            page = await handler(request, **kwargs)
+            if page is not None:
+                await send({
+                    'type': 'http.response.start',
+                    'status': 200,
+                    'headers': [(b'content-type', b'text/html; charset=utf-8')],
+                })
+                await send({'type': 'http.response.body', 'body': page.encode('utf-8')})
+                return
+        await self.call_wsgi(wsgi_environ(scope, body), send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def has_flashes(self, request):
+        """ Whether the request's session holds flash messages, which are
+        rendered into the page and must be cleared from the cookie.
+        """
+        cookie = request.cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            return False
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        try:
+            return '_flashes' in serializer.loads(cookie)
+        except BadSignature:
+            return False
+
+    def match(self, request):
+        """ (handler, kwargs) for requests served here, else None. """
+        if self.has_flashes(request):
+            return None
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match and request.method == method:
+                return handler, {name: int(value) for name, value in match.groupdict().items()}
+        return None
+
+    async def call_wsgi(self, environ, send):
+        """ Send the Flask app's response to <environ> as it is produced, each
+        body chunk in a http.response.body message.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(WSGI_BUFFERED_CHUNKS)
+        abandoned = threading.Event()
+        worker = loop.run_in_executor(self.executor, self.iterate_wsgi, environ, loop, queue, abandoned)
+        try:
+            start = await queue.get()
+            if start is None:
+                await worker  # Raises the app's error.
+            status, headers = start
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers],
+            })
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            # An error raised while iterating the body ends the response unfinished.
+            await worker
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Unblock the worker if this request was cancelled halfway.
+            abandoned.set()
+            while not queue.empty():
+                queue.get_nowait()
+
+    def iterate_wsgi(self, environ, loop, queue, abandoned):
+        """ Run the Flask app on <environ> and put (status, headers), then each
+        body chunk, then None on <queue>. The body is iterated on this one
+        thread, where stream_with_context() keeps its request context.
+        """
+        def put(item):
+            if not abandoned.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [int(status.split(' ', 1)[0]), headers]
+
+        try:
+            iterable = self.flask_app(environ, start_response)
+            try:
+                put(tuple(response))
+                for chunk in iterable:
+                    if abandoned.is_set():
+                        break
+                    if chunk:
+                        put(chunk)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            put(None)
+
+    # Queries are built in an app context (db.session.query needs one) and run
+    # on a session of their own.
+
+    async def run_sync(self, function, *args, **kwargs):
+        """ <function>'s result, called on the thread pool. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def statement(self, build, *args):
+        with self.flask_app.app_context():
+            return build(*args).statement
+
+    def keyset_page(self, build, columns, after, row_key):
+        with self.flask_app.app_context():
+            page = KeysetPage(build(), columns, after, self.flask_app.config['PER_PAGE'], row_key=row_key)
+            return page, page.query.statement
+
+    def detail_statements(self, model, entity_id):
+        with self.flask_app.app_context():
+            entity = entity_query(model, entity_id).limit(1).statement
+            past, upcoming = entity_shows_queries(model, entity_id, datetime.now())
+            return entity, past.statement, upcoming.statement
+
+    async def fetch(self, statement):
+        async with self.session_factory() as session:
+            return (await session.execute(statement)).all()
+
+    def render_sync(self, request, template, **context):
+        with self.flask_app.test_request_context(request.path, method=request.method,
+                                                 query_string=request.query_string):
+            return render_template(template, **context)
+
+    async def render(self, request, template, **context):
+        return await self.run_sync(self.render_sync, request, template, **context)
+
+    def serve_directory(self, state):
+        # May refresh the directory in place (VENUE_DIRECTORY_BACKGROUND_REFRESH off).
+        with self.flask_app.app_context():
+            return serve_venue_directory(state)
+
+    #  Handlers: the rendered page, or None to leave the request to Flask.
+    #  ----------------------------------------------------------------
+
+    async def venues(self, request):
+        genres = request.args.getlist('genre')
+        state = await self.fetch(directory_state_query())
+        precomputed = await self.run_sync(self.serve_directory, state[0] if state else None)
+        statement = await self.run_sync(self.statement, venue_directory_query, genres, precomputed)
+        rows = await self.fetch(statement)
+        return await self.render(request, 'pages/venues.html', areas=venue_areas(rows), genres=genres)
+
+    async def artists(self, request):
+        genres = request.args.getlist('genre')
+        after = parse_cursor(request.args.get('after'), int)
+        page, statement = await self.run_sync(self.keyset_page, functools.partial(artist_list_query, genres),
+                                              (Artist.id,), after, lambda artist: (artist.id,))
+        rows = page.take(await self.fetch(statement))
+        data = [{'id': artist.id, 'name': artist.name} for artist in rows]
+        return await self.render(request, 'pages/artists.html', artists=data, page=page, genres=genres)
+
+    async def shows(self, request):
+        after = parse_cursor(request.args.get('after'), datetime.fromisoformat, int)
+        page, statement = await self.run_sync(self.keyset_page, show_list_query, (Show.start_time, Show.id),
+                                              after, lambda show: (show.start_time, show.id))
+        rows = page.take(await self.fetch(statement))
+        return await self.render(request, 'pages/shows.html', shows=[show_item(show) for show in rows], page=page)
+
+    async def search(self, request, model, template):
+        if 'search_term' not in request.form:
+            return None
+        search_term = request.form['search_term']
+        statement = await self.run_sync(self.statement, name_search_query, model, search_term,
+                                        request.form.getlist('genre'), self.engine.dialect.name)
+        rows = await self.fetch(statement)
+        return await self.render(request, template, results=search_results(rows), search_term=search_term)
+
+    async def search_venues(self, request):
+        return await self.search(request, Venue, 'pages/search_venues.html')
+
+    async def search_artists(self, request):
+        return await self.search(request, Artist, 'pages/search_artists.html')
+
+    async def detail(self, request, model, kind, entity_id):
+        cache = self.flask_app.extensions.get('page_cache')
+        key = page_key(kind, entity_id)
+        page = await self.run_sync(cache.get, key) if cache is not None else None
+        if page is not None:
+            return page
+
+        entity, past, upcoming = await self.run_sync(self.detail_statements, model, entity_id)
+        # The entity and both show lists at once, on three connections.
+        entities, past_shows, upcoming_shows = await asyncio.gather(
+            self.fetch(entity), self.fetch(past), self.fetch(upcoming))
+        if not entities:
+            return None
+
+        data = entity_page(model, entities[0][0], entities[0][1], past_shows, upcoming_shows)
+        page = await self.render(request, 'pages/show_{}.html'.format(kind), **{kind: data})
+        if cache is not None:
+            await self.run_sync(cache.set, key, page)
+        return page
+
+    async def show_venue(self, request, entity_id):
+        return await self.detail(request, Venue, 'venue', entity_id)
+
+    async def show_artist(self, request, entity_id):
+        return await self.detail(request, Artist, 'artist', entity_id)
+
+
+def create_asgi_app(config=None):
+    """ The ASGI app, wrapping create_app(<config>). """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    flask_app = create_app(config)
+    database_uri = flask_app.config.get('ASYNC_DATABASE_URI') or \
+        async_database_uri(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    options = async_engine_options(flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    engine = create_async_engine(database_uri, **options)
+    return AsyncReadApp(flask_app, engine, flask_app.config['ASGI_WSGI_THREADS'])
@@ -0,0 +1,224 @@
+""" ASGI mode check.
+
+Seeds a temporary SQLite database (or uses $DATABASE_URL), then requests each
+page served by asgi.py's coroutines, and a route left to Flask, through the
+ASGI app in-process, the way an ASGI server calls it. Fails when:
+
+- a page differs from the Flask app's rendering of it;
+- a streamed Flask response (an export, /calendar) reaches the server in
+  one piece instead of chunk by chunk;
+- templates are rendered, or the page cache (the SQLite backend here) is
+  read or written, on the event loop's thread;
+- the async engine is given a synchronous connection pool;
+- anything takes longer than --timeout seconds;
+- the event loop goes more than --max-stall milliseconds without running
+  while --concurrency copies of every request run at once.
+
+Rendering and the Flask app run on threads, so the loop still waits for the
+GIL (and for aiosqlite to start a connection's thread) while they work: the
+stall is bounded, not zero.
+
+The engine is disposed through the lifespan protocol at the end, as on
+server shutdown.
+
+    python benchmarks/asgi_check.py
+    uvicorn --factory asgi:create_asgi_app   # the same app under a server
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_FILE = None
+if 'DATABASE_URL' not in os.environ:
+    DB_FILE = os.path.join(tempfile.mkdtemp(), 'asgi.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+os.environ.setdefault('PAGE_CACHE_BACKEND', 'sqlite')
+os.environ.setdefault('PAGE_CACHE_PATH', os.path.join(tempfile.mkdtemp(), 'page_cache.sqlite'))
+
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+from asgi import async_engine_options, create_asgi_app  # noqa: E402
+from metrics import InstrumentedQueuePool  # noqa: E402
+from models import db, Artist, Venue  # noqa: E402
+from seed import seed_database  # noqa: E402
+
+
+def build_routes(venue_id, artist_id):
+    """ (name, method, path, form) of the coroutine pages and a Flask route. """
+    return [
+        ('venues', 'GET', '/venues', None),
+        ('artists', 'GET', '/artists', None),
+        ('shows', 'GET', '/shows', None),
+        ('show_venue', 'GET', '/venues/{}'.format(venue_id), None),
+        ('show_artist', 'GET', '/artists/{}'.format(artist_id), None),
+        ('search_venues', 'POST', '/venues/search', 'search_term=the'),
+        ('search_artists', 'POST', '/artists/search', 'search_term=band'),
+        ('missing_venue', 'GET', '/venues/999999999', None),
+        ('calendar', 'GET', '/calendar', None),
+        ('export_csv', 'GET', '/exports/shows.csv', None),
+    ]
+
+
+# Flask routes whose body is a generator, forwarded in several messages.
+STREAMED = ('calendar', 'export_csv')
+
+
+async def asgi_request(app, method, path, form=None):
+    """ (status, body, number of body messages) of one request to the ASGI <app>. """
+    body = (form or '').encode('utf-8')
+    headers = [(b'host', b'localhost')]
+    if form is not None:
+        headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': headers,
+             'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 0)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    bodies = [message.get('body', b'') for message in sent[1:]]
+    return sent[0]['status'], b''.join(bodies), len(bodies)
+
+
+async def lifespan(app):
+    """ Run the ASGI lifespan protocol through startup and shutdown. """
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    await app({'type': 'lifespan'}, receive, send)
+
+
+async def longest_stall(done, interval=0.001):
+    """ The longest the event loop went without running this task, in seconds. """
+    longest = 0.0
+    last = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        longest = max(longest, now - last - interval)
+        last = now
+    return longest
+
+
+def record_threads(app, calls):
+    """ Append (name, thread id) to <calls> for each render and page cache call. """
+    def recorded(name, function):
+        def wrapper(*args, **kwargs):
+            calls.append((name, threading.get_ident()))
+            return function(*args, **kwargs)
+        return wrapper
+
+    app.render_sync = recorded('render', app.render_sync)
+    cache = app.flask_app.extensions.get('page_cache')
+    if cache is not None:
+        cache.get = recorded('page cache get', cache.get)
+        cache.set = recorded('page cache set', cache.set)
+
+
+async def run_checks(app, routes, expected, concurrency, max_stall):
+    failures = []
+    for name, method, path, form in routes:
+        status, body, messages = await asgi_request(app, method, path, form)
+        if (status, body) != expected[name]:
+            failures.append('{}: ASGI {} ({} bytes), Flask {} ({} bytes)'.format(
+                name, status, len(body), expected[name][0], len(expected[name][1])))
+        if name in STREAMED and messages < 3:
+            failures.append('{}: body sent in {} message(s), not streamed'.format(name, messages))
+        print('{:16} {}  {:>7} bytes in {:>3} messages'.format(name, status, len(body), messages))
+
+    done = asyncio.Event()
+    stall = asyncio.ensure_future(longest_stall(done))
+    started = time.perf_counter()
+    requests = [asgi_request(app, method, path, form)
+                for _ in range(concurrency) for _, method, path, form in routes]
+    results = await asyncio.gather(*requests)
+    elapsed = time.perf_counter() - started
+    done.set()
+    stall_ms = (await stall) * 1000
+    print('{} concurrent requests in {:.2f} s, longest event loop stall {:.1f} ms'.format(
+        len(results), elapsed, stall_ms))
+    if stall_ms > max_stall:
+        failures.append('event loop stalled for {:.1f} ms (limit {:.0f} ms)'.format(stall_ms, max_stall))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--max-stall', type=float, default=250.0, help='milliseconds')
+    args = parser.parse_args()
+
+    failures = []
+    options = async_engine_options({'pool_size': 5, 'poolclass': InstrumentedQueuePool})
+    if 'poolclass' in options:
+        failures.append('async engine options keep the synchronous poolclass')
+
+    app = create_asgi_app()
+    flask_app = app.flask_app
+    with flask_app.app_context():
+        if DB_FILE:
+            db.create_all()
+            seed_database(args.venues, args.artists, args.shows, seed=1)
+        venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+        artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    if isinstance(app.engine.sync_engine.pool, QueuePool) and \
+            not type(app.engine.sync_engine.pool).__name__.startswith('AsyncAdapted'):
+        failures.append('async engine uses {}'.format(type(app.engine.sync_engine.pool).__name__))
+
+    routes = build_routes(venue_id, artist_id)
+    client = flask_app.test_client()
+    expected = {}
+    for name, method, path, form in routes:
+        response = client.open(path, method=method, data=form,
+                               content_type='application/x-www-form-urlencoded' if form else None)
+        expected[name] = response.status_code, response.get_data()
+
+    calls = []
+    record_threads(app, calls)
+
+    async def check():
+        loop_thread = threading.get_ident()
+        try:
+            failures = await run_checks(app, routes, expected, args.concurrency, args.max_stall)
+        finally:
+            await lifespan(app)
+        on_loop = sorted({name for name, thread in calls if thread == loop_thread})
+        if on_loop:
+            failures.append('blocking work on the event loop: {}'.format(', '.join(on_loop)))
+        if not calls:
+            failures.append('no render or page cache call was recorded')
+        return failures
+
+    try:
+        failures.extend(asyncio.run(asyncio.wait_for(check(), args.timeout)))
+    except asyncio.TimeoutError:
+        failures.append('no answer within {:.0f} s'.format(args.timeout))
+
+    for failure in failures:
+        print('FAIL ' + failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+""" Micro-benchmark for the `datetime` Jinja filter.
+
+Renders /shows with --rows shows on one page, first through the previous
+filter (str() in the view, dateutil.parser.parse + babel.dates.format_datetime
+on every call) and then through the current one, and prints both timings.
+
+    python benchmarks/datetime_filter.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+
+# Render against a throwaway SQLite database instead of the configured one.
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+os.environ['PAGE_CACHE_BACKEND'] = ''
+
+from app import create_app, DATETIME_FORMATS, format_datetime  # noqa: E402
+from models import db, Artist, Genre, Venue, Show  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(str(value))
+    return babel.dates.format_datetime(date, DATETIME_FORMATS.get(format, format), locale='en')
+
+
+def seed(rows):
+    jazz = Genre(name='Jazz')
+    venue = Venue(name='Bench Hall', city='San Francisco', state='CA',
+                  facebook_link='https://facebook.com/bench', genres=[jazz])
+    artist = Artist(name='Bench Band', city='San Francisco', state='CA', genres=[jazz])
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    start = datetime(2030, 1, 1, 20, 0)
+    db.session.bulk_insert_mappings(Show, [{
+        'venue_id': venue.id,
+        'artist_id': artist.id,
+        'start_time': start + timedelta(hours=i),
+        'upcoming': True,
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def render(client, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = client.get('/shows').data
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config['PER_PAGE'] = args.rows
+    with app.app_context():
+        db.create_all()
+        seed(args.rows)
+
+    client = app.test_client()
+    app.jinja_env.filters['datetime'] = legacy_format_datetime
+    before, before_body = render(client, args.repeat)
+    app.jinja_env.filters['datetime'] = format_datetime
+    after, after_body = render(client, args.repeat)
+
+    print('rows={} best of {}'.format(args.rows, args.repeat))
+    print('before: {:8.1f} ms'.format(before * 1000))
+    print('after:  {:8.1f} ms  ({:.1f}x)'.format(after * 1000, before / after))
+    if before_body != after_body:
+        print('warning: rendered pages differ')
+    os.remove(DB_FILE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" Import time budget.
+
+Imports app.py in a fresh interpreter under `python -X importtime`, reports
+the slowest modules and fails when the cumulative import time is over
+budget, or when one of our modules imports at startup a module that should
+load lazily (third-party packages importing it are only reported).
+Each run takes the best of several so that a cold disk cache does not fail
+the check.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 600 --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 650
+# Only needed once a page renders a date, or by `flask db`.
+DEFERRED_MODULES = ('babel', 'dateutil', 'alembic')
+
+
+def is_local(module):
+    """ Whether <module> is one of the top-level modules of this repo. """
+    return os.path.exists(os.path.join(ROOT, module.split('.')[0] + '.py'))
+
+
+def measure():
+    """ {module: (self us, cumulative us, importing module)} for one cold
+    import of app. -X importtime indents each module two spaces deeper than
+    the module importing it and lists it before that module.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    if result.returncode != 0:
+        sys.exit('import app failed:\n' + result.stderr)
+    modules = {}
+    pending = []  # [(depth, name)] imported but whose importer is not listed yet
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, label = line[len('import time:'):].split('|')
+        name = label.strip()
+        depth = (len(label) - len(label.lstrip()) - 1) // 2
+        while pending and pending[-1][0] > depth:
+            modules[pending.pop()[1]] += (name,)
+        modules[name] = (int(self_us), int(cumulative_us))
+        pending.append((depth, name))
+    for _, name in pending:
+        modules[name] += (None,)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Slowest modules to list.')
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    best = min(runs, key=lambda modules: modules['app'][1])
+    total_ms = best['app'][1] / 1000.0
+
+    print('{:<40} {:>10} {:>14}'.format('module', 'self ms', 'cumulative ms'))
+    slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us, _) in slowest:
+        print('{:<40} {:>10.1f} {:>14.1f}'.format(name, self_us / 1000.0, cumulative_us / 1000.0))
+    print()
+    print('import app: {:.1f} ms (budget {:.0f} ms, best of {})'.format(total_ms, args.budget_ms, args.runs))
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append('import time {:.1f} ms is over the {:.0f} ms budget'.format(total_ms, args.budget_ms))
+    for module in DEFERRED_MODULES:
+        if module not in best:
+            continue
+        importer = best[module][2]
+        if importer and is_local(importer):
+            failures.append('{} is imported at startup by {}'.format(module, importer))
+        else:
+            print('note {} is imported at startup by {}'.format(module, importer))
+    for failure in failures:
+        print('FAIL ' + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+""" Time to compute the artist/venue matches.
+
+Scores --artists synthetic seeking artists against --venues seeking venues
+with random genres (1 to 3 of the form choices), cities drawn from the seed
+data with a zipf skew and --co-shows past artist/venue pairs, keeping the
+--top-k best matches of each. Fails when scoring takes more than --max-seconds.
+
+    python benchmarks/matchmaking.py
+    python benchmarks/matchmaking.py --artists 20000 --venues 2000 --block-size 256
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forms import genre_choices  # noqa: E402
+from matchmaking import Side, match  # noqa: E402
+from seed import CITIES, zipf_weights  # noqa: E402
+
+DEFAULT_MAX_SECONDS = 10.0
+
+
+def make_rows(n, first_id, rng):
+    genres = [genre for genre, _ in genre_choices]
+    city_weights = zipf_weights(len(CITIES))
+    rows = []
+    for i in range(n):
+        city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+        rows.append((first_id + i, city, state, ','.join(rng.sample(genres, rng.randint(1, 3)))))
+    return rows
+
+
+def make_co_shows(n, artists, venues, rng):
+    pairs = {(rng.randrange(artists), rng.randrange(venues)) for _ in range(n)}
+    pairs = sorted((artist, venue, rng.randint(1, 5)) for artist, venue in pairs)
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+    return pairs[:, 0], pairs[:, 1], pairs[:, 2].astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--co-shows', type=int, default=200000)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    codes = {}
+    artists = Side.encode(make_rows(args.artists, 1, rng), codes, -1)
+    venues = Side.encode(make_rows(args.venues, 1, rng), codes, -2)
+    co_shows = make_co_shows(args.co_shows, args.artists, args.venues, rng)
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    artist_matches, venue_matches = match(artists, venues, co_shows, args.top_k, args.block_size)
+    seconds = time.perf_counter() - started
+
+    pairs = len(artists) * len(venues)
+    print('encoded {} artists and {} venues in {:.2f} s'.format(len(artists), len(venues), encode_seconds))
+    print('scored {} pairs in {:.2f} s ({:.0f} M pairs/s), blocks of {} artists'.format(
+        pairs, seconds, pairs / seconds / 1e6, args.block_size))
+    print('artist 1: {}'.format(artist_matches.lookup(1, 5)))
+    print('venue 1: {}'.format(venue_matches.lookup(1, 5)))
+
+    if seconds > args.max_seconds:
+        print('FAIL scoring took {:.2f} s, over {:.1f} s'.format(seconds, args.max_seconds))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
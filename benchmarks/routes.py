@@ -0,0 +1,243 @@
+""" Route benchmark suite.
+
+Drives every route in app.py through the Flask test client and reports
+p50/p95/p99 latency, SQL statements per request and peak Python memory per
+route. Runs against $DATABASE_URL when set, otherwise against a temporary
+SQLite database seeded with synthetic data.
+
+    python benchmarks/routes.py --output baseline.json
+    python benchmarks/routes.py --compare baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_FILE = None
+if 'DATABASE_URL' not in os.environ:
+    DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+os.environ.setdefault('PAGE_CACHE_BACKEND', '')
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Artist, Show, Venue  # noqa: E402
+from seed import seed_database  # noqa: E402
+
+# A route regresses when its p95 grows by more than this factor, or when it
+# issues more statements than in the baseline.
+LATENCY_TOLERANCE = 1.25
+# The <form> of templates/forms/*: a POST answered with one is a rejected
+# submission re-rendered with its errors.
+FORM_PAGE = re.compile(br'<form[^>]*class="form"')
+
+statement_count = [0]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    statement_count[0] += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def venue_form(name):
+    return {
+        'name': name,
+        'city': 'San Francisco',
+        'state': 'CA',
+        'address': '1015 Folsom Street',
+        'phone': '234-415-555-0100',
+        'genres': ['Jazz', 'Funk'],
+        'facebook_link': 'https://www.facebook.com/bench',
+        'image_link': 'https://picsum.photos/300',
+        'website_link': 'https://bench.example.com',
+        'seeking_description': '',
+    }
+
+
+def artist_form(name):
+    form = venue_form(name)
+    del form['address']
+    return form
+
+
+def build_routes(venue_ids, artist_ids):
+    """ (name, method, url factory, form factory) for every route. """
+    def venue_url(suffix=''):
+        return lambda rng: '/venues/{}{}'.format(rng.choice(venue_ids), suffix)
+
+    def artist_url(suffix=''):
+        return lambda rng: '/artists/{}{}'.format(rng.choice(artist_ids), suffix)
+
+    def search_form(rng):
+        return {'search_term': rng.choice(('the', 'band', 'hall', 'velvet', 'club', 'x'))}
+
+    # One evening each, past the seeded shows, so no submission is turned down
+    # as a conflict.
+    evenings = itertools.count()
+
+    def show_form(rng):
+        start_time = datetime(2031, 1, 1, 20) + timedelta(days=next(evenings))
+        return {'artist_id': rng.choice(artist_ids), 'venue_id': rng.choice(venue_ids),
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')}
+
+    return [
+        ('index', 'GET', lambda rng: '/', None),
+        ('venues', 'GET', lambda rng: '/venues', None),
+        ('artists', 'GET', lambda rng: '/artists', None),
+        ('shows', 'GET', lambda rng: '/shows', None),
+        ('calendar', 'GET', lambda rng: '/calendar?window=weekend', None),
+        ('autocomplete', 'GET', lambda rng: '/autocomplete?q={}'.format(rng.choice(('t', 'th', 'ha', 'velv', 'sax b'))),
+         None),
+        ('search_venues', 'POST', lambda rng: '/venues/search', search_form),
+        ('search_artists', 'POST', lambda rng: '/artists/search', search_form),
+        ('show_venue', 'GET', venue_url(), None),
+        ('show_artist', 'GET', artist_url(), None),
+        ('venue_matches', 'GET', venue_url('/matches'), None),
+        ('artist_matches', 'GET', artist_url('/matches'), None),
+        ('edit_venue', 'GET', venue_url('/edit'), None),
+        ('edit_artist', 'GET', artist_url('/edit'), None),
+        ('create_venue_form', 'GET', lambda rng: '/venues/create', None),
+        ('create_artist_form', 'GET', lambda rng: '/artists/create', None),
+        ('create_shows', 'GET', lambda rng: '/shows/create', None),
+        ('create_venue_submission', 'POST', lambda rng: '/venues/create',
+         lambda rng: venue_form('Bench Venue {}'.format(rng.random()))),
+        ('create_artist_submission', 'POST', lambda rng: '/artists/create',
+         lambda rng: artist_form('Bench Artist {}'.format(rng.random()))),
+        ('create_show_submission', 'POST', lambda rng: '/shows/create', show_form),
+        ('edit_venue_submission', 'POST', venue_url('/edit'),
+         lambda rng: venue_form('Edited Venue {}'.format(rng.random()))),
+        ('edit_artist_submission', 'POST', artist_url('/edit'),
+         lambda rng: artist_form('Edited Artist {}'.format(rng.random()))),
+    ]
+
+
+def request(client, method, url, data):
+    if method == 'GET':
+        return client.get(url)
+    return client.post(url, data=data)
+
+
+def run_route(client, rng, method, make_url, make_form, iterations):
+    latencies, queries, errors = [], [], 0
+    for _ in range(iterations):
+        url = make_url(rng)
+        data = make_form(rng) if make_form else None
+        statement_count[0] = 0
+        started = time.perf_counter()
+        response = request(client, method, url, data)
+        body = response.get_data()
+        latencies.append(time.perf_counter() - started)
+        queries.append(statement_count[0])
+        if response.status_code >= 400 or (method == 'POST' and FORM_PAGE.search(body)):
+            errors += 1
+
+    # One more request under tracemalloc for the peak allocation.
+    tracemalloc.start()
+    request(client, method, make_url(rng), make_form(rng) if make_form else None).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024.0, 1),
+        'errors': errors,
+    }
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, current in sorted(results['routes'].items()):
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * LATENCY_TOLERANCE:
+            regressions.append('{}: p95 {} ms -> {} ms'.format(name, previous['p95_ms'], current['p95_ms']))
+        if current['queries'] > previous['queries']:
+            regressions.append('{}: queries {} -> {}'.format(name, previous['queries'], current['queries']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--routes', help='Comma separated route names to run.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Baseline JSON to check for regressions.')
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    # Count failing routes as errors instead of aborting the run.
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    with app.app_context():
+        if DB_FILE:
+            db.create_all()
+            seed_database(args.venues, args.artists, args.shows, seed=args.seed)
+        venue_ids = [venue_id for venue_id, in db.session.query(Venue.id)]
+        artist_ids = [artist_id for artist_id, in db.session.query(Artist.id)]
+        show_count = db.session.query(db.func.count(Show.id)).scalar()
+        backend = db.engine.url.get_backend_name()
+
+    selected = set(args.routes.split(',')) if args.routes else None
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    results = {
+        'database': backend,
+        'iterations': args.iterations,
+        'dataset': {'venues': len(venue_ids), 'artists': len(artist_ids), 'shows': show_count},
+        'routes': {},
+    }
+
+    print('{:<26} {:>9} {:>9} {:>9} {:>8} {:>10} {:>7}'.format(
+        'route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'peak KiB', 'errors'))
+    for name, method, make_url, make_form in build_routes(venue_ids, artist_ids):
+        if selected and name not in selected:
+            continue
+        stats = run_route(client, rng, method, make_url, make_form, args.iterations)
+        results['routes'][name] = stats
+        print('{:<26} {p50_ms:>9} {p95_ms:>9} {p99_ms:>9} {queries:>8} {peak_kb:>10} {errors:>7}'.format(
+            name, **stats))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        status = 1 if regressions else 0
+
+    if DB_FILE:
+        os.remove(DB_FILE)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
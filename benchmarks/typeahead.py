@@ -0,0 +1,84 @@
+""" Latency of /autocomplete lookups.
+
+Builds the typeahead index over --venues and --artists synthetic names made
+from the seed data vocabulary (so short prefixes like "t" match most of
+them), then times --queries lookups of 1 to 8 character prefixes of those
+names, as typed one keystroke at a time. Fails when the p99 is over --max-p99
+milliseconds.
+
+    python benchmarks/typeahead.py
+    python benchmarks/typeahead.py --venues 50000 --artists 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed import ADJECTIVES, ARTIST_NOUNS, VENUE_NOUNS  # noqa: E402
+from typeahead import PrefixIndex  # noqa: E402
+
+DEFAULT_MAX_P99_MS = 5.0
+
+
+def make_entities(kind, nouns, n, rng):
+    return [(kind, i, 'The {} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(nouns), i),
+             rng.randint(0, 40)) for i in range(n)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=80000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--max-p99', type=float, default=DEFAULT_MAX_P99_MS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entities = make_entities('venue', VENUE_NOUNS, args.venues, rng) + \
+        make_entities('artist', ARTIST_NOUNS, args.artists, rng)
+    started = time.perf_counter()
+    index = PrefixIndex(entities)
+    build_seconds = time.perf_counter() - started
+
+    queries = []
+    while len(queries) < args.queries:
+        name = rng.choice(entities)[2].lower()
+        start = rng.choice([0] + [i + 1 for i, char in enumerate(name) if char == ' '])
+        queries.extend(name[start:end] for end in range(start + 1, min(start + 9, len(name) + 1)))
+    queries = queries[:args.queries]
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, args.limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for i in range(1000):
+        index.add('venue', args.venues + i, 'The New Room {}'.format(i), 0)
+    add_ms = time.perf_counter() - started
+
+    p99 = percentile(latencies, 99)
+    print('index of {} names in {} tiers, built in {:.0f} ms'.format(len(index), len(index.tiers),
+                                                                      build_seconds * 1000))
+    print('{} lookups: p50 {:.3f} ms  p95 {:.3f} ms  p99 {:.3f} ms  max {:.3f} ms'.format(
+        len(latencies), percentile(latencies, 50), percentile(latencies, 95), p99, max(latencies)))
+    print('incremental add: {:.3f} ms per name'.format(add_ms))
+
+    if p99 > args.max_p99:
+        print('FAIL p99 {:.3f} ms is over {:.1f} ms'.format(p99, args.max_p99))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+""" Throughput of record validation.
+
+Validates --records synthetic venue records (one in ten invalid) through the
+shared rules in validation.py, in --batch-size batches as the importer does,
+as lists of dicts and as columns, and through VenueForm one record at a time
+for comparison. Fails when the batch rate is under --min-rate records per
+second, the import pre-validation target.
+
+    python benchmarks/validation.py
+    python benchmarks/validation.py --records 500000 --form-records 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from werkzeug.datastructures import MultiDict  # noqa: E402
+
+from forms import VenueForm  # noqa: E402
+from validation import GENRES, STATES, VENUE_RULES  # noqa: E402
+
+DEFAULT_MIN_RATE = 100000
+
+
+def make_records(n, seed):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        record = {
+            'name': 'Venue {}'.format(i),
+            'city': 'Austin',
+            'state': rng.choice(STATES),
+            'address': '{} Main St'.format(i),
+            'phone': '+234 819 412 {:04d}'.format(i % 10000),
+            'genres': ','.join(rng.sample(GENRES, 2)),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(i),
+            'seeking_talent': rng.choice(('yes', 'no')),
+        }
+        if i % 10 == 0:
+            record[rng.choice(('state', 'phone', 'genres', 'facebook_link', 'name'))] = 'invalid!'
+        records.append(record)
+    return records
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def invalid_count(validate, batches):
+    return sum(len(validate(batch)[1]) for batch in batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--form-records', type=int, default=1000)
+    parser.add_argument('--min-rate', type=float, default=DEFAULT_MIN_RATE)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.seed)
+    batches = [records[i:i + args.batch_size] for i in range(0, len(records), args.batch_size)]
+    column_batches = [({name: [record.get(name) for record in batch] for name in VENUE_RULES.names},
+                       len(batch)) for batch in batches]
+
+    invalid, batch_seconds = timed(invalid_count, VENUE_RULES.validate_batch, batches)
+    column_invalid, column_seconds = timed(
+        invalid_count, lambda columns: VENUE_RULES.validate_columns(*columns), column_batches)
+    assert invalid == column_invalid
+
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='bench', WTF_CSRF_ENABLED=False)
+    form_records = records[:args.form_records]
+
+    def validate_forms():
+        invalid = 0
+        for record in form_records:
+            data = MultiDict(record)
+            data.setlist('genres', record['genres'].split(','))
+            invalid += not VenueForm(formdata=data).validate()
+        return invalid
+
+    with app.test_request_context():
+        _, form_seconds = timed(validate_forms)
+
+    batch_rate = len(records) / batch_seconds
+    print('{:<12} {:>10} records {:>12.0f} records/s'.format('batch', len(records), batch_rate))
+    print('{:<12} {:>10} records {:>12.0f} records/s'.format('columns', len(records),
+                                                               len(records) / column_seconds))
+    print('{:<12} {:>10} records {:>12.0f} records/s'.format('VenueForm', len(form_records),
+                                                               len(form_records) / form_seconds))
+    print('{} of {} records invalid'.format(invalid, len(records)))
+
+    if batch_rate < args.min_rate:
+        print('FAIL batch validation at {:.0f} records/s is under {:.0f}'.format(batch_rate, args.min_rate))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,8 @@
 import os
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
-
 # Connect to the database
 DB_HOST = os.getenv('DB_HOST', '127.0.0.1:5432')
 DB_USER = os.getenv('DB_USER', 'postgres')
@@ -15,7 +11,124 @@ DB_NAME = os.getenv('DB_NAME', 'fyuur')
 
 DB_PATH = 'postgresql+psycopg2://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
 
-# TODO: IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = DB_PATH  # '<Put your local database url>'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
-SQLALCHEMY_ECHO = True
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)).lower() == 'true'
+
+
+def engine_options(database_uri):
+    """ Connection pool settings for SQLALCHEMY_ENGINE_OPTIONS. SQLite's
+    pools take no sizing arguments, so it gets none.
+    """
+    if database_uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True),
+    }
+
+
+class Config(object):
+    SECRET_KEY = os.getenv('SECRET_KEY') or os.urandom(32)
+
+    DEBUG = False
+    TESTING = False
+
+    # TODO: IMPLEMENT DATABASE URL
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', DB_PATH)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Statement logging; per-request SQL numbers are served at /_metrics instead.
+    SQLALCHEMY_ECHO = env_flag('SQLALCHEMY_ECHO', False)
+
+    # Rows per page on the keyset-paginated listings (/shows, /artists).
+    PER_PAGE = int(os.getenv('PER_PAGE', 50))
+
+    # Seconds between in-process show rollovers. Every worker runs the
+    # scheduler but only the holder of the 'show-rollover' job lease rolls
+    # shows over. 0 turns it off: then run `flask roll-over-shows` from cron,
+    # or the upcoming/past counters go stale.
+    SHOW_ROLLOVER_INTERVAL = int(os.getenv('SHOW_ROLLOVER_INTERVAL', 60))
+
+    # Precomputed venue directory (venue_directory.py). It is refreshed after
+    # each write to venues or shows, on a background thread unless
+    # VENUE_DIRECTORY_BACKGROUND_REFRESH is false, and every
+    # VENUE_DIRECTORY_REFRESH_INTERVAL seconds when set. /venues stops serving
+    # it once it has been missing writes for VENUE_DIRECTORY_MAX_STALENESS seconds.
+    VENUE_DIRECTORY_MAX_STALENESS = float(os.getenv('VENUE_DIRECTORY_MAX_STALENESS', 30))
+    VENUE_DIRECTORY_REFRESH_INTERVAL = int(os.getenv('VENUE_DIRECTORY_REFRESH_INTERVAL', 0))
+    VENUE_DIRECTORY_BACKGROUND_REFRESH = env_flag('VENUE_DIRECTORY_BACKGROUND_REFRESH', True)
+
+    # /autocomplete: results per query, and the age in seconds after which the
+    # in-process name index is rebuilt to pick up other processes' writes.
+    TYPEAHEAD_LIMIT = int(os.getenv('TYPEAHEAD_LIMIT', 10))
+    TYPEAHEAD_MAX_AGE = int(os.getenv('TYPEAHEAD_MAX_AGE', 300))
+
+    # Facet counts cached per filter by /api/v1/browse/*; 0 disables the cache.
+    # Writes switch lookups to new entries; the TTL drops the old ones.
+    FACET_CACHE_MAXSIZE = int(os.getenv('FACET_CACHE_MAXSIZE', 256))
+    FACET_CACHE_TTL = int(os.getenv('FACET_CACHE_TTL', 3600))
+
+    # /artists/<id>/matches and /venues/<id>/matches (matchmaking.py): matches
+    # kept per entity, artists scored per block, and the age in seconds after
+    # which the matches are recomputed in the background.
+    MATCHES_TOP_K = int(os.getenv('MATCHES_TOP_K', 20))
+    MATCHES_BLOCK_SIZE = int(os.getenv('MATCHES_BLOCK_SIZE', 1024))
+    MATCHES_MAX_AGE = int(os.getenv('MATCHES_MAX_AGE', 3600))
+
+    # Rendered detail page cache: 'memory' (per process), 'sqlite' (shared by the
+    # workers on a host through PAGE_CACHE_PATH) or '' to disable it.
+    PAGE_CACHE_BACKEND = os.getenv('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_PATH = os.getenv('PAGE_CACHE_PATH', os.path.join(basedir, 'page_cache.sqlite'))
+    PAGE_CACHE_MAXSIZE = int(os.getenv('PAGE_CACHE_MAXSIZE', 1024))
+    PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 300))
+
+    # Read replicas (comma separated URLs) for the @replica_read views. Replicas
+    # further than REPLICA_MAX_LAG seconds behind are skipped (lag is measured
+    # every REPLICA_LAG_CHECK_INTERVAL seconds); a browser that wrote reads
+    # from the primary for REPLICA_READ_YOUR_WRITES seconds.
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+    REPLICA_READ_YOUR_WRITES = float(os.getenv('REPLICA_READ_YOUR_WRITES', 10))
+
+    # ASGI mode (asgi.py): the async driver URL, derived from DATABASE_URL when
+    # unset, and the threads running the requests handed to the Flask app.
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URL')
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 8))
+
+
+class DevelopmentConfig(Config):
+    # Enable debug mode.
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    PAGE_CACHE_BACKEND = os.getenv('PAGE_CACHE_BACKEND', 'sqlite')
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    PAGE_CACHE_BACKEND = ''
+    # Refresh in the committing request, so tests see their writes in /venues.
+    VENUE_DIRECTORY_BACKGROUND_REFRESH = False
+    # Tests roll shows over by hand.
+    SHOW_ROLLOVER_INTERVAL = 0
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    """ The config class for <name>, defaulting to $FYYUR_ENV. """
+    return configs[name or os.getenv('FYYUR_ENV', 'development')]
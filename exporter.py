@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+
+import click
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from importer import fyyur_cli
+from models import db, Artist, Venue, Show
+
+# ----------------------------------------------------------------------------#
+# Streaming export.
+#
+# The shows join is read through a server-side cursor (stream_results) in
+# yield_per batches and encoded chunk by chunk, so memory use does not depend
+# on how many shows there are. Served at /exports/shows.<csv|ndjson> and by
+# `flask fyyur export`.
+# ----------------------------------------------------------------------------#
+
+exports = Blueprint('exports', __name__, url_prefix='/exports')
+
+EXPORT_COLUMNS = ('show_id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name')
+FETCH_SIZE = 1000
+# Rows buffered into each chunk handed to the response or file.
+CHUNK_ROWS = 500
+
+
+def shows_export_query(start=None, end=None, venue_id=None, artist_id=None):
+    query = db.session.query(
+        Show.id.label('show_id'),
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    return query.order_by(Show.start_time, Show.id)
+
+
+def stream_rows(query):
+    return query.execution_options(stream_results=True).yield_per(FETCH_SIZE)
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow((row.show_id, row.start_time.isoformat(), row.venue_id,
+                         row.venue_name, row.artist_id, row.artist_name))
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({
+            'show_id': row.show_id,
+            'start_time': row.start_time.isoformat(),
+            'venue_id': row.venue_id,
+            'venue_name': row.venue_name,
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+        }))
+        if len(lines) == CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+ENCODERS = {
+    'csv': (encode_csv, 'text/csv'),
+    'ndjson': (encode_ndjson, 'application/x-ndjson'),
+}
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_shows(fmt, compress=False, **filters):
+    """ Iterator of output chunks: str, or gzip bytes when <compress>. """
+    encode, _ = ENCODERS[fmt]
+    chunks = encode(stream_rows(shows_export_query(**filters)))
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def _parse_datetime(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, '{} must be an ISO 8601 date or datetime'.format(name))
+
+
+@exports.route('/shows.<fmt>')
+def export_shows_view(fmt):
+    if fmt not in ENCODERS:
+        abort(404)
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    filters = {
+        'start': _parse_datetime(request.args.get('start'), 'start'),
+        'end': _parse_datetime(request.args.get('end'), 'end'),
+        'venue_id': request.args.get('venue_id', type=int),
+        'artist_id': request.args.get('artist_id', type=int),
+    }
+    filename = 'shows.{}{}'.format(fmt, '.gz' if compress else '')
+    return Response(
+        stream_with_context(export_shows(fmt, compress, **filters)),
+        mimetype='application/gzip' if compress else ENCODERS[fmt][1],
+        headers={'Content-Disposition': 'attachment; filename={}'.format(filename)}
+    )
+
+
+@fyyur_cli.command('export')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(sorted(ENCODERS)), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--start', type=click.DateTime(), help='Shows starting at or after this time.')
+@click.option('--end', type=click.DateTime(), help='Shows starting before this time.')
+@click.option('--venue-id', type=int)
+@click.option('--artist-id', type=int)
+def export_command(output, fmt, compress, start, end, venue_id, artist_id):
+    """Stream the shows join (venue, artist, start time) to OUTPUT ('-' for stdout)."""
+    chunks = export_shows(fmt, compress, start=start, end=end, venue_id=venue_id, artist_id=artist_id)
+    if output == '-':
+        out = sys.stdout.buffer if compress else sys.stdout
+    elif compress:
+        out = open(output, 'wb')
+    else:
+        out = open(output, 'w', encoding='utf-8', newline='')
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if output == '-':
+            out.flush()
+        else:
+            out.close()
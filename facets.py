@@ -0,0 +1,166 @@
+from flask import current_app
+from sqlalchemy import distinct, false, func, literal, null, select, tuple_, union_all
+
+from forms import genre_choices, state_choices
+from genres import GENRE_LINKS, genre_filter
+from models import db, Artist, Genre, Venue
+from page_cache import LRUCache
+from summaries import register_summary, summary_changes_query
+
+# ----------------------------------------------------------------------------#
+# Facets.
+#
+# /api/v1/browse/venues and /api/v1/browse/artists filter on state, city,
+# genre and the seeking flag, and return with each page the number of
+# matching entities for every value of every facet. The counts for a filter
+# come from one grouped query (GROUPING SETS on PostgreSQL, a UNION ALL of
+# GROUP BYs elsewhere) and are cached per filter until a write to the
+# entities or their genres counts a change on the facet summary
+# (summaries.py). The state and genre facets list every form choice, with
+# a count of 0 when nothing matches.
+# ----------------------------------------------------------------------------#
+
+# model -> (summary name, seeking flag)
+FACETED = {
+    Venue: ('venue_facets', 'seeking_talent'),
+    Artist: ('artist_facets', 'seeking_venue'),
+}
+
+# GROUPING(state, city, seeking, genre) of each grouping set: one bit per
+# column aggregated away.
+GROUPINGS = {
+    0b0111: 'state',
+    0b0011: 'city',
+    0b1101: 'seeking',
+    0b1110: 'genre',
+}
+STATES = frozenset(state for state, _ in state_choices)
+GENRES = frozenset(genre for genre, _ in genre_choices)
+FLAGS = {'true': True, 'false': False}
+
+# Never rebuilt: the cache keys follow the summaries' `changes`.
+register_summary('venue_facets', (Venue,), ('venues', 'venue_genres'), refreshed=False)
+register_summary('artist_facets', (Artist,), ('artists', 'artist_genres'), refreshed=False)
+
+
+def _values(value):
+    return tuple(sorted({part.strip() for part in (value or '').split(',') if part.strip()}))
+
+
+def parse_facet_args(model, args):
+    """ The (states, city, genres, seeking) selected by request <args>;
+    ValueError for values outside the facet domains.
+    """
+    states = _values(args.get('state'))
+    genres = _values(args.get('genre'))
+    unknown = [value for value in states if value not in STATES] + \
+              [value for value in genres if value not in GENRES]
+    if unknown:
+        raise ValueError('Unknown facet values: {}'.format(', '.join(unknown)))
+    seeking = args.get(FACETED[model][1])
+    if seeking is not None:
+        if seeking.lower() not in FLAGS:
+            raise ValueError('{} must be true or false'.format(FACETED[model][1]))
+        seeking = FLAGS[seeking.lower()]
+    return states, args.get('city') or None, genres, seeking
+
+
+def facet_criteria(model, selection):
+    states, city, genres, seeking = selection
+    criteria = []
+    if states:
+        criteria.append(model.state.in_(states))
+    if city:
+        criteria.append(model.city == city)
+    if genres:
+        criteria.append(genre_filter(model, genres))
+    if seeking is not None:
+        criteria.append(func.coalesce(getattr(model, FACETED[model][1]), false()) == seeking)
+    return criteria
+
+
+def _labelled(grouping, state=None, city=None, seeking=None, genre=None, count=None):
+    columns = (('state', state), ('city', city), ('seeking', seeking), ('genre', genre))
+    return [grouping.label('grouping_id')] + \
+        [(null() if column is None else column).label(name) for name, column in columns] + \
+        [count.label('count')]
+
+
+def facet_counts_statement(model, criteria, dialect_name):
+    """ One row per (grouping set, value) with its number of entities. """
+    link, owner = GENRE_LINKS[model]
+    seeking = func.coalesce(getattr(model, FACETED[model][1]), false())
+
+    if dialect_name == 'postgresql':
+        # Genre rows repeat their entity; count each entity once per value.
+        return select(*_labelled(func.grouping(model.state, model.city, seeking, Genre.name),
+                                 model.state, model.city, seeking, Genre.name,
+                                 func.count(distinct(model.id)))) \
+            .select_from(model) \
+            .outerjoin(link, owner == model.id) \
+            .outerjoin(Genre, Genre.id == link.c.genre_id) \
+            .where(*criteria) \
+            .group_by(func.grouping_sets(tuple_(model.state), tuple_(model.city, model.state),
+                                         tuple_(seeking), tuple_(Genre.name)))
+
+    count = func.count()
+    return union_all(
+        select(*_labelled(literal(0b0111), state=model.state, count=count))
+        .where(*criteria).group_by(model.state),
+        select(*_labelled(literal(0b0011), state=model.state, city=model.city, count=count))
+        .where(*criteria).group_by(model.city, model.state),
+        select(*_labelled(literal(0b1101), seeking=seeking, count=count))
+        .where(*criteria).group_by(seeking),
+        select(*_labelled(literal(0b1110), genre=Genre.name, count=count))
+        .select_from(model).join(link, owner == model.id).join(Genre, Genre.id == link.c.genre_id)
+        .where(*criteria).group_by(Genre.name),
+    )
+
+
+def facet_values(model, rows):
+    counts = {facet: {} for facet in GROUPINGS.values()}
+    for row in rows:
+        facet = GROUPINGS.get(row.grouping_id)
+        if facet == 'state':
+            counts[facet][row.state] = row.count
+        elif facet == 'city' and row.city is not None:
+            counts[facet][row.city, row.state] = row.count
+        elif facet == 'seeking':
+            counts[facet][bool(row.seeking)] = row.count
+        elif facet == 'genre':
+            counts[facet][row.genre] = row.count
+
+    cities = sorted(counts['city'].items(), key=lambda item: (-item[1], item[0][0], item[0][1] or ''))
+    return {
+        'state': [{'value': state, 'count': counts['state'].get(state, 0)} for state, _ in state_choices],
+        'city': [{'value': city, 'state': state, 'count': count} for (city, state), count in cities],
+        'genre': [{'value': genre, 'count': counts['genre'].get(genre, 0)} for genre, _ in genre_choices],
+        FACETED[model][1]: [{'value': flag, 'count': counts['seeking'].get(flag, 0)} for flag in (True, False)],
+    }
+
+
+def facet_counts(model, selection):
+    """ The facet counts for <selection>, cached until the next change to
+    <model>'s facet summary.
+    """
+    cache = current_app.extensions.get('facet_cache')
+    key = None
+    if cache is not None:
+        state = db.session.execute(summary_changes_query(FACETED[model][0])).first()
+        if state is not None:
+            key = '{}:{}:{!r}'.format(FACETED[model][0], state.changes, selection)
+            facets = cache.get(key)
+            if facets is not None:
+                return facets
+
+    statement = facet_counts_statement(model, facet_criteria(model, selection), db.engine.dialect.name)
+    facets = facet_values(model, db.session.execute(statement).all())
+    if key is not None:
+        cache.set(key, facets)
+    return facets
+
+
+def init_facets(app):
+    maxsize = app.config.get('FACET_CACHE_MAXSIZE')
+    if maxsize:
+        app.extensions['facet_cache'] = LRUCache(maxsize=maxsize, ttl=app.config.get('FACET_CACHE_TTL', 3600))
@@ -1,110 +1,32 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form, FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
-import re
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
 
+from scheduling import DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+from validation import ARTIST_RULES, GENRES, STATES, VENUE_RULES
 
-def is_valid_phone(number):
-    """ Validate phone numbers like:
-    +2348194126780 - no space
-    +234.819.412.6780 - dot separator
-    +234-819-412-6780 - dash separator
-    +234 819 412 6780 - space separator
-    +234,819,412,6780 - comma separator
 
-    Patterns:
-    000 = [0-9]{3}
-    0000 = [0-9]{4}
-    -. , = ?[-. ,]
+state_choices = [(state, state) for state in STATES]
 
+genre_choices = [(genre, genre) for genre in GENRES]
 
 
-
-
-    Note: (? = optional) - Learn more: https://regex101.com/
+def apply_rules(form, rules):
+    """ Check the submitted data against the shared record rules (see
+    validation.py). Their messages replace WTForms' for the fields they
+    reject, so a form reports a record the way the importer does. Returns
+    the coerced record, or None when it is invalid.
     """
-    regex = re.compile(
-        '^\(?\+?([0-9]{3})\)?[-. ,]?([0-9]{3})\)?[-. ,]?([0-9]{3})[-. ,]?([0-9]{4})$'
-    )
-    return regex.match(number)
-
-
-state_choices = [
-    ('AL', 'AL'),
-    ('AK', 'AK'),
-    ('AZ', 'AZ'),
-    ('AR', 'AR'),
-    ('CA', 'CA'),
-    ('CO', 'CO'),
-    ('CT', 'CT'),
-    ('DE', 'DE'),
-    ('DC', 'DC'),
-    ('FL', 'FL'),
-    ('GA', 'GA'),
-    ('HI', 'HI'),
-    ('ID', 'ID'),
-    ('IL', 'IL'),
-    ('IN', 'IN'),
-    ('IA', 'IA'),
-    ('KS', 'KS'),
-    ('KY', 'KY'),
-    ('LA', 'LA'),
-    ('ME', 'ME'),
-    ('MT', 'MT'),
-    ('NE', 'NE'),
-    ('NV', 'NV'),
-    ('NH', 'NH'),
-    ('NJ', 'NJ'),
-    ('NM', 'NM'),
-    ('NY', 'NY'),
-    ('NC', 'NC'),
-    ('ND', 'ND'),
-    ('OH', 'OH'),
-    ('OK', 'OK'),
-    ('OR', 'OR'),
-    ('MD', 'MD'),
-    ('MA', 'MA'),
-    ('MI', 'MI'),
-    ('MN', 'MN'),
-    ('MS', 'MS'),
-    ('MO', 'MO'),
-    ('PA', 'PA'),
-    ('RI', 'RI'),
-    ('SC', 'SC'),
-    ('SD', 'SD'),
-    ('TN', 'TN'),
-    ('TX', 'TX'),
-    ('UT', 'UT'),
-    ('VT', 'VT'),
-    ('VA', 'VA'),
-    ('WA', 'WA'),
-    ('WV', 'WV'),
-    ('WI', 'WI'),
-    ('WY', 'WY'),
-]
-
-genre_choices = [
-    ('Alternative', 'Alternative'),
-    ('Blues', 'Blues'),
-    ('Classical', 'Classical'),
-    ('Country', 'Country'),
-    ('Electronic', 'Electronic'),
-    ('Folk', 'Folk'),
-    ('Funk', 'Funk'),
-    ('Hip-Hop', 'Hip-Hop'),
-    ('Heavy Metal', 'Heavy Metal'),
-    ('Instrumental', 'Instrumental'),
-    ('Jazz', 'Jazz'),
-    ('Musical Theatre', 'Musical Theatre'),
-    ('Pop', 'Pop'),
-    ('Punk', 'Punk'),
-    ('R&B', 'R&B'),
-    ('Reggae', 'Reggae'),
-    ('Rock n Roll', 'Rock n Roll'),
-    ('Soul', 'Soul'),
-    ('Other', 'Other'),
-]
+    record = form.data
+    # A value WTForms could not coerce is checked as it was submitted.
+    for field in form:
+        if field.process_errors and field.raw_data:
+            record[field.name] = field.raw_data[0]
+    record, errors = rules.validate(record)
+    for name, messages in errors.items():
+        form[name].errors = list(messages)
+    return None if errors else record
 
 
 class ShowForm(Form):
@@ -119,6 +41,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_DURATION)],
+        default=DEFAULT_SHOW_DURATION
+    )
 
 
 class VenueForm(Form):
@@ -160,21 +87,9 @@ class VenueForm(Form):
     )
 
     def validate(self):
-        """Define a custom validate method in your Form:"""
+        """Field validators, then the venue rules; every invalid field is reported."""
         rv = FlaskForm.validate(self)
-        if not rv:
-            return False
-        if not is_valid_phone(self.phone.data):
-            self.phone.errors.append('Invalid phone.')
-            return False
-        if not set(self.genres.data).issubset(dict(genre_choices).keys()):
-            self.genres.errors.append('Invalid genres.')
-            return False
-        if self.state.data not in dict(state_choices).keys():
-            self.state.errors.append('Invalid state.')
-            return False
-        # if pass validation
-        return True
+        return apply_rules(self, VENUE_RULES) is not None and rv
 
 
 class ArtistForm(Form):
@@ -215,18 +130,6 @@ class ArtistForm(Form):
     )
 
     def validate(self):
-        """Define a custom validate method in your Form:"""
+        """Field validators, then the artist rules; every invalid field is reported."""
         rv = FlaskForm.validate(self)
-        if not rv:
-            return False
-        if not is_valid_phone(self.phone.data):
-            self.phone.errors.append('Invalid phone.')
-            return False
-        if not set(self.genres.data).issubset(dict(genre_choices).keys()):
-            self.genres.errors.append('Invalid genres.')
-            return False
-        if self.state.data not in dict(state_choices).keys():
-            self.state.errors.append('Invalid state.')
-            return False
-        # if pass validation
-        return True
+        return apply_rules(self, ARTIST_RULES) is not None and rv
@@ -0,0 +1,97 @@
+from sqlalchemy import String, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from models import db, artist_genres, venue_genres, Artist, Genre, Venue
+
+# ----------------------------------------------------------------------------#
+# Genres.
+#
+# Venues and artists reference genres through the venue_genres and
+# artist_genres link tables. Filters are resolved through the unique index
+# on genres.name and the (genre_id, owner id) link index; nothing is parsed
+# in Python.
+# ----------------------------------------------------------------------------#
+
+GENRE_LINKS = {
+    Venue: (venue_genres, venue_genres.c.venue_id),
+    Artist: (artist_genres, artist_genres.c.artist_id),
+}
+
+
+class genre_list_agg(FunctionElement):
+    """ Comma separated aggregate of a string column. """
+    type = String()
+    name = 'genre_list_agg'
+    inherit_cache = True
+
+
+@compiles(genre_list_agg)
+def _compile_genre_list_agg(element, compiler, **kw):
+    return "string_agg({}, ',')".format(compiler.process(element.clauses, **kw))
+
+
+@compiles(genre_list_agg, 'sqlite')
+@compiles(genre_list_agg, 'mysql')
+def _compile_genre_list_agg_group_concat(element, compiler, **kw):
+    return 'group_concat({})'.format(compiler.process(element.clauses, **kw))
+
+
+def parse_genres(value):
+    """ Genre names from a form/request value: a list, or a comma separated string. """
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        names = (value or '').split(',')
+    return sorted({name.strip() for name in names if name and name.strip()})
+
+
+def genre_ids(names):
+    """ {name: id} for <names>, inserting the genres that do not exist yet. """
+    names = parse_genres(names)
+    if not names:
+        return {}
+    ids = dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        db.session.execute(Genre.__table__.insert(), [{'name': name} for name in missing])
+        ids.update(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)))
+    return ids
+
+
+def genres_named(names):
+    """ Genre instances for <names>, for assigning to Venue.genres or Artist.genres. """
+    ids = genre_ids(names)
+    if not ids:
+        return []
+    return Genre.query.filter(Genre.id.in_(ids.values())).order_by(Genre.name).all()
+
+
+def link_genres(model, entity_genres):
+    """ Bulk insert the genre links for (entity id, genre names) pairs. """
+    entity_genres = [(entity_id, parse_genres(names)) for entity_id, names in entity_genres]
+    ids = genre_ids(sorted({name for _, names in entity_genres for name in names}))
+    table, owner = GENRE_LINKS[model]
+    rows = [{owner.name: entity_id, 'genre_id': ids[name]}
+            for entity_id, names in entity_genres for name in names]
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def genre_filter(model, names, key=None):
+    """ Criterion matching entities of <model> tagged with any of <names>;
+    <key> is the column holding the entity id when it is not model.id.
+    """
+    table, owner = GENRE_LINKS[model]
+    return (model.id if key is None else key).in_(
+        select(owner).join(Genre, Genre.id == table.c.genre_id).where(Genre.name.in_(names))
+    )
+
+
+def genre_names(model):
+    """ Correlated subquery of <model>'s genre names, comma separated. """
+    table, owner = GENRE_LINKS[model]
+    return select(genre_list_agg(Genre.name)) \
+        .select_from(table.join(Genre, Genre.id == table.c.genre_id)) \
+        .where(owner == model.id) \
+        .scalar_subquery()
@@ -0,0 +1,305 @@
+import csv
+import io
+import json
+import sys
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+from genres import link_genres
+from models import db, Artist, Venue, Show
+from page_cache import invalidate_pages, page_key
+from scheduling import DEFAULT_SHOW_DURATION, ShowCalendar
+from typeahead import count_upcoming_show, index_name
+from validation import ARTIST_RULES, SHOW_RULES, VENUE_RULES
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+#
+# `flask fyyur import <venues|artists|shows> FILE` streams a CSV or NDJSON
+# file, validates each batch of records against the same rules the forms
+# apply (validation.py), and inserts the valid ones a batch at a time, with
+# COPY on PostgreSQL for shows. Invalid records are reported with their line number
+# and skipped; they never abort the load. Shows that would double book a
+# venue or artist, against the database or earlier rows, are rejected too.
+# Each batch commits on its own, with the genre links or the venue and
+# artist show counters that go with it; the cached pages of the venues and
+# artists it adds shows to are then dropped, and the typeahead index updated.
+#
+# Start times are ISO 8601, with or without fractions of a second; those with
+# a UTC offset are stored in the server's local time (validation.timestamp).
+# ----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur data management commands.')
+
+
+class ImportReport(object):
+
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+
+def read_records(stream, fmt):
+    """ Yield (line number, record) pairs from a CSV or NDJSON stream. """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, {'_parse_error': str(e)}
+
+
+def _chunks(records, size):
+    """ Lists of up to <size> (line, record) pairs. """
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def venue_row(record):
+    return {
+        'name': record['name'],
+        'city': record['city'],
+        'state': record['state'],
+        'address': record['address'],
+        'phone': record['phone'],
+        'facebook_link': record['facebook_link'],
+        'image_link': record['image_link'],
+        'website': record['website_link'],
+        'seeking_talent': record['seeking_talent'],
+        'seeking_description': record['seeking_description'],
+        'upcoming_shows_count': 0,
+        'past_shows_count': 0,
+    }
+
+
+def artist_row(record):
+    return {
+        'name': record['name'],
+        'city': record['city'],
+        'state': record['state'],
+        'phone': record['phone'],
+        'facebook_link': record['facebook_link'],
+        'image_link': record['image_link'],
+        'website': record['website_link'],
+        'seeking_venue': record['seeking_venue'],
+        'seeking_description': record['seeking_description'],
+        'upcoming_shows_count': 0,
+        'past_shows_count': 0,
+    }
+
+
+class ForeignKeys(object):
+    """ Venue and artist ids, and ids by name, loaded once per import so
+    that show rows are resolved without a query each.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.by_name = {}
+        for model in (Venue, Artist):
+            ids, by_name = set(), {}
+            for entity_id, name in db.session.query(model.id, model.name):
+                ids.add(entity_id)
+                by_name.setdefault(name, entity_id)
+            self.ids[model] = ids
+            self.by_name[model] = by_name
+
+    def resolve(self, model, record, prefix):
+        """ The id named by <prefix>_id or <prefix>_name, or None. """
+        raw_id = record.get(prefix + '_id')
+        if raw_id not in (None, ''):
+            try:
+                entity_id = int(raw_id)
+            except (TypeError, ValueError):
+                return None
+            return entity_id if entity_id in self.ids[model] else None
+        return self.by_name[model].get(record.get(prefix + '_name'))
+
+
+def _show_record(record, keys):
+    """ Normalize a show record and resolve its venue and artist. """
+    resolved = dict(record)
+    errors = {}
+    for model, prefix in ((Venue, 'venue'), (Artist, 'artist')):
+        entity_id = keys.resolve(model, record, prefix)
+        if entity_id is None:
+            errors[prefix + '_id'] = ['Unknown {}.'.format(prefix)]
+        resolved[prefix + '_id'] = entity_id
+    return resolved, errors
+
+
+def _insert_batch(table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+def _copy_shows(rows):
+    """ COPY a batch of shows through the session's psycopg2 connection. """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row['venue_id'], row['artist_id'], row['start_time'].isoformat(),
+                         row['duration_minutes'], row['upcoming']))
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY shows (venue_id, artist_id, start_time, duration_minutes, upcoming) '
+                       'FROM STDIN WITH CSV', buffer)
+
+
+def _apply_show_counts(counts):
+    """ Add the imported shows to the venue and artist counters. """
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        table = model.__table__
+        for column in ('upcoming_shows_count', 'past_shows_count'):
+            deltas = [{'entity_id': entity_id, 'delta': n}
+                      for (kind, entity_id, counter), n in counts.items()
+                      if kind == key and counter == column]
+            if deltas:
+                db.session.execute(
+                    table.update()
+                    .where(table.c.id == db.bindparam('entity_id'))
+                    .values({column: db.func.coalesce(table.c[column], 0) + db.bindparam('delta')}),
+                    deltas)
+
+
+def import_records(kind, records, batch_size=1000, use_copy=None, now=None):
+    """ Validate and insert (line, record) pairs of <kind>, a batch at a time. """
+    report = ImportReport()
+    now = now or datetime.now()
+    if use_copy is None:
+        use_copy = db.engine.dialect.name == 'postgresql'
+
+    if kind == 'venues':
+        model, rules, to_row = Venue, VENUE_RULES, venue_row
+    elif kind == 'artists':
+        model, rules, to_row = Artist, ARTIST_RULES, artist_row
+    else:
+        model, rules, to_row = Show, SHOW_RULES, None
+        keys = ForeignKeys()
+        calendar = ShowCalendar()
+    table = model.__table__
+
+    batch, batch_genres, counts = [], [], Counter()
+    index_kind = 'venue' if kind == 'venues' else 'artist'
+
+    def flush():
+        if kind == 'shows':
+            if use_copy:
+                _copy_shows(batch)
+            else:
+                _insert_batch(table, batch)
+            _apply_show_counts(counts)
+            db.session.commit()
+            stale_pages = set()
+            for row in batch:
+                stale_pages.update((page_key('venue', row['venue_id']), page_key('artist', row['artist_id'])))
+                if row['upcoming']:
+                    count_upcoming_show(row['venue_id'], row['artist_id'])
+            invalidate_pages(sorted(stale_pages))
+        else:
+            # Through the ORM for the primary keys of the new rows, which the
+            # genre links need.
+            entities = [model(**row) for row in batch]
+            db.session.add_all(entities)
+            db.session.flush()
+            new_names = [(entity.id, entity.name) for entity in entities]
+            link_genres(model, zip((entity_id for entity_id, _ in new_names), batch_genres))
+            db.session.commit()
+            for entity_id, name in new_names:
+                index_name(index_kind, entity_id, name, 0)
+        report.inserted += len(batch)
+        del batch[:]
+        del batch_genres[:]
+        counts.clear()
+
+    for chunk in _chunks(records, batch_size):
+        parse_errors, fk_errors, chunk_records = {}, {}, []
+        for index, (line, record) in enumerate(chunk):
+            if '_parse_error' in record:
+                parse_errors[index] = {'record': [record['_parse_error']]}
+                record = {}
+            elif kind == 'shows':
+                record, errors = _show_record(record, keys)
+                if errors:
+                    fk_errors[index] = errors
+            chunk_records.append(record)
+        rows, row_errors = rules.validate_batch(chunk_records)
+
+        for index, ((line, record), row) in enumerate(zip(chunk, rows)):
+            if index in parse_errors:
+                report.add_error(line, parse_errors[index])
+                continue
+            if index in row_errors or index in fk_errors:
+                errors = dict(row_errors.get(index, {}))
+                errors.update(fk_errors.get(index, {}))
+                report.add_error(line, errors)
+                continue
+
+            if kind == 'shows':
+                venue_id, artist_id = chunk_records[index]['venue_id'], chunk_records[index]['artist_id']
+                start_time = row['start_time']
+                duration_minutes = row['duration_minutes'] or DEFAULT_SHOW_DURATION
+                conflicts = calendar.conflicts(venue_id, artist_id, start_time, duration_minutes)
+                if conflicts:
+                    report.add_error(line, conflicts)
+                    continue
+                calendar.book(venue_id, artist_id, start_time, duration_minutes, 'line {}'.format(line))
+                upcoming = start_time > now
+                counter = 'upcoming_shows_count' if upcoming else 'past_shows_count'
+                counts[('venue_id', venue_id, counter)] += 1
+                counts[('artist_id', artist_id, counter)] += 1
+                batch.append({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time,
+                              'duration_minutes': duration_minutes, 'upcoming': upcoming})
+            else:
+                batch.append(to_row(row))
+                batch_genres.append(row['genres'])
+        if batch:
+            flush()
+
+    return report
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--copy/--no-copy', 'use_copy', default=None,
+              help='Load shows with COPY (default on PostgreSQL).')
+@click.option('--errors', 'errors_file', type=click.File('w'),
+              help='Write rejected records here as NDJSON instead of stderr.')
+def import_command(kind, source, fmt, batch_size, use_copy, errors_file):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file.
+
+    Shows reference their venue and artist by venue_id/artist_id or by
+    venue_name/artist_name.
+    """
+    fmt = fmt or ('csv' if source.name.endswith('.csv') else 'ndjson')
+    report = import_records(kind, read_records(source, fmt), batch_size, use_copy)
+
+    errors_out = errors_file or sys.stderr
+    for error in report.errors:
+        errors_out.write(json.dumps(error) + '\n')
+    click.echo('Imported {} {}, rejected {}.'.format(report.inserted, kind, len(report.errors)))
+
+
+def init_importer(app):
+    app.cli.add_command(fyyur_cli)
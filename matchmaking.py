@@ -0,0 +1,472 @@
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import click
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+from sqlalchemy import false, func
+
+from forms import genre_choices
+from genres import genre_names
+from models import db, Artist, Show, Venue
+from query_budget import query_budget
+from summaries import register_summary, summary_changes_query
+
+# ----------------------------------------------------------------------------#
+# Matchmaking.
+#
+# /artists/<id>/matches and /venues/<id>/matches recommend seeking venues to
+# seeking artists and the other way round. Every seeking artist is scored
+# against every seeking venue:
+#
+#   GENRE_WEIGHT   * Jaccard similarity of their genres
+#   + STATE_WEIGHT   when they are in the same state
+#   + CITY_WEIGHT    when they are in the same city as well
+#   + HISTORY_WEIGHT * n / (n + 1) for n past shows of the artist at the venue
+#
+# and keeps the MATCHES_TOP_K best of each entity, exactly, without building
+# the full artists x venues matrix. Apart from past shows, a score only
+# depends on the genres and on whether the locations agree, so an entity's
+# best matches are among: the best by genre of the other side overall, in
+# its state and in its city, and the entities it played with. Entities
+# sharing genres and a location share the first three, so the genre
+# similarities are computed once per distinct (location, genres), as matrix
+# products of the genre bitsets unpacked to bits, MATCHES_BLOCK_SIZE rows at
+# a time. The candidates are then scored exactly and the best kept.
+#
+# The matches are computed on first use and recomputed in the background
+# once a write changed the locations, seeking flags or genres of artists or
+# venues (the `matches` summary, summaries.py), or once older than
+# MATCHES_MAX_AGE seconds for the past shows. They need numpy
+# (requirements.txt), which is imported on first use; without it the routes
+# answer 503.
+# ----------------------------------------------------------------------------#
+
+GENRE_WEIGHT = 1.0
+STATE_WEIGHT = 0.25
+CITY_WEIGHT = 0.25
+HISTORY_WEIGHT = 0.5
+
+# genre name -> bit; the form choices fit a uint32.
+GENRE_BITS = {genre: bit for bit, (genre, _) in enumerate(genre_choices)}
+
+# kind -> (model, seeking flag, endpoint, url argument)
+SIDES = {
+    'artist': (Artist, 'seeking_venue', 'main.show_artist', 'artist_id'),
+    'venue': (Venue, 'seeking_talent', 'main.show_venue', 'venue_id'),
+}
+OTHER_SIDE = {'artist': 'venue', 'venue': 'artist'}
+
+MATCHES = 'matches'
+
+matchmaking = Blueprint('matchmaking', __name__)
+
+# Keyed on its `changes` like the facet counts: the Matchmaker compares them
+# with those of its build.
+register_summary(MATCHES, (Artist, Venue), ('artists', 'venues', 'artist_genres', 'venue_genres'),
+                 refreshed=False, columns=('city', 'state', 'genres', 'seeking_venue', 'seeking_talent'))
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+def genre_bits(names):
+    """ The bitset of comma separated genre <names>; unknown genres are ignored. """
+    bits = 0
+    for name in (names or '').split(','):
+        bit = GENRE_BITS.get(name.strip())
+        if bit is not None:
+            bits |= 1 << bit
+    return bits
+
+
+class Side(object):
+    """ The seeking entities of one side, in ascending id order: their genre
+    bitsets and their state and (city, state) codes. Codes are shared by both
+    sides; a missing location gets a negative code of its side's own, so it
+    matches nothing.
+    """
+
+    def __init__(self, ids, genres, states, cities):
+        self.ids = ids
+        self.genres = genres
+        self.states = states
+        self.cities = cities
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def encode(cls, rows, codes, missing):
+        """ A Side of (id, city, state, genre names) <rows>, ordered by id.
+        <codes> is the location code table shared with the other side.
+        """
+        np = _numpy()
+        ids, genres, states, cities = [], [], [], []
+        for entity_id, city, state, names in rows:
+            state = (state or '').strip().upper()
+            city = (city or '').strip().casefold()
+            ids.append(entity_id)
+            genres.append(genre_bits(names))
+            states.append(codes.setdefault(('state', state), len(codes)) if state else missing)
+            cities.append(codes.setdefault(('city', city, state), len(codes)) if city and state else missing)
+        return cls(np.array(ids, dtype=np.int64), np.array(genres, dtype=np.uint32),
+                   np.array(states, dtype=np.int32), np.array(cities, dtype=np.int32))
+
+
+class Matches(object):
+    """ The best matches of each entity of a side: row i holds positions in
+    <other_ids> and scores for the i-th of <ids>, best first, padded with -1.
+    """
+
+    def __init__(self, ids, other_ids, positions, scores):
+        self.ids = ids
+        self.other_ids = other_ids
+        self.positions = positions
+        self.scores = scores
+
+    def lookup(self, entity_id, limit=None):
+        """ [(other id, score)] of <entity_id>; empty when it is not seeking. """
+        row = int(self.ids.searchsorted(entity_id))
+        if row == len(self.ids) or self.ids[row] != entity_id:
+            return []
+        positions = self.positions[row, :limit]
+        positions = positions[positions >= 0]
+        return [(int(other_id), round(float(score), 4)) for other_id, score in
+                zip(self.other_ids[positions], self.scores[row, :len(positions)])]
+
+
+@lru_cache(maxsize=None)
+def _popcount_table():
+    np = _numpy()
+    return np.array([bin(i).count('1') for i in range(1 << 16)], dtype=np.uint8)
+
+
+def _popcount(bits):
+    """ The number of set bits of each uint32 of <bits>. """
+    table = _popcount_table()
+    return table[bits & 0xFFFF] + table[bits >> 16]
+
+
+def _unpack(genres):
+    """ The genre bitsets as a float32 matrix of one column per genre. """
+    np = _numpy()
+    return ((genres[:, None] >> np.arange(len(GENRE_BITS), dtype=np.uint32)) & 1).astype(np.float32)
+
+
+def _jaccard(overlap, sizes, other_sizes):
+    np = _numpy()
+    union = sizes + other_sizes - overlap
+    return np.divide(overlap, union, out=np.zeros(union.shape, dtype=np.float32), where=union > 0)
+
+
+class Scorer(object):
+    """ Scores the entities of <side> against those of <other>, with the
+    past shows <co_shows> (side positions, other positions, show counts).
+    """
+
+    def __init__(self, side, other, co_shows):
+        np = _numpy()
+        self.side = side
+        self.other = other
+        self.sizes = _popcount(side.genres).astype(np.float32)
+        self.other_sizes = _popcount(other.genres).astype(np.float32)
+        positions, other_positions, counts = co_shows
+        # Past shows by (position * len(other) + other position).
+        keys = positions * len(other) + other_positions
+        order = np.argsort(keys)
+        self.show_keys = keys[order]
+        self.history = (HISTORY_WEIGHT * counts / (counts + 1.0)).astype(np.float32)[order]
+
+    def score(self, positions, other_positions):
+        """ The scores of the pairs of (broadcast) <positions> and <other_positions>. """
+        np = _numpy()
+        side, other = self.side, self.other
+        overlap = _popcount(side.genres[positions] & other.genres[other_positions]).astype(np.float32)
+        scores = _jaccard(overlap, self.sizes[positions], self.other_sizes[other_positions])
+        if GENRE_WEIGHT != 1.0:
+            scores *= np.float32(GENRE_WEIGHT)
+        scores += np.float32(STATE_WEIGHT) * (side.states[positions] == other.states[other_positions])
+        scores += np.float32(CITY_WEIGHT) * (side.cities[positions] == other.cities[other_positions])
+        if len(self.show_keys):
+            keys = positions * len(other) + other_positions
+            found = self.show_keys.searchsorted(keys).clip(max=len(self.show_keys) - 1)
+            scores += np.where(self.show_keys[found] == keys, self.history[found], np.float32(0))
+        return scores
+
+    def genre_candidates(self, keys, other_keys, k, block_size):
+        """ For each entity, the positions of <k> entities of the other side
+        sharing its key (a state, a city, ...) with the best genre similarity,
+        padded with -1. Negative keys share nothing.
+        """
+        np = _numpy()
+        side, other = self.side, self.other
+        candidates = np.full((len(side), k), -1, dtype=np.int64)
+
+        # Entities of the other side with the same key and genres score the
+        # same: only the first k of each (key, genres) can be a candidate.
+        kept = np.flatnonzero(other_keys >= 0)
+        kept = kept[np.lexsort((kept, other.genres[kept], other_keys[kept]))]
+        groups = np.r_[True, (other_keys[kept][1:] != other_keys[kept][:-1]) |
+                       (other.genres[kept][1:] != other.genres[kept][:-1])]
+        starts = np.maximum.accumulate(np.where(groups, np.arange(len(kept)), 0))
+        kept = kept[np.arange(len(kept)) - starts < k]
+        kept_keys = other_keys[kept]
+
+        # Likewise entities of this side with the same key and genres get the
+        # same candidates: score each (key, genres) once.
+        rows = np.flatnonzero(keys >= 0)
+        pairs, inverse = np.unique((keys[rows].astype(np.int64) << 32) | side.genres[rows], return_inverse=True)
+        pair_keys, pair_genres = pairs >> 32, (pairs & 0xFFFFFFFF).astype(np.uint32)
+        pair_candidates = np.full((len(pairs), k), -1, dtype=np.int64)
+
+        key_values, key_starts = np.unique(pair_keys, return_index=True)
+        key_stops = np.r_[key_starts[1:], len(pairs)]
+        column_starts = kept_keys.searchsorted(key_values)
+        column_stops = kept_keys.searchsorted(key_values, side='right')
+        for start, stop, column_start, column_stop in zip(key_starts, key_stops, column_starts, column_stops):
+            columns = kept[column_start:column_stop]
+            if len(columns) <= k:
+                pair_candidates[start:stop, :len(columns)] = columns
+                continue
+            column_bits = _unpack(other.genres[columns]).T
+            column_sizes = self.other_sizes[columns]
+            for block in range(start, stop, block_size):
+                genres = pair_genres[block:min(block + block_size, stop)]
+                similarity = _jaccard(_unpack(genres) @ column_bits, _popcount(genres)[:, None].astype(np.float32),
+                                      column_sizes[None, :])
+                # Best similarity first, then lowest position. Similarities
+                # of distinct genre sets differ by more than 1e-4.
+                order = np.rint((1 - similarity) * 1e6).astype(np.int64) * len(other) + columns
+                best = np.argpartition(order, k - 1, axis=1)[:, :k]
+                pair_candidates[block:block + len(genres)] = columns[best]
+
+        candidates[rows] = pair_candidates[inverse.reshape(-1)]
+        return candidates
+
+    def history_candidates(self, co_shows, k):
+        """ For each entity, the positions of the <k> best scoring entities
+        of the other side it played with, padded with -1.
+        """
+        np = _numpy()
+        positions, other_positions, _ = co_shows
+        candidates = np.full((len(self.side), k), -1, dtype=np.int64)
+        scores = self.score(positions, other_positions)
+        order = np.lexsort((other_positions, -scores, positions))
+        positions, other_positions = positions[order], other_positions[order]
+        firsts = np.r_[True, positions[1:] != positions[:-1]]
+        ranks = np.arange(len(positions)) - np.maximum.accumulate(np.where(firsts, np.arange(len(positions)), 0))
+        best = ranks < k
+        candidates[positions[best], ranks[best]] = other_positions[best]
+        return candidates
+
+    def best(self, candidates, k):
+        """ (positions, scores) of the <k> best distinct <candidates> of each
+        entity, best first, then by position; -1 and 0 pad.
+        """
+        np = _numpy()
+        rows = np.arange(len(self.side))[:, None]
+        scores = np.where(candidates >= 0, self.score(rows, candidates.clip(min=0)), -np.inf)
+        order = np.lexsort((candidates, -scores), axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        # A candidate found twice has the same score, so its copies are adjacent.
+        keep = (candidates >= 0) & (scores > 0) & \
+            np.c_[np.ones(len(candidates), dtype=bool), candidates[:, 1:] != candidates[:, :-1]]
+        ranks = np.cumsum(keep, axis=1) - 1
+        keep &= ranks < k
+        positions = np.full((len(candidates), k), -1, dtype=np.int32)
+        best_scores = np.zeros((len(candidates), k), dtype=np.float32)
+        row_indexes = np.nonzero(keep)[0]
+        positions[row_indexes, ranks[keep]] = candidates[keep]
+        best_scores[row_indexes, ranks[keep]] = scores[keep]
+        return positions, best_scores
+
+
+def top_matches(side, other, co_shows, k, block_size):
+    """ The Matches of the <k> best entities of <other> for each of <side>. """
+    np = _numpy()
+    if not len(side) or not len(other):
+        return Matches(side.ids, other.ids, np.full((len(side), 0), -1, dtype=np.int32),
+                       np.zeros((len(side), 0), dtype=np.float32))
+    scorer = Scorer(side, other, co_shows)
+    k = min(k, len(other))
+    candidates = np.hstack([
+        scorer.genre_candidates(np.zeros(len(side), dtype=np.int32), np.zeros(len(other), dtype=np.int32),
+                                k, block_size),
+        scorer.genre_candidates(side.states, other.states, k, block_size),
+        scorer.genre_candidates(side.cities, other.cities, k, block_size),
+        scorer.history_candidates(co_shows, k),
+    ])
+    positions, scores = scorer.best(candidates, k)
+    return Matches(side.ids, other.ids, positions, scores)
+
+
+def match(artists, venues, co_shows, k, block_size):
+    """ (artist Matches, venue Matches) of the <k> best pairs of each entity.
+    <co_shows> is (artist positions, venue positions, past show counts).
+    """
+    artist_positions, venue_positions, counts = co_shows
+    return (top_matches(artists, venues, co_shows, k, block_size),
+            top_matches(venues, artists, (venue_positions, artist_positions, counts), k, block_size))
+
+
+# ----------------------------------------------------------------------------#
+# Loading.
+# ----------------------------------------------------------------------------#
+
+def _seeking_rows(kind):
+    model, seeking = SIDES[kind][:2]
+    return db.session.query(model.id, model.city, model.state, genre_names(model)) \
+        .filter(func.coalesce(getattr(model, seeking), false())) \
+        .order_by(model.id)
+
+
+def load_sides():
+    """ (artists, venues, co_shows) of the seeking entities, for match(). """
+    np = _numpy()
+    codes = {}
+    artists = Side.encode(_seeking_rows('artist'), codes, -1)
+    venues = Side.encode(_seeking_rows('venue'), codes, -2)
+
+    pairs = db.session.query(Show.artist_id, Show.venue_id, func.count()) \
+        .filter(Show.start_time < datetime.now()) \
+        .group_by(Show.artist_id, Show.venue_id) \
+        .all()
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+    artist_positions = artists.ids.searchsorted(pairs[:, 0]).clip(max=max(len(artists) - 1, 0))
+    venue_positions = venues.ids.searchsorted(pairs[:, 1]).clip(max=max(len(venues) - 1, 0))
+    seeking = np.zeros(len(pairs), dtype=bool)
+    if len(artists) and len(venues):
+        seeking = (artists.ids[artist_positions] == pairs[:, 0]) & (venues.ids[venue_positions] == pairs[:, 1])
+    order = np.argsort(artist_positions[seeking], kind='stable')
+    co_shows = (artist_positions[seeking][order], venue_positions[seeking][order],
+                pairs[seeking, 2][order].astype(np.float32))
+    return artists, venues, co_shows
+
+
+def matches_changes():
+    """ The `changes` of the matches summary; None without its counters. """
+    state = db.session.execute(summary_changes_query(MATCHES)).first()
+    return None if state is None else state.changes
+
+
+class Matchmaker(object):
+    """ The matches of an app: computed on first use, recomputed in the
+    background after a write to what they depend on or once older than
+    <max_age> seconds.
+    """
+
+    def __init__(self, app, max_age, top_k, block_size):
+        self.app = app
+        self.max_age = max_age
+        self.top_k = top_k
+        self.block_size = block_size
+        # kind -> Matches
+        self.matches = None
+        self.built_at = 0
+        # The summary's changes included in the matches.
+        self.built_changes = None
+        self._building = threading.Lock()
+
+    def rebuild(self):
+        # Read first: a write during the build makes the next request rebuild.
+        changes = matches_changes()
+        artists, venues, co_shows = load_sides()
+        artist_matches, venue_matches = match(artists, venues, co_shows, self.top_k, self.block_size)
+        self.matches = {'artist': artist_matches, 'venue': venue_matches}
+        self.built_at = time.monotonic()
+        self.built_changes = changes
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception:
+            self.app.logger.exception('Matches rebuild failed')
+        finally:
+            self._building.release()
+
+    def is_stale(self):
+        if self.max_age and time.monotonic() - self.built_at > self.max_age:
+            return True
+        return matches_changes() != self.built_changes
+
+    def get_matches(self, kind):
+        if self.matches is None:
+            with self._building:
+                if self.matches is None:
+                    self.rebuild()
+        elif self.is_stale() and self._building.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name='matchmaking', daemon=True).start()
+        return self.matches[kind]
+
+
+# ----------------------------------------------------------------------------#
+# Routes.
+# ----------------------------------------------------------------------------#
+
+def _matches_response(kind, entity_id):
+    model = SIDES[kind][0]
+    other_model, _, endpoint, argument = SIDES[OTHER_SIDE[kind]]
+    try:
+        _numpy()
+    except ImportError:
+        abort(503, 'Matches need numpy')
+    if db.session.query(model.id).filter(model.id == entity_id).first() is None:
+        abort(404)
+
+    top_k = current_app.config['MATCHES_TOP_K']
+    limit = max(1, min(request.args.get('limit', top_k, type=int), top_k))
+    matches = current_app.extensions['matchmaking'].get_matches(kind).lookup(entity_id, limit)
+
+    # Current names and locations; entities deleted since the build drop out.
+    rows = {}
+    if matches:
+        rows = {row.id: row for row in db.session.query(other_model.id, other_model.name, other_model.city,
+                                                        other_model.state)
+                .filter(other_model.id.in_([other_id for other_id, _ in matches]))}
+    results = [{
+        'type': OTHER_SIDE[kind],
+        'id': other_id,
+        'name': rows[other_id].name,
+        'city': rows[other_id].city,
+        'state': rows[other_id].state,
+        'score': score,
+        'url': url_for(endpoint, **{argument: other_id}),
+    } for other_id, score in matches if other_id in rows]
+    return jsonify({'type': kind, 'id': entity_id, 'results': results})
+
+
+# Later requests read the summary's changes once; the first request of a
+# process also reads them and runs the 3 queries loading the sides.
+@matchmaking.route('/artists/<int:artist_id>/matches')
+@query_budget(6)
+def artist_matches(artist_id):
+    return _matches_response('artist', artist_id)
+
+
+@matchmaking.route('/venues/<int:venue_id>/matches')
+@query_budget(6)
+def venue_matches(venue_id):
+    return _matches_response('venue', venue_id)
+
+
+def init_matchmaking(app):
+    app.extensions['matchmaking'] = Matchmaker(app, app.config.get('MATCHES_MAX_AGE'),
+                                               app.config['MATCHES_TOP_K'], app.config['MATCHES_BLOCK_SIZE'])
+
+    @app.cli.command('compute-matches')
+    def compute_matches_command():
+        """Compute the artist/venue matches and report how long it took."""
+        started = time.perf_counter()
+        artists, venues, co_shows = load_sides()
+        loaded = time.perf_counter()
+        match(artists, venues, co_shows, app.config['MATCHES_TOP_K'], app.config['MATCHES_BLOCK_SIZE'])
+        click.echo('{} artists x {} venues: loaded in {:.2f} s, scored in {:.2f} s.'.format(
+            len(artists), len(venues), loaded - started, time.perf_counter() - loaded))
+
+    app.register_blueprint(matchmaking)
@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+# ----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+# Cursor events time every SQL statement and attribute it to the current
+# request. Per-endpoint histograms of request latency, DB time and query count
+# are served in the Prometheus text format at /_metrics; in debug mode each
+# response also carries its own numbers in X-DB-* headers. Pooled engines use
+# InstrumentedQueuePool, which adds checkout wait time and pool saturation.
+# ----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestSQLStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.pool_wait = 0.0
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry(object):
+    """ Histograms keyed by (metric name, endpoint). """
+
+    METRICS = (
+        ('fyyur_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS),
+        ('fyyur_request_db_seconds', 'Time spent executing SQL per request.', LATENCY_BUCKETS),
+        ('fyyur_request_queries', 'SQL statements issued per request.', QUERY_COUNT_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name, endpoint, value):
+        with self._lock:
+            histogram = self._histograms.get((name, endpoint))
+            if histogram is None:
+                buckets = next(b for metric, _, b in self.METRICS if metric == name)
+                histogram = self._histograms[(name, endpoint)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, description, _ in self.METRICS:
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} histogram'.format(name))
+                for (metric, endpoint), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, total in histogram.cumulative():
+                        lines.append('{}_bucket{{endpoint="{}",le="{}"}} {}'.format(
+                            name, endpoint, bound, total))
+                    lines.append('{}_bucket{{endpoint="{}",le="+Inf"}} {}'.format(
+                        name, endpoint, histogram.count))
+                    lines.append('{}_sum{{endpoint="{}"}} {}'.format(name, endpoint, histogram.sum))
+                    lines.append('{}_count{{endpoint="{}"}} {}'.format(name, endpoint, histogram.count))
+        return lines
+
+
+class InstrumentedQueuePool(QueuePool):
+    """ QueuePool that times how long each checkout waits for a connection. """
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.wait_histogram = Histogram(LATENCY_BUCKETS)
+        self.timeouts = 0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        except PoolTimeout:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.wait_histogram.observe(waited)
+            if has_request_context() and 'sql_stats' in g:
+                g.sql_stats.pool_wait += waited
+
+    def recreate(self):
+        # Keep the recorded stats when the engine swaps in a fresh pool.
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.wait_histogram = self.wait_histogram
+        pool.timeouts = self.timeouts
+        return pool
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_start_time = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_start_time
+    if has_request_context() and 'sql_stats' in g:
+        g.sql_stats.record(statement, elapsed)
+
+
+def _pool_lines(pool):
+    if not isinstance(pool, InstrumentedQueuePool):
+        return []
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    name = 'fyyur_db_pool_checkout_wait_seconds'
+    lines = ['# HELP {} Time spent waiting for a pooled connection.'.format(name),
+             '# TYPE {} histogram'.format(name)]
+    for bound, total in pool.wait_histogram.cumulative():
+        lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound, total))
+    lines.append('{}_bucket{{le="+Inf"}} {}'.format(name, pool.wait_histogram.count))
+    lines.append('{}_sum {}'.format(name, pool.wait_histogram.sum))
+    lines.append('{}_count {}'.format(name, pool.wait_histogram.count))
+    for gauge, value in (('fyyur_db_pool_size', pool.size()),
+                         ('fyyur_db_pool_capacity', capacity),
+                         ('fyyur_db_pool_checked_out', pool.checkedout()),
+                         ('fyyur_db_pool_overflow', max(pool.overflow(), 0)),
+                         ('fyyur_db_pool_saturation', pool.checkedout() / float(capacity))):
+        lines.append('# TYPE {} gauge'.format(gauge))
+        lines.append('{} {}'.format(gauge, value))
+    lines.append('# TYPE fyyur_db_pool_timeouts_total counter')
+    lines.append('fyyur_db_pool_timeouts_total {}'.format(pool.timeouts))
+    return lines
+
+
+def _page_cache_lines():
+    cache = current_app.extensions.get('page_cache')
+    if cache is None:
+        return []
+    lines = []
+    for counter, value in sorted(cache.stats.as_dict().items()):
+        name = 'fyyur_page_cache_{}_total'.format(counter)
+        lines.append('# TYPE {} counter'.format(name))
+        lines.append('{} {}'.format(name, value))
+    return lines
+
+
+def init_metrics(app, db):
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+
+    # Read when the engine is first created, so this still applies after
+    # db.init_app().
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if 'pool_size' in options:
+        options.setdefault('poolclass', InstrumentedQueuePool)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    @app.before_request
+    def start_request_stats():
+        g.request_start_time = time.perf_counter()
+        g.sql_stats = RequestSQLStats()
+
+    @app.after_request
+    def add_sql_headers(response):
+        stats = g.get('sql_stats')
+        if app.debug and stats is not None:
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time'] = '{:.2f}ms'.format(stats.total_time * 1000)
+            response.headers['X-DB-Pool-Wait'] = '{:.2f}ms'.format(stats.pool_wait * 1000)
+            if stats.slowest_statement is not None:
+                statement = ' '.join(stats.slowest_statement.split())[:200]
+                response.headers['X-DB-Slowest'] = '{:.2f}ms {}'.format(
+                    stats.slowest_time * 1000, statement.encode('ascii', 'replace').decode())
+        return response
+
+    # Recorded on teardown so that streamed responses are measured until
+    # their last chunk has been rendered.
+    @app.teardown_request
+    def record_request_stats(exc):
+        stats = g.get('sql_stats')
+        if stats is None or request.endpoint is None:
+            return
+        endpoint = request.endpoint
+        registry.observe('fyyur_request_duration_seconds', endpoint,
+                         time.perf_counter() - g.request_start_time)
+        registry.observe('fyyur_request_db_seconds', endpoint, stats.total_time)
+        registry.observe('fyyur_request_queries', endpoint, stats.count)
+
+    @app.route('/_metrics')
+    def metrics():
+        lines = registry.render() + _pool_lines(db.engine.pool) + _page_cache_lines()
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    return registry
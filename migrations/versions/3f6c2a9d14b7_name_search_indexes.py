@@ -0,0 +1,67 @@
+"""name search indexes
+
+Revision ID: 3f6c2a9d14b7
+Revises: 98231b421330
+Create Date: 2026-10-17 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a9d14b7'
+down_revision = '98231b421330'
+branch_labels = None
+depends_on = None
+
+SEARCHABLE_TABLES = ('venues', 'artists')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in SEARCHABLE_TABLES:
+            op.create_index('ix_{}_name_trgm'.format(table), table, ['name'],
+                            postgresql_using='gin',
+                            postgresql_ops={'name': 'gin_trgm_ops'})
+
+    elif dialect == 'sqlite':
+        for table in SEARCHABLE_TABLES:
+            fts = '{}_name_fts'.format(table)
+            op.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                "name, content='{table}', content_rowid='id', tokenize='trigram')"
+                .format(fts=fts, table=table))
+            op.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END"
+                .format(fts=fts, table=table))
+            op.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END"
+                .format(fts=fts, table=table))
+            op.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+                "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END"
+                .format(fts=fts, table=table))
+            # Index the rows that existed before the triggers did.
+            op.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table in SEARCHABLE_TABLES:
+            op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
+
+    elif dialect == 'sqlite':
+        for table in SEARCHABLE_TABLES:
+            fts = '{}_name_fts'.format(table)
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS {}_{}'.format(fts, suffix))
+            op.execute('DROP TABLE IF EXISTS {}'.format(fts))
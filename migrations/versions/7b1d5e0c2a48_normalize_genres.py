@@ -0,0 +1,103 @@
+"""normalize genres
+
+Revision ID: 7b1d5e0c2a48
+Revises: 3f6c2a9d14b7
+Create Date: 2026-10-17 14:03:21.502117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1d5e0c2a48'
+down_revision = '3f6c2a9d14b7'
+branch_labels = None
+depends_on = None
+
+# (owner table, link table, owner key)
+GENRE_OWNERS = (
+    ('venues', 'venue_genres', 'venue_id'),
+    ('artists', 'artist_genres', 'artist_id'),
+)
+
+
+def parse_legacy_genres(value):
+    """ Names from a legacy genres string: 'Jazz,Funk', a PostgreSQL array
+    literal ('{Jazz,"Hip-Hop"}') or a stringified Python list.
+    """
+    value = (value or '').strip().strip('{}[]')
+    names = [name.strip().strip('"\'').strip() for name in value.split(',')]
+    return sorted({name for name in names if name})
+
+
+def _drop_genres_column(table, dialect):
+    if dialect == 'sqlite':
+        # ALTER TABLE ... DROP COLUMN (SQLite 3.35+) keeps the table and its
+        # FTS triggers in place, which a batch copy-and-rename would not.
+        op.execute('ALTER TABLE {} DROP COLUMN genres'.format(table))
+    else:
+        op.drop_column(table, 'genres')
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    genres = op.create_table(
+        'genres',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    links = {}
+    for table, link, key in GENRE_OWNERS:
+        links[table] = op.create_table(
+            link,
+            sa.Column(key, sa.Integer(), nullable=False),
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([key], ['{}.id'.format(table)], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['genre_id'], ['genres.id']),
+            sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id'.format(link), link, ['genre_id', key])
+
+    # Move the existing genre strings into the link tables.
+    owned = {}
+    for table, _, _ in GENRE_OWNERS:
+        rows = bind.execute(sa.text('SELECT id, genres FROM {}'.format(table)))
+        owned[table] = [(entity_id, parse_legacy_genres(value)) for entity_id, value in rows]
+
+    names = sorted({name for rows in owned.values() for _, entity_genres in rows for name in entity_genres})
+    if names:
+        op.bulk_insert(genres, [{'name': name} for name in names])
+    genre_ids = dict((name, genre_id) for genre_id, name in bind.execute(sa.text('SELECT id, name FROM genres')))
+
+    for table, _, key in GENRE_OWNERS:
+        rows = [{key: entity_id, 'genre_id': genre_ids[name]}
+                for entity_id, entity_genres in owned[table] for name in entity_genres]
+        if rows:
+            op.bulk_insert(links[table], rows)
+        _drop_genres_column(table, dialect)
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    for table, link, key in GENRE_OWNERS:
+        op.add_column(table, sa.Column('genres', sa.String(length=120), nullable=False, server_default=''))
+        rows = bind.execute(sa.text(
+            'SELECT {link}.{key}, genres.name FROM {link} '
+            'JOIN genres ON genres.id = {link}.genre_id '
+            'ORDER BY {link}.{key}, genres.name'.format(link=link, key=key)))
+        joined = {}
+        for entity_id, name in rows:
+            joined.setdefault(entity_id, []).append(name)
+        for entity_id, entity_genres in joined.items():
+            bind.execute(sa.text('UPDATE {} SET genres = :genres WHERE id = :id'.format(table)),
+                         {'genres': ','.join(entity_genres), 'id': entity_id})
+        op.drop_index('ix_{}_genre_id'.format(link), table_name=link)
+        op.drop_table(link)
+
+    op.drop_table('genres')
@@ -0,0 +1,41 @@
+"""matches summary
+
+Revision ID: a4c81d2f6b37
+Revises: f27c9e3b5d14
+Create Date: 2026-10-18 09:24:51.736204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c81d2f6b37'
+down_revision = 'f27c9e3b5d14'
+branch_labels = None
+depends_on = None
+
+SUMMARY = 'matches'
+# summaries.SUMMARY_SLOTS
+SLOTS = 16
+
+
+def upgrade():
+    summary_refreshes = sa.table(
+        'summary_refreshes',
+        sa.column('name', sa.String),
+        sa.column('refreshed_changes', sa.Integer),
+    )
+    summary_changes = sa.table(
+        'summary_changes',
+        sa.column('name', sa.String),
+        sa.column('slot', sa.Integer),
+        sa.column('changes', sa.Integer),
+    )
+    op.bulk_insert(summary_refreshes, [{'name': SUMMARY, 'refreshed_changes': 0}])
+    op.bulk_insert(summary_changes, [{'name': SUMMARY, 'slot': slot, 'changes': 0} for slot in range(SLOTS)])
+
+
+def downgrade():
+    op.execute(sa.text('DELETE FROM summary_changes WHERE name = :name').bindparams(name=SUMMARY))
+    op.execute(sa.text('DELETE FROM summary_refreshes WHERE name = :name').bindparams(name=SUMMARY))
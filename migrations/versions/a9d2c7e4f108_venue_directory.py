@@ -0,0 +1,49 @@
+"""precomputed venue directory
+
+Revision ID: a9d2c7e4f108
+Revises: e5a07d6b9c13
+Create Date: 2026-10-17 18:02:37.419265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d2c7e4f108'
+down_revision = 'e5a07d6b9c13'
+branch_labels = None
+depends_on = None
+
+DIRECTORY_SELECT = ('SELECT id AS venue_id, city, state, name, '
+                    'COALESCE(upcoming_shows_count, 0) AS upcoming_shows_count FROM venues')
+
+
+def upgrade():
+    summary_refreshes = op.create_table(
+        'summary_refreshes',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('changes', sa.Integer(), nullable=False),
+        sa.Column('refreshed_changes', sa.Integer(), nullable=False),
+        sa.Column('stale_since', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(summary_refreshes, [{'name': 'venue_directory', 'changes': 0, 'refreshed_changes': 0}])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE MATERIALIZED VIEW venue_directory AS ' + DIRECTORY_SELECT)
+        op.execute('CREATE UNIQUE INDEX ix_venue_directory_venue_id ON venue_directory (venue_id)')
+    else:
+        op.execute('CREATE TABLE venue_directory (venue_id INTEGER PRIMARY KEY, '
+                   'city VARCHAR(120), state VARCHAR(120), name VARCHAR, upcoming_shows_count INTEGER)')
+        op.execute('INSERT INTO venue_directory ' + DIRECTORY_SELECT)
+    op.execute('CREATE INDEX ix_venue_directory_city_state_name ON venue_directory (city, state, name)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP MATERIALIZED VIEW venue_directory')
+    else:
+        op.execute('DROP TABLE venue_directory')
+    op.drop_table('summary_refreshes')
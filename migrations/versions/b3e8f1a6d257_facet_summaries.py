@@ -0,0 +1,34 @@
+"""facet summaries
+
+Revision ID: b3e8f1a6d257
+Revises: a9d2c7e4f108
+Create Date: 2026-10-17 19:12:08.530172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f1a6d257'
+down_revision = 'a9d2c7e4f108'
+branch_labels = None
+depends_on = None
+
+SUMMARIES = ('venue_facets', 'artist_facets')
+
+
+def upgrade():
+    summary_refreshes = sa.table(
+        'summary_refreshes',
+        sa.column('name', sa.String),
+        sa.column('changes', sa.Integer),
+        sa.column('refreshed_changes', sa.Integer),
+    )
+    op.bulk_insert(summary_refreshes, [{'name': name, 'changes': 0, 'refreshed_changes': 0}
+                                       for name in SUMMARIES])
+
+
+def downgrade():
+    op.execute(sa.text('DELETE FROM summary_refreshes WHERE name IN :names')
+               .bindparams(sa.bindparam('names', SUMMARIES, expanding=True)))
@@ -0,0 +1,39 @@
+"""show and directory indexes
+
+Revision ID: c41e9a7f3b25
+Revises: 7b1d5e0c2a48
+Create Date: 2026-10-17 15:26:48.730914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e9a7f3b25'
+down_revision = '7b1d5e0c2a48'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time']),
+    ('ix_shows_start_time_id', 'shows', ['start_time', 'id']),
+    ('ix_venues_city_state_name', 'venues', ['city', 'state', 'name']),
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build without blocking writes; CONCURRENTLY cannot run in a transaction.
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,61 @@
+"""summary change slots
+
+Revision ID: d61f4b2e8a93
+Revises: b3e8f1a6d257
+Create Date: 2026-10-17 21:40:15.284617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd61f4b2e8a93'
+down_revision = 'b3e8f1a6d257'
+branch_labels = None
+depends_on = None
+
+# summaries.SUMMARY_SLOTS
+SLOTS = 16
+# Only refreshed summaries keep a stale_since.
+UNREFRESHED = ('venue_facets', 'artist_facets')
+
+
+def upgrade():
+    op.create_table(
+        'summary_changes',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('slot', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('changes', sa.Integer(), nullable=False),
+        sa.Column('stale_since', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['name'], ['summary_refreshes.name'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('name', 'slot')
+    )
+    # The counts so far go to slot 0.
+    op.execute(sa.text(
+        'INSERT INTO summary_changes (name, slot, changes, stale_since) '
+        'SELECT name, 0, changes, CASE WHEN name IN :unrefreshed THEN NULL ELSE stale_since END '
+        'FROM summary_refreshes'
+    ).bindparams(sa.bindparam('unrefreshed', UNREFRESHED, expanding=True)))
+    for slot in range(1, SLOTS):
+        op.execute(sa.text('INSERT INTO summary_changes (name, slot, changes) '
+                           'SELECT name, :slot, 0 FROM summary_refreshes').bindparams(slot=slot))
+    with op.batch_alter_table('summary_refreshes') as batch_op:
+        batch_op.drop_column('stale_since')
+        batch_op.drop_column('changes')
+
+
+def downgrade():
+    with op.batch_alter_table('summary_refreshes') as batch_op:
+        batch_op.add_column(sa.Column('changes', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('stale_since', sa.DateTime(), nullable=True))
+    op.execute(
+        'UPDATE summary_refreshes SET '
+        'changes = (SELECT SUM(changes) FROM summary_changes '
+        'WHERE summary_changes.name = summary_refreshes.name), '
+        'stale_since = (SELECT MIN(stale_since) FROM summary_changes '
+        'WHERE summary_changes.name = summary_refreshes.name)'
+    )
+    with op.batch_alter_table('summary_refreshes') as batch_op:
+        batch_op.alter_column('changes', server_default=None)
+    op.drop_table('summary_changes')
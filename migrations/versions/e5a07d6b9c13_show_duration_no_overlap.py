@@ -0,0 +1,56 @@
+"""show duration and no-overlap constraints
+
+Revision ID: e5a07d6b9c13
+Revises: c41e9a7f3b25
+Create Date: 2026-10-17 16:41:05.284661
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a07d6b9c13'
+down_revision = 'c41e9a7f3b25'
+branch_labels = None
+depends_on = None
+
+DURATION_CHECK = 'ck_shows_duration_minutes'
+SHOW_SLOT = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+OWNERS = ('venue_id', 'artist_id')
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), nullable=False, server_default='120'))
+    # The overlap checks look back scheduling.MAX_SHOW_DURATION minutes at most.
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.create_check_constraint(DURATION_CHECK, 'duration_minutes BETWEEN 1 AND 720')
+
+    if bind.dialect.name == 'postgresql':
+        # Existing double bookings would make the constraints fail to build;
+        # list them so they can be resolved first.
+        for owner in OWNERS:
+            clashes = bind.execute(sa.text(
+                'SELECT a.id, b.id FROM shows a JOIN shows b '
+                'ON a.{owner} = b.{owner} AND a.id < b.id '
+                'AND tsrange(a.start_time, a.start_time + a.duration_minutes * interval \'1 minute\') && '
+                'tsrange(b.start_time, b.start_time + b.duration_minutes * interval \'1 minute\') '
+                'LIMIT 20'.format(owner=owner))).fetchall()
+            if clashes:
+                raise RuntimeError('Overlapping shows for the same {}: {}'.format(
+                    owner, ', '.join('{}/{}'.format(a, b) for a, b in clashes)))
+
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for owner in OWNERS:
+            op.execute('ALTER TABLE shows ADD CONSTRAINT shows_{owner}_no_overlap '
+                       'EXCLUDE USING gist ({owner} WITH =, {slot} WITH &&)'.format(owner=owner, slot=SHOW_SLOT))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for owner in OWNERS:
+            op.drop_constraint('shows_{}_no_overlap'.format(owner), 'shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_constraint(DURATION_CHECK, type_='check')
+        batch_op.drop_column('duration_minutes')
@@ -0,0 +1,30 @@
+"""job leases
+
+Revision ID: f27c9e3b5d14
+Revises: d61f4b2e8a93
+Create Date: 2026-10-17 22:10:42.519307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f27c9e3b5d14'
+down_revision = 'd61f4b2e8a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_leases',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('holder', sa.String(length=128), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('job_leases')
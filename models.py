@@ -1,6 +1,25 @@
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 
-db = SQLAlchemy()
+from replicas import RoutingSQLAlchemy
+from search import register_name_search
+
+db = RoutingSQLAlchemy()
+
+# Many-to-many links between venues/artists and genres. The (genre_id, owner)
+# index lets a genre filter be answered from the index alone.
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id')
+)
 
 
 # ----------------------------------------------------------------------------#
@@ -9,6 +28,12 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # The directory reads venues in (city, state, name) order.
+        db.Index('ix_venues_city_state_name', 'city', 'state', 'name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -21,25 +46,30 @@ class Venue(db.Model):
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name', lazy='select')
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.Text)
     upcoming_shows_count = db.Column(db.Integer, default=0)
     past_shows_count = db.Column(db.Integer, default=0)
-    shows = db.relationship('Show', backref='venues', lazy='joined',
+    # Loaded per query by the views; see the loader options in app.py.
+    shows = db.relationship('Show', backref='venue', lazy='select',
                             cascade="all, delete")
 
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name', lazy='select')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
@@ -50,17 +80,36 @@ class Artist(db.Model):
     seeking_description = db.Column(db.Text)
     upcoming_shows_count = db.Column(db.Integer, default=0)
     past_shows_count = db.Column(db.Integer, default=0)
-    shows = db.relationship('Show', backref='artists', lazy='joined',
+    shows = db.relationship('Show', backref='artist', lazy='select',
                             cascade="all, delete")
 
 
+class Genre(db.Model):
+    __tablename__ = 'genres'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Genre id={self.id} name={self.name}>"
+
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties,
 #  as a database migration.
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        # Detail pages split a venue's or artist's shows on start_time; the
+        # shows listing pages through (start_time, id).
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        # scheduling.MAX_SHOW_DURATION: the overlap checks only look that far back.
+        db.CheckConstraint('duration_minutes BETWEEN 1 AND 720', name='ck_shows_duration_minutes'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=120, server_default='120')
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id')
                           , nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id')
@@ -69,3 +118,57 @@ class Show(db.Model):
 
     def __repr__(self):
         return f"<Show id={self.id} artist_id={self.artist_id} venue_id={self.venue_id} start_time={self.start_time}"
+
+
+class SummaryRefresh(db.Model):
+    """ Freshness of a precomputed summary such as the venue directory. A
+    refresh records the sum of the summary's SummaryChange counters it
+    includes in `refreshed_changes`.
+    """
+    __tablename__ = 'summary_refreshes'
+    name = db.Column(db.String(64), primary_key=True)
+    refreshed_changes = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime)
+
+
+class SummaryChange(db.Model):
+    """ One of the counters of the writes to a summary's source tables.
+    Writers bump `changes` of a random slot and set its `stale_since`, so
+    concurrent writers rarely wait on the same row.
+    """
+    __tablename__ = 'summary_changes'
+    name = db.Column(db.String(64), db.ForeignKey('summary_refreshes.name', ondelete='CASCADE'),
+                     primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    changes = db.Column(db.Integer, nullable=False, default=0)
+    stale_since = db.Column(db.DateTime)
+
+
+class JobLease(db.Model):
+    """ Which process runs a periodic job such as the show rollover. The
+    holder renews `expires_at` on each run; another process takes the lease
+    over once it has expired.
+    """
+    __tablename__ = 'job_leases'
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+# The trigram GIN indexes need pg_trgm; SQLite gets FTS5 mirrors instead.
+event.listen(db.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+register_name_search(Venue.__table__)
+register_name_search(Artist.__table__)
+
+# No venue or artist may have two overlapping shows. The GiST exclusion
+# constraints need btree_gist for the integer equality part; other databases
+# rely on the checks in scheduling.py.
+SHOW_SLOT = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+event.listen(db.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+for _owner in ('venue_id', 'artist_id'):
+    event.listen(Show.__table__, 'after_create', DDL(
+        'ALTER TABLE shows ADD CONSTRAINT shows_{owner}_no_overlap '
+        'EXCLUDE USING gist ({owner} WITH =, {slot} WITH &&)'.format(owner=_owner, slot=SHOW_SLOT)
+    ).execute_if(dialect='postgresql'))
@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, jsonify, session
+
+from models import db, Show
+from replicas import read_from_lagging_replica
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered venue and artist detail pages are cached under "venue:<id>" and
+# "artist:<id>". The views that write venues, artists or shows invalidate the
+# keys whose pages they change; the TTL bounds how long a show can stay in the
+# "upcoming" section after its start time. Pages read from a lagging replica
+# are served but not stored: they can predate a write whose invalidation has
+# already run, and would then be cached for the whole TTL.
+# ----------------------------------------------------------------------------#
+
+
+class CacheStats(object):
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class LRUCache(object):
+    """ In-process cache: least recently used entries are evicted once
+    <maxsize> is reached, entries older than <ttl> seconds are misses.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.stats.invalidations += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(object):
+    """ Cache shared by every worker on a host through one SQLite file.
+    Same LRU/TTL policy as LRUCache; the stats are per process.
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=300):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS page_cache ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'expires REAL NOT NULL, accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_page_cache_accessed '
+                         'ON page_cache (accessed)')
+
+    @contextmanager
+    def _connect(self):
+        """ A connection for one transaction, closed afterwards; sqlite3's own
+        context manager only commits or rolls back.
+        """
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires FROM page_cache WHERE key = ?',
+                               (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, expires = row
+            if expires < now:
+                conn.execute('DELETE FROM page_cache WHERE key = ?', (key,))
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            conn.execute('UPDATE page_cache SET accessed = ? WHERE key = ?', (now, key))
+        self.stats.hits += 1
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO page_cache (key, value, expires, accessed) '
+                         'VALUES (?, ?, ?, ?)', (key, value, now + self.ttl, now))
+            overflow = conn.execute('SELECT COUNT(*) FROM page_cache').fetchone()[0] - self.maxsize
+            if overflow > 0:
+                evicted = conn.execute(
+                    'DELETE FROM page_cache WHERE key IN '
+                    '(SELECT key FROM page_cache ORDER BY accessed LIMIT ?)', (overflow,))
+                self.stats.evictions += evicted.rowcount
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        with self._connect() as conn:
+            deleted = conn.execute(
+                'DELETE FROM page_cache WHERE key IN ({})'.format(', '.join('?' * len(keys))),
+                keys)
+        self.stats.invalidations += deleted.rowcount
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM page_cache').fetchone()[0]
+
+
+def page_key(kind, entity_id):
+    return '{}:{}'.format(kind, entity_id)
+
+
+def cached_page(kind):
+    """ Serve the view's rendered page from the cache, keyed on <kind> and
+    the id in the URL.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            cache = current_app.extensions.get('page_cache')
+            # Pending flash messages are rendered into the page; never serve
+            # or store those.
+            if cache is None or session.get('_flashes'):
+                return view(**kwargs)
+
+            key = page_key(kind, *kwargs.values())
+            page = cache.get(key)
+            if page is None:
+                page = view(**kwargs)
+                if isinstance(page, str) and not read_from_lagging_replica():
+                    cache.set(key, page)
+            return page
+        return wrapper
+    return decorator
+
+
+def venue_page_keys(venue_id):
+    """ The venue's page and the pages of every artist listing it. """
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return [page_key('venue', venue_id)] + [page_key('artist', artist_id) for artist_id, in artist_ids]
+
+
+def artist_page_keys(artist_id):
+    """ The artist's page and the pages of every venue listing them. """
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return [page_key('artist', artist_id)] + [page_key('venue', venue_id) for venue_id, in venue_ids]
+
+
+def invalidate_pages(keys):
+    cache = current_app.extensions.get('page_cache')
+    if cache is not None:
+        cache.delete(*keys)
+
+
+def init_page_cache(app):
+    backend = app.config.get('PAGE_CACHE_BACKEND')
+    maxsize = app.config.get('PAGE_CACHE_MAXSIZE', 1024)
+    ttl = app.config.get('PAGE_CACHE_TTL', 300)
+
+    if backend == 'memory':
+        cache = LRUCache(maxsize=maxsize, ttl=ttl)
+    elif backend == 'sqlite':
+        cache = SQLiteCache(app.config['PAGE_CACHE_PATH'], maxsize=maxsize, ttl=ttl)
+    elif not backend:
+        return None
+    else:
+        raise ValueError('Unknown PAGE_CACHE_BACKEND {!r}'.format(backend))
+
+    app.extensions['page_cache'] = cache
+
+    @app.route('/_cache')
+    def page_cache_stats():
+        stats = cache.stats.as_dict()
+        stats.update(backend=backend, size=len(cache), maxsize=maxsize, ttl=ttl)
+        return jsonify(stats)
+
+    return cache
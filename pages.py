@@ -0,0 +1,132 @@
+from itertools import groupby
+
+from genres import genre_filter, genre_names, parse_genres
+from models import db, Artist, Venue, Show
+from search import name_contains
+from venue_directory import venue_directory
+
+# ----------------------------------------------------------------------------#
+# Read pages.
+#
+# The queries behind the HTML read views and the shaping of their rows into
+# template data. The WSGI views in app.py run the queries on db.session; the
+# async views in asgi.py run the same statements (`query.statement`) on an
+# AsyncSession. Building a query needs an app context but no connection.
+# ----------------------------------------------------------------------------#
+
+# For each detail page: the model listed on the other side of its shows.
+COUNTERPARTS = {
+    Venue: ('artist', Artist, Show.venue_id),
+    Artist: ('venue', Venue, Show.artist_id),
+}
+
+
+def venue_directory_query(genres=(), precomputed=True):
+    # Venues of the same (city, state) area come back adjacent. The
+    # precomputed directory (venue_directory.py) is read when it is fresh
+    # enough, the venues table and its maintained counters otherwise.
+    if precomputed:
+        source = venue_directory.c
+        query = db.session.query(source.city, source.state, source.venue_id.label('id'),
+                                 source.name, source.upcoming_shows_count)
+        key = source.venue_id
+    else:
+        source = Venue
+        query = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_shows_count)
+        key = None
+    if genres:
+        query = query.filter(genre_filter(Venue, genres, key))
+    return query.order_by(source.city, source.state, source.name)
+
+
+def venue_areas(rows):
+    return [{
+        "city": city,
+        "state": state,
+        "venues": [{
+            "id": venue.id,
+            "name": venue.name,
+            "num_upcoming_shows": venue.upcoming_shows_count or 0
+        } for venue in area_venues]
+    } for (city, state), area_venues in groupby(rows, key=lambda row: (row.city, row.state))]
+
+
+def artist_list_query(genres=()):
+    query = db.session.query(Artist.id, Artist.name)
+    if genres:
+        query = query.filter(genre_filter(Artist, genres))
+    return query
+
+
+def name_search_query(model, search_term, genres, dialect_name):
+    query = db.session.query(
+        model.id,
+        model.name,
+        model.upcoming_shows_count
+    ).filter(name_contains(model, search_term, dialect_name))
+    if genres:
+        query = query.filter(genre_filter(model, genres))
+    return query.order_by(model.name)
+
+
+def search_results(rows):
+    return {
+        "count": len(rows),
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.upcoming_shows_count or 0
+        } for row in rows]
+    }
+
+
+def entity_query(model, entity_id):
+    # Genre names come back with the entity row, aggregated by a subquery.
+    return db.session.query(model, genre_names(model)).filter(model.id == entity_id)
+
+
+def entity_shows_queries(model, entity_id, now):
+    """ (past, upcoming) queries for the shows of a venue or artist, each
+    row carrying the other side's id, name and image.
+    """
+    prefix, other, foreign_key = COUNTERPARTS[model]
+    query = db.session.query(
+        getattr(Show, prefix + '_id'),
+        other.name.label(prefix + '_name'),
+        other.image_link.label(prefix + '_image_link'),
+        Show.start_time
+    ).join(other, other.id == getattr(Show, prefix + '_id')).filter(foreign_key == entity_id)
+    return query.filter(Show.start_time < now), query.filter(Show.start_time > now)
+
+
+def entity_page(model, entity, genres, past_shows, upcoming_shows):
+    data = {column.name: getattr(entity, column.name) for column in model.__table__.columns}
+    data['genres'] = parse_genres(genres)
+    data['past_shows'] = [show._asdict() for show in past_shows]
+    data['upcoming_shows'] = [show._asdict() for show in upcoming_shows]
+    data['past_shows_count'] = len(data['past_shows'])
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    return data
+
+
+def show_list_query():
+    return db.session.query(
+        Show.id,
+        Venue.name.label('venue_name'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.venue_id,
+        Show.artist_id,
+        Show.start_time
+    ).filter(Venue.id == Show.venue_id, Artist.id == Show.artist_id)
+
+
+def show_item(show):
+    return {
+        'venue_id': show.venue_id,
+        'venue_name': show.venue_name,
+        'artist_id': show.artist_id,
+        'artist_name': show.artist_name,
+        'artist_image_link': show.artist_image_link,
+        'start_time': show.start_time
+    }
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+#
+# Pages are addressed by the sort key of the last row already seen
+# (`?after=<cursor>`) rather than by an offset, so every page is an index
+# range scan no matter how deep into the listing it is.
+# ----------------------------------------------------------------------------#
+
+CURSOR_SEPARATOR = '_'
+
+
+def format_cursor(*values):
+    return CURSOR_SEPARATOR.join(
+        value.isoformat() if isinstance(value, datetime) else str(value)
+        for value in values
+    )
+
+
+def parse_cursor(cursor, *converters):
+    """ Split an ?after= cursor back into typed key values; None if absent
+    or malformed.
+    """
+    if not cursor:
+        return None
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(converters):
+        return None
+    try:
+        return tuple(convert(part) for convert, part in zip(converters, parts))
+    except ValueError:
+        return None
+
+
+class KeysetPage(object):
+    """ One page of <query> ordered by <key_columns>, iterated lazily so a
+    streamed template can start rendering before the page is fetched.
+
+    <row_key> maps a row to its key values; after iteration `next_cursor`
+    points at the following page, or is None on the last one.
+    """
+
+    def __init__(self, query, key_columns, after, per_page, row_key):
+        if after is not None:
+            if len(key_columns) == 1:
+                query = query.filter(key_columns[0] > after[0])
+            else:
+                query = query.filter(tuple_(*key_columns) > tuple_(*after))
+        self.query = query.order_by(*key_columns).limit(per_page + 1)
+        self.per_page = per_page
+        self.row_key = row_key
+        self.next_cursor = None
+
+    def __iter__(self):
+        last_row = None
+        for count, row in enumerate(self.query.yield_per(self.per_page), 1):
+            if count > self.per_page:
+                self.next_cursor = format_cursor(*self.row_key(last_row))
+                break
+            last_row = row
+            yield row
+
+    def take(self, rows):
+        """ The page out of <rows>, the result of `self.query.statement` run
+        elsewhere (e.g. on an AsyncSession); sets `next_cursor` the same way.
+        """
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self.next_cursor = format_cursor(*self.row_key(rows[-1]))
+        return rows
@@ -0,0 +1,43 @@
+from flask import g, request
+
+# ----------------------------------------------------------------------------#
+# Query budgets.
+#
+# Read views declare how many SQL statements one request may issue. A view
+# that goes over budget (an N+1 loop, a relationship lazily loaded in a loop)
+# fails the request under TESTING and QUERY_BUDGET_STRICT, and is logged
+# otherwise.
+# ----------------------------------------------------------------------------#
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """ Declare the maximum number of statements a view may execute. """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def init_query_budget(app):
+    """ Check budgets against the per-request statement counts kept by
+    metrics.init_metrics(), which must be initialized as well.
+    """
+
+    # Teardown runs after a streamed response has finished iterating, so the
+    # queries issued while rendering are counted as well.
+    @app.teardown_request
+    def check_query_budget(exc):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        stats = g.get('sql_stats')
+        if exc is not None or budget is None or stats is None or stats.count <= budget:
+            return
+
+        message = '{} issued {} queries, budget is {}'.format(request.endpoint, stats.count, budget)
+        if app.testing or app.config.get('QUERY_BUDGET_STRICT'):
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
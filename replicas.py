@@ -0,0 +1,189 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import click
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm, text
+from sqlalchemy.sql.dml import UpdateBase
+
+# ----------------------------------------------------------------------------#
+# Read replicas.
+#
+# Views marked @replica_read (the listings, searches and detail pages) run
+# their SELECTs on one of the SQLALCHEMY_REPLICA_URIS, picked per request.
+# Everything else stays on the primary: writes, reads issued after a write in
+# the same request, and, for REPLICA_READ_YOUR_WRITES seconds after a browser
+# wrote something, every read of that browser, so a redirect after a
+# flash shows the change. Replicas more than REPLICA_MAX_LAG seconds behind
+# the primary are skipped until they catch up. Pages read from a replica that
+# was behind at all are not put in the page cache (see page_cache.py).
+#
+# Replicas are Flask-SQLAlchemy binds named replica_<n> without tables, so
+# their engines are configured and instrumented like the primary's.
+#
+# Locally, point DATABASE_REPLICA_URLS at a second SQLite file and copy the
+# primary into it with `flask sync-replicas` to play the replication.
+# tests/test_replicas.py does that, and fakes the lag through LAG_QUERIES.
+# ----------------------------------------------------------------------------#
+
+REPLICA_BIND_PREFIX = 'replica_'
+PRIMARY_UNTIL_KEY = '_primary_until'
+
+
+def replica_read(view):
+    """ Let the view read from a replica. """
+    view.replica_read = True
+    return view
+
+
+def _postgresql_lag(connection):
+    # Zero when everything received has been replayed; otherwise the age of
+    # the last replayed transaction.
+    return connection.execute(text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    )).scalar()
+
+
+# Seconds a replica is behind its primary, by dialect. Dialects without an
+# entry (SQLite copies) are never considered behind.
+LAG_QUERIES = {
+    'postgresql': _postgresql_lag,
+}
+
+
+class ReplicaPool(object):
+    """ The replica binds of an app and their last measured lag. """
+
+    def __init__(self, bind_keys, max_lag, check_interval):
+        self.bind_keys = bind_keys
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # bind key -> (checked at, lag in seconds or None when unreachable)
+        self.lags = {}
+        self._lock = threading.Lock()
+
+    def lag(self, db, app, bind_key):
+        now = time.monotonic()
+        checked_at, lag = self.lags.get(bind_key, (None, None))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return lag
+        with self._lock:
+            engine = db.get_engine(app, bind=bind_key)
+            measure = LAG_QUERIES.get(engine.dialect.name)
+            try:
+                if measure is None:
+                    lag = 0.0
+                else:
+                    with engine.connect() as connection:
+                        lag = float(measure(connection))
+            except Exception:
+                app.logger.exception('Replica %s is unreachable', bind_key)
+                lag = None
+            self.lags[bind_key] = (now, lag)
+        return lag
+
+    def choose(self, db, app):
+        """ The bind key of a replica within the lag bound, or None. """
+        healthy = []
+        for bind_key in self.bind_keys:
+            lag = self.lag(db, app, bind_key)
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(bind_key)
+        return random.choice(healthy) if healthy else None
+
+    def last_lag(self, bind_key):
+        """ The lag measured by the last check of <bind_key>. """
+        return self.lags.get(bind_key, (None, None))[1]
+
+
+def read_from_lagging_replica():
+    """ Whether the current request read from a replica that was behind its
+    primary at the last lag check.
+    """
+    bind_key = g.get('db_replica')
+    if bind_key is None or g.get('db_wrote'):
+        return False
+    return current_app.extensions['replicas'].last_lag(bind_key) != 0
+
+
+class RoutingSession(SignallingSession):
+    """ Sends the reads of @replica_read requests to the request's replica.
+    Flushes and INSERT/UPDATE/DELETE statements go to the primary, and so
+    does everything after them in the same request.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+            elif g.get('db_replica') and not g.get('db_wrote'):
+                return self.app.extensions['sqlalchemy'].db.get_engine(self.app, bind=g.db_replica)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def _sqlite_path(app, uri):
+    """ The file of a SQLite URI, resolved like Flask-SQLAlchemy does. """
+    if not uri.startswith('sqlite:///'):
+        return None
+    return os.path.join(app.root_path, uri[len('sqlite:///'):])
+
+
+def init_replicas(app, db):
+    """ Register the replica binds, the routing hooks and `flask sync-replicas`.
+    Call before the first use of db.engine.
+    """
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas_command():
+        """Copy a SQLite primary into SQLite replica files (local testing)."""
+        primary = _sqlite_path(app, app.config['SQLALCHEMY_DATABASE_URI'])
+        replicas = [_sqlite_path(app, uri) for uri in uris]
+        if primary is None or not replicas or None in replicas:
+            raise click.UsageError('Needs a SQLite primary and SQLite replicas.')
+        source = sqlite3.connect(primary)
+        try:
+            for path in replicas:
+                target = sqlite3.connect(path)
+                source.backup(target)
+                target.close()
+        finally:
+            source.close()
+        click.echo('Copied {} to {} replica(s).'.format(primary, len(replicas)))
+
+    if not uris:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    bind_keys = []
+    for index, uri in enumerate(uris):
+        bind_keys.append(REPLICA_BIND_PREFIX + str(index))
+        binds[bind_keys[-1]] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+    pool = ReplicaPool(bind_keys, app.config['REPLICA_MAX_LAG'], app.config['REPLICA_LAG_CHECK_INTERVAL'])
+    app.extensions['replicas'] = pool
+
+    @app.before_request
+    def route_reads():
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, 'replica_read', False):
+            return
+        if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            return
+        g.db_replica = pool.choose(db, app)
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote'):
+            session[PRIMARY_UNTIL_KEY] = time.time() + app.config['REPLICA_READ_YOUR_WRITES']
+        return response
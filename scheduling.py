@@ -0,0 +1,106 @@
+from bisect import bisect_left
+from datetime import timedelta
+
+from models import db, Show
+
+# ----------------------------------------------------------------------------#
+# Double booking.
+#
+# A venue or an artist can only have one show at a time. On PostgreSQL the
+# shows table carries exclusion constraints over a GiST range index (see
+# models.py); everywhere, the views and bulk loaders check first so that a
+# conflict is reported instead of raised.
+#
+# Shows are at most MAX_SHOW_DURATION long, so only shows starting within
+# that window before a new show can overlap it. Both checks below use that
+# bound: the SQL check is a range scan on the (venue_id|artist_id, start_time)
+# indexes, the in-memory check a bisect on sorted start times. Neither grows
+# with the size of the calendar.
+# ----------------------------------------------------------------------------#
+
+DEFAULT_SHOW_DURATION = 120
+MAX_SHOW_DURATION = 12 * 60
+
+
+def show_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes or DEFAULT_SHOW_DURATION)
+
+
+def overlaps(start_time, duration_minutes, other_start, other_duration):
+    return other_start < show_end(start_time, duration_minutes) and \
+        show_end(other_start, other_duration) > start_time
+
+
+def find_conflicts(venue_id, artist_id, start_time, duration_minutes, exclude_id=None):
+    """ Shows of the venue or the artist overlapping the given slot. """
+    window_start = start_time - timedelta(minutes=MAX_SHOW_DURATION)
+    window_end = show_end(start_time, duration_minutes)
+    candidates = []
+    for column, value in ((Show.venue_id, venue_id), (Show.artist_id, artist_id)):
+        query = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                                 Show.duration_minutes) \
+            .filter(column == value, Show.start_time > window_start, Show.start_time < window_end)
+        if exclude_id is not None:
+            query = query.filter(Show.id != exclude_id)
+        candidates.extend(query)
+
+    conflicts = {}
+    for show in candidates:
+        if overlaps(start_time, duration_minutes, show.start_time, show.duration_minutes):
+            conflicts[show.id] = show
+    return sorted(conflicts.values(), key=lambda show: (show.start_time, show.id))
+
+
+class ShowCalendar(object):
+    """ Booked slots per venue and per artist, for checking a batch of new
+    shows against each other and against the database before inserting it.
+
+    Slots are kept as sorted start times per owner; a lookup bisects to the
+    slots starting within MAX_SHOW_DURATION before the new show's end.
+    Existing shows of an owner are loaded from the database the first time
+    the owner is seen.
+    """
+
+    def __init__(self, load_existing=True):
+        self.load_existing = load_existing
+        # (kind, id) -> ([start_time, ...], [(start_time, end_time, label), ...])
+        self.slots = {}
+
+    def _owner(self, kind, owner_id):
+        key = (kind, owner_id)
+        if key not in self.slots:
+            self.slots[key] = ([], [])
+            if self.load_existing:
+                column = Show.venue_id if kind == 'venue' else Show.artist_id
+                for show in db.session.query(Show.id, Show.start_time, Show.duration_minutes) \
+                        .filter(column == owner_id).order_by(Show.start_time):
+                    self._insert(key, show.start_time, show_end(show.start_time, show.duration_minutes),
+                                 'show {}'.format(show.id))
+        return key
+
+    def _insert(self, key, start_time, end_time, label):
+        starts, entries = self.slots[key]
+        index = bisect_left(starts, start_time)
+        starts.insert(index, start_time)
+        entries.insert(index, (start_time, end_time, label))
+
+    def _overlapping(self, key, start_time, end_time):
+        starts, entries = self.slots[key]
+        low = bisect_left(starts, start_time - timedelta(minutes=MAX_SHOW_DURATION))
+        high = bisect_left(starts, end_time)
+        return [label for other_start, other_end, label in entries[low:high] if other_end > start_time]
+
+    def conflicts(self, venue_id, artist_id, start_time, duration_minutes):
+        """ {'venue_id'|'artist_id': [labels]} of slots the show would overlap. """
+        end_time = show_end(start_time, duration_minutes)
+        found = {}
+        for kind, owner_id in (('venue', venue_id), ('artist', artist_id)):
+            labels = self._overlapping(self._owner(kind, owner_id), start_time, end_time)
+            if labels:
+                found[kind + '_id'] = ['Already booked: {}.'.format(', '.join(labels))]
+        return found
+
+    def book(self, venue_id, artist_id, start_time, duration_minutes, label='new show'):
+        end_time = show_end(start_time, duration_minutes)
+        for kind, owner_id in (('venue', venue_id), ('artist', artist_id)):
+            self._insert(self._owner(kind, owner_id), start_time, end_time, label)
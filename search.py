@@ -0,0 +1,64 @@
+from sqlalchemy import DDL, event, text
+
+# ----------------------------------------------------------------------------#
+# Name search.
+#
+# PostgreSQL answers `name ILIKE '%term%'` from a pg_trgm GIN index. SQLite has
+# no trigram operator class, so local databases keep an FTS5 table using the
+# trigram tokenizer in sync with the base table through triggers.
+# ----------------------------------------------------------------------------#
+
+# The trigram tokenizer can only use its index for terms of 3+ characters.
+FTS_MIN_TERM_LENGTH = 3
+
+
+def fts_table_name(table_name):
+    return '{}_name_fts'.format(table_name)
+
+
+def sqlite_fts_statements(table_name):
+    """ Statements creating the FTS5 mirror of <table_name>.name and the
+    triggers that keep it up to date.
+    """
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        "name, content='{table}', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF name ON {table} BEGIN "
+        "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+    ]
+    return [statement.format(fts=fts_table_name(table_name), table=table_name)
+            for statement in statements]
+
+
+def register_name_search(table):
+    """ Attach the dialect specific search DDL to <table> so that
+    db.create_all() builds it alongside the table itself.
+    """
+    for statement in sqlite_fts_statements(table.name):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def name_contains(model, search_term, dialect_name):
+    """ Case-insensitive substring filter on model.name. """
+    search_term = search_term.strip()
+    pattern = '%{}%'.format(_escape_like(search_term))
+
+    if dialect_name == 'sqlite' and len(search_term) >= FTS_MIN_TERM_LENGTH:
+        fts = fts_table_name(model.__tablename__)
+        # A quoted FTS5 string matches the term as a contiguous substring.
+        match = '"{}"'.format(search_term.replace('"', '""'))
+        return text(
+            '{table}.id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH :fts_match)'
+            .format(table=model.__tablename__, fts=fts)
+        ).bindparams(fts_match=match)
+
+    return model.name.ilike(pattern, escape='\\')
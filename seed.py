@@ -0,0 +1,180 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import click
+
+from genres import link_genres
+from models import db, Artist, Venue, Show
+from scheduling import ShowCalendar
+from show_counters import rebuild_show_counters
+from validation import GENRES
+
+# ----------------------------------------------------------------------------#
+# Synthetic data.
+#
+# Generates venues, artists and shows with skewed, roughly realistic
+# distributions: a few big cities hold most venues, a few popular venues and
+# artists get most shows, and most shows are in the past. No venue or artist
+# is double booked. Used for local
+# development and by benchmarks/routes.py.
+# ----------------------------------------------------------------------------#
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Nashville', 'TN'),
+    ('Austin', 'TX'), ('San Francisco', 'CA'), ('New Orleans', 'LA'), ('Seattle', 'WA'),
+    ('Atlanta', 'GA'), ('Denver', 'CO'), ('Portland', 'OR'), ('Miami', 'FL'),
+    ('Boston', 'MA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Philadelphia', 'PA'),
+    ('Memphis', 'TN'), ('Kansas City', 'MO'), ('Salt Lake City', 'UT'), ('Burlington', 'VT'),
+]
+ADJECTIVES = [
+    'Velvet', 'Electric', 'Golden', 'Midnight', 'Wild', 'Blue', 'Crimson', 'Silver',
+    'Neon', 'Rusty', 'Lucky', 'Hollow', 'Broken', 'Howling', 'Quiet', 'Painted',
+]
+VENUE_NOUNS = ['Lounge', 'Hall', 'Room', 'Club', 'Tavern', 'Theatre', 'Bar', 'Garden', 'Cellar', 'Ballroom']
+ARTIST_NOUNS = ['Foxes', 'Petals', 'Sax Band', 'Trio', 'Collective', 'Kings', 'Sisters', 'Machines',
+                'Ramblers', 'Orchestra', 'Ghosts', 'Riders']
+
+BATCH_SIZE = 1000
+DURATIONS = (60, 90, 120, 120, 180)
+# Draws per requested show before giving up on finding free slots.
+MAX_ATTEMPTS = 10
+
+
+def zipf_weights(n, exponent=1.1):
+    """ Cumulative weights where item i is picked about 1 / (i + 1)^exponent as often. """
+    return list(accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _genres(rng):
+    return rng.sample(GENRES, rng.choice((1, 1, 2, 2, 3)))
+
+
+def _phone(rng):
+    return '234-{}-555-{:04d}'.format(rng.randint(200, 989), rng.randint(0, 9999))
+
+
+def _slug(name):
+    return ''.join(ch for ch in name.lower() if ch.isalnum())
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+
+def _new_ids(model, after_id):
+    return [entity_id for entity_id, in db.session.query(model.id)
+            .filter(model.id > after_id).order_by(model.id)]
+
+
+def seed_database(venues, artists, shows, seed=None, now=None):
+    """ Insert <venues> venues, <artists> artists and up to <shows> shows;
+    returns the number of shows inserted.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    city_weights = zipf_weights(len(CITIES))
+
+    first_venue_id = db.session.query(db.func.max(Venue.id)).scalar() or 0
+    first_artist_id = db.session.query(db.func.max(Artist.id)).scalar() or 0
+
+    venue_rows, venue_genres = [], []
+    for i in range(venues):
+        city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+        name = 'The {} {}'.format(rng.choice(ADJECTIVES), rng.choice(VENUE_NOUNS))
+        venue_genres.append(_genres(rng))
+        venue_rows.append({
+            'name': name,
+            'city': city,
+            'state': state,
+            'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(ADJECTIVES)),
+            'phone': _phone(rng),
+            'facebook_link': 'https://www.facebook.com/{}{}'.format(_slug(name), i),
+            'image_link': 'https://picsum.photos/seed/venue{}/300/300'.format(i),
+            'website': 'https://{}{}.example.com'.format(_slug(name), i),
+            'seeking_talent': rng.random() < 0.4,
+            'seeking_description': 'We are looking for local acts.',
+            'upcoming_shows_count': 0,
+            'past_shows_count': 0,
+        })
+    _insert(Venue, venue_rows)
+
+    artist_rows, artist_genres = [], []
+    for i in range(artists):
+        city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+        name = 'The {} {}'.format(rng.choice(ADJECTIVES), rng.choice(ARTIST_NOUNS))
+        artist_genres.append(_genres(rng))
+        artist_rows.append({
+            'name': name,
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'facebook_link': 'https://www.facebook.com/{}{}'.format(_slug(name), i),
+            'image_link': 'https://picsum.photos/seed/artist{}/300/300'.format(i),
+            'website': 'https://{}{}.example.com'.format(_slug(name), i),
+            'seeking_venue': rng.random() < 0.5,
+            'seeking_description': 'Looking for shows this season.',
+            'upcoming_shows_count': 0,
+            'past_shows_count': 0,
+        })
+    _insert(Artist, artist_rows)
+
+    venue_ids = _new_ids(Venue, first_venue_id)
+    artist_ids = _new_ids(Artist, first_artist_id)
+    # New ids come back in insertion order, so they line up with the genres.
+    link_genres(Venue, zip(venue_ids, venue_genres))
+    link_genres(Artist, zip(artist_ids, artist_genres))
+    db.session.commit()
+    if shows and venue_ids and artist_ids:
+        # Shuffle so that popularity is not tied to insertion order.
+        rng.shuffle(venue_ids)
+        rng.shuffle(artist_ids)
+        venue_weights = zipf_weights(len(venue_ids))
+        artist_weights = zipf_weights(len(artist_ids))
+        # The venues and artists are new, so there are no booked slots to load.
+        calendar = ShowCalendar(load_existing=False)
+        show_rows = []
+        for _ in range(shows * MAX_ATTEMPTS):
+            if len(show_rows) == shows:
+                break
+            # Three quarters of the calendar is history.
+            if rng.random() < 0.75:
+                day = now - timedelta(days=rng.randint(1, 365))
+            else:
+                day = now + timedelta(days=rng.randint(1, 180))
+            start_time = day.replace(hour=rng.choice((18, 19, 20, 20, 21, 21, 22)),
+                                     minute=rng.choice((0, 0, 30)), second=0, microsecond=0)
+            venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+            artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+            duration_minutes = rng.choice(DURATIONS)
+            if calendar.conflicts(venue_id, artist_id, start_time, duration_minutes):
+                continue
+            calendar.book(venue_id, artist_id, start_time, duration_minutes)
+            show_rows.append({
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'duration_minutes': duration_minutes,
+                'upcoming': start_time > now,
+            })
+        _insert(Show, show_rows)
+    else:
+        show_rows = []
+
+    # Bulk inserts skip the Show mapper events that maintain the counters.
+    rebuild_show_counters(now)
+    return len(show_rows)
+
+
+def init_seed(app):
+    @app.cli.command('seed')
+    @click.option('--venues', default=200, show_default=True)
+    @click.option('--artists', default=1000, show_default=True)
+    @click.option('--shows', default=10000, show_default=True)
+    @click.option('--seed', 'rng_seed', type=int, default=None, help='Random seed for repeatable data.')
+    def seed_command(venues, artists, shows, rng_seed):
+        """Fill the database with synthetic venues, artists and shows."""
+        inserted = seed_database(venues, artists, shows, seed=rng_seed)
+        click.echo('Seeded {} venues, {} artists and {} shows.'.format(venues, artists, inserted))
@@ -0,0 +1,187 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import event, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Artist, JobLease, Venue, Show
+
+# ----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venue and Artist carry denormalized upcoming_shows_count / past_shows_count
+# columns. They are adjusted in the same transaction that inserts or deletes a
+# show, and the rollover job moves shows from upcoming to past once their
+# start_time has gone by.
+#
+# Each worker runs the rollover every SHOW_ROLLOVER_INTERVAL seconds, when it
+# holds the 'show-rollover' job lease, which it renews on each run. With the
+# interval set to 0, `flask roll-over-shows` has to run from cron instead.
+# ----------------------------------------------------------------------------#
+
+ROLLOVER_LEASE = 'show-rollover'
+
+COUNTED_MODELS = (
+    (Venue, Show.venue_id),
+    (Artist, Show.artist_id),
+)
+
+
+def _counter_column(show):
+    return 'upcoming_shows_count' if show.upcoming else 'past_shows_count'
+
+
+def _bump(connection, model, entity_id, column, delta):
+    table = model.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == entity_id)
+        .values({column: func.coalesce(table.c[column], 0) + delta})
+    )
+
+
+@event.listens_for(Show, 'before_insert')
+def _set_upcoming(mapper, connection, show):
+    show.upcoming = show.start_time > datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_inserted_show(mapper, connection, show):
+    _bump(connection, Venue, show.venue_id, _counter_column(show), 1)
+    _bump(connection, Artist, show.artist_id, _counter_column(show), 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def _count_deleted_show(mapper, connection, show):
+    _bump(connection, Venue, show.venue_id, _counter_column(show), -1)
+    _bump(connection, Artist, show.artist_id, _counter_column(show), -1)
+
+
+def roll_over_shows(now=None):
+    """ Flip upcoming shows whose start_time has passed and move them from
+    the upcoming to the past counters. Returns the number of shows moved.
+    """
+    now = now or datetime.now()
+
+    show_ids = [show_id for show_id, in db.session.query(Show.id)
+                .filter(Show.upcoming.is_(True), Show.start_time <= now)]
+    if not show_ids:
+        db.session.rollback()
+        return 0
+
+    # The flags are flipped first, so that two rollovers never count the same
+    # show: the UPDATE waits for the write lock (SQLite) or the row locks
+    # (PostgreSQL, which then re-reads `upcoming`), and flips fewer rows than
+    # were read when another rollover, or a delete, got there first. The
+    # next run picks those shows up again.
+    flipped = db.session.query(Show) \
+        .filter(Show.id.in_(show_ids), Show.upcoming.is_(True)) \
+        .update({Show.upcoming: False}, synchronize_session=False)
+    if flipped != len(show_ids):
+        db.session.rollback()
+        return 0
+
+    for model, foreign_key in COUNTED_MODELS:
+        table = model.__table__
+        moved = db.session.query(foreign_key, func.count(Show.id)) \
+            .filter(Show.id.in_(show_ids)) \
+            .group_by(foreign_key)
+        for entity_id, count in moved:
+            db.session.execute(
+                table.update()
+                .where(table.c.id == entity_id)
+                .values(upcoming_shows_count=func.coalesce(table.c.upcoming_shows_count, 0) - count,
+                        past_shows_count=func.coalesce(table.c.past_shows_count, 0) + count)
+            )
+    db.session.commit()
+    return len(show_ids)
+
+
+def rebuild_show_counters(now=None):
+    """ Recompute every counter and upcoming flag from the shows table. """
+    now = now or datetime.now()
+
+    db.session.query(Show).update({Show.upcoming: Show.start_time > now},
+                                  synchronize_session=False)
+    for model, foreign_key in COUNTED_MODELS:
+        upcoming = db.session.query(func.count(Show.id)) \
+            .filter(foreign_key == model.id, Show.start_time > now) \
+            .scalar_subquery()
+        past = db.session.query(func.count(Show.id)) \
+            .filter(foreign_key == model.id, Show.start_time <= now) \
+            .scalar_subquery()
+        db.session.query(model).update({model.upcoming_shows_count: upcoming,
+                                        model.past_shows_count: past},
+                                       synchronize_session=False)
+    db.session.commit()
+
+
+def acquire_lease(name, holder, seconds, now=None):
+    """ Take or renew the job lease <name> for <holder> for <seconds>.
+    Returns False while another holder's lease has not expired.
+    """
+    now = now or datetime.now()
+    expires_at = now + timedelta(seconds=seconds)
+    table = JobLease.__table__
+    claimed = db.session.execute(
+        table.update()
+        .where(table.c.name == name, or_(table.c.holder == holder, table.c.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+    ).rowcount
+    if not claimed and db.session.get(JobLease, name) is None:
+        db.session.add(JobLease(name=name, holder=holder, expires_at=expires_at))
+        claimed = 1
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process created the lease first.
+        db.session.rollback()
+        return False
+    return bool(claimed)
+
+
+def start_rollover_scheduler(app, interval):
+    """ Run roll_over_shows() every <interval> seconds on a daemon thread,
+    while this process holds the rollover lease.
+    """
+    stopped = threading.Event()
+    holder = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), id(stopped))
+
+    def run():
+        while not stopped.wait(interval):
+            with app.app_context():
+                try:
+                    # The lease outlives a missed run or two.
+                    if not acquire_lease(ROLLOVER_LEASE, holder, interval * 3):
+                        continue
+                    moved = roll_over_shows()
+                    if moved:
+                        app.logger.info('Rolled %d shows over to past', moved)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Show rollover failed')
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=run, name='show-rollover', daemon=True).start()
+    return stopped
+
+
+def init_show_counters(app):
+    @app.cli.command('roll-over-shows')
+    def roll_over_shows_command():
+        """Move shows whose start time has passed from upcoming to past."""
+        click.echo('Rolled {} shows over to past.'.format(roll_over_shows()))
+
+    @app.cli.command('rebuild-show-counters')
+    def rebuild_show_counters_command():
+        """Recompute the upcoming/past show counters from scratch."""
+        rebuild_show_counters()
+        click.echo('Show counters rebuilt.')
+
+    interval = app.config.get('SHOW_ROLLOVER_INTERVAL')
+    if interval:
+        start_rollover_scheduler(app, interval)
@@ -0,0 +1,178 @@
+import random
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import DDL, bindparam, case, event, func, inspect
+
+from models import db, SummaryChange, SummaryRefresh
+
+# ----------------------------------------------------------------------------#
+# Summary change tracking.
+#
+# Precomputed summaries (the venue directory, cached facet counts) follow
+# their source tables through SUMMARY_SLOTS summary_changes counters each. A
+# transaction that writes a source table, through the ORM or a bulk
+# statement, bumps one of the counters of the summaries it affects as it
+# commits, so every process can tell that a summary is behind. The slot is
+# picked at random: with a single row per summary, every concurrent writer
+# would wait on that row's lock. A summary that only depends on some columns
+# names them, and updates that change none of them leave it alone. A
+# summary's after_commit callback then runs in the committing process.
+#
+# A summary's `changes` is the sum of its counters. A refresh records the sum
+# it includes in summary_refreshes and clears the `stale_since` of the
+# counters no writer has bumped since it read them.
+# ----------------------------------------------------------------------------#
+
+CHANGED_KEY = 'summaries_changed'
+SUMMARY_SLOTS = 16
+
+
+class Summary(object):
+
+    def __init__(self, name, models, tables, after_commit=None, refreshed=True, columns=None):
+        self.name = name
+        self.models = tuple(models)
+        self.tables = frozenset(tables)
+        self.after_commit = after_commit
+        self.refreshed = refreshed
+        self.columns = None if columns is None else frozenset(columns)
+
+    def modified_by(self, instance):
+        """ Whether the pending changes of <instance>, an existing entity,
+        affect the summary.
+        """
+        if self.columns is None:
+            return True
+        attrs = inspect(instance).attrs
+        return any(attrs[name].history.has_changes() for name in self.columns if name in attrs)
+
+    def updated_by(self, statement):
+        """ Whether the bulk UPDATE <statement> affects the summary. Values
+        given as execute() parameters are not inspected, and count.
+        """
+        values = getattr(statement, '_values', None)
+        if self.columns is None or not values:
+            return True
+        return any(getattr(column, 'name', column) in self.columns for column in values)
+
+
+SUMMARIES = {}
+
+
+def _with_summary_refreshes(ddl, target, bind, tables=(), **kw):
+    # create_all() also runs on the replica binds, which have no tables.
+    return any(table.name == SummaryRefresh.__tablename__ for table in tables)
+
+
+def register_summary(name, models, tables, after_commit=None, refreshed=True, columns=None):
+    """ Track writes to <models> and <tables> under the summary <name>;
+    <after_commit> is called after each commit that wrote them. Summaries
+    that are never rebuilt, only keyed on their `changes`, pass
+    <refreshed>=False and keep no stale_since. With <columns>, updates only
+    count when they change one of these attributes or columns; inserts and
+    deletes always do.
+    """
+    SUMMARIES[name] = Summary(name, models, tables, after_commit, refreshed, columns)
+    event.listen(db.metadata, 'after_create', DDL(
+        "INSERT INTO summary_refreshes (name, refreshed_changes) "
+        "VALUES ('{}', 0) ON CONFLICT (name) DO NOTHING".format(name)
+    ).execute_if(callable_=_with_summary_refreshes))
+    event.listen(db.metadata, 'after_create', DDL(
+        "INSERT INTO summary_changes (name, slot, changes) VALUES {} "
+        "ON CONFLICT (name, slot) DO NOTHING".format(
+            ', '.join("('{}', {}, 0)".format(name, slot) for slot in range(SUMMARY_SLOTS)))
+    ).execute_if(callable_=_with_summary_refreshes))
+
+
+def summary_changes_query(name):
+    """ The (changes, refreshed_changes, stale_since) of summary <name>. """
+    refreshes, changes = SummaryRefresh.__table__, SummaryChange.__table__
+    return db.select(func.sum(changes.c.changes).label('changes'), refreshes.c.refreshed_changes,
+                     func.min(changes.c.stale_since).label('stale_since')) \
+        .select_from(refreshes.join(changes, changes.c.name == refreshes.c.name)) \
+        .where(refreshes.c.name == name) \
+        .group_by(refreshes.c.refreshed_changes)
+
+
+def summary_slots(connection, name):
+    """ {slot: changes} of the counters of summary <name>. """
+    table = SummaryChange.__table__
+    return dict(connection.execute(db.select(table.c.slot, table.c.changes).where(table.c.name == name)).all())
+
+
+def record_refresh(connection, name, slots):
+    """ Record a refresh of summary <name> that includes the counts <slots>
+    read before it, by summary_slots(). Counters bumped since stay stale.
+    """
+    refreshes, changes = SummaryRefresh.__table__, SummaryChange.__table__
+    connection.execute(
+        refreshes.update()
+        .where(refreshes.c.name == name)
+        .values(refreshed_changes=sum(slots.values()), refreshed_at=datetime.now())
+    )
+    connection.execute(
+        changes.update()
+        .where(changes.c.name == name, changes.c.slot == bindparam('read_slot'))
+        .values(stale_since=case((changes.c.changes == bindparam('read_changes'), None),
+                                 else_=changes.c.stale_since)),
+        [{'read_slot': slot, 'read_changes': count} for slot, count in slots.items()]
+    )
+
+
+def _changed(session):
+    types = {type(instance) for instance in chain(session.new, session.deleted)}
+    dirty = list(session.dirty)
+    return {summary.name for summary in SUMMARIES.values()
+            if any(issubclass(model, summary.models) for model in types) or
+            any(isinstance(instance, summary.models) and summary.modified_by(instance) for instance in dirty)}
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_flush(session, flush_context):
+    names = _changed(session)
+    if names:
+        session.info.setdefault(CHANGED_KEY, set()).update(names)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_statement(orm_execute_state):
+    # Bulk writes: importer batches, counter updates, Query.update().
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        table_name = getattr(getattr(state.statement, 'table', None), 'name', None)
+        names = {summary.name for summary in SUMMARIES.values() if table_name in summary.tables and
+                 (not state.is_update or summary.updated_by(state.statement))}
+        if names:
+            state.session.info.setdefault(CHANGED_KEY, set()).update(names)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _count_changes(session):
+    # Runs before the final flush, so pending objects count too.
+    names = session.info.setdefault(CHANGED_KEY, set())
+    names.update(_changed(session))
+    if not names:
+        return
+    refreshed = sorted(name for name in names if SUMMARIES[name].refreshed)
+    table = SummaryChange.__table__
+    stale_since = func.coalesce(table.c.stale_since, datetime.now())
+    session.execute(
+        table.update()
+        .where(table.c.name.in_(sorted(names)), table.c.slot == random.randrange(SUMMARY_SLOTS))
+        .values(changes=table.c.changes + 1,
+                stale_since=case((table.c.name.in_(refreshed), stale_since), else_=table.c.stale_since))
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    for name in sorted(session.info.pop(CHANGED_KEY, ())):
+        callback = SUMMARIES[name].after_commit
+        if callback is not None:
+            callback()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop(CHANGED_KEY, None)
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import BadRequest
+
+from agenda import date_range, named_window
+from app import create_app
+from models import db, Artist, Show, Venue
+from seed import seed_database
+
+# A Wednesday.
+NOW = datetime(2031, 1, 8, 15, 30)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(2, 2, 0, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_shows(*start_times):
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id)]
+    shows = [Show(venue_id=venue_ids[i % 2], artist_id=artist_ids[i % 2], start_time=start_time,
+                  duration_minutes=30) for i, start_time in enumerate(start_times)]
+    db.session.add_all(shows)
+    db.session.commit()
+    return [show.id for show in shows]
+
+
+@pytest.mark.parametrize('name,now,start,end', [
+    ('today', NOW, datetime(2031, 1, 8), datetime(2031, 1, 9)),
+    ('week', NOW, datetime(2031, 1, 8), datetime(2031, 1, 15)),
+    # Friday through Sunday, from today once the weekend has started.
+    ('weekend', NOW, datetime(2031, 1, 10), datetime(2031, 1, 13)),
+    ('weekend', datetime(2031, 1, 10, 23, 0), datetime(2031, 1, 10), datetime(2031, 1, 13)),
+    ('weekend', datetime(2031, 1, 12, 9, 0), datetime(2031, 1, 12), datetime(2031, 1, 13)),
+    ('weekend', datetime(2031, 1, 13, 9, 0), datetime(2031, 1, 17), datetime(2031, 1, 20)),
+])
+def test_named_windows(name, now, start, end):
+    assert named_window(name, now) == (start, end)
+    assert date_range(MultiDict({'window': name}), now=now) == (start, end)
+
+
+@pytest.mark.parametrize('args,start,end', [
+    ({}, datetime(2031, 1, 8), datetime(2031, 1, 15)),
+    ({'from': '2031-02-01'}, datetime(2031, 2, 1), datetime(2031, 2, 8)),
+    ({'from': '2031-02-01T18:00', 'to': '2031-02-02'}, datetime(2031, 2, 1, 18), datetime(2031, 2, 2)),
+    ({'to': '2031-01-10'}, datetime(2031, 1, 8), datetime(2031, 1, 10)),
+    # A named window wins over from/to.
+    ({'window': 'today', 'from': '2031-02-01'}, datetime(2031, 1, 8), datetime(2031, 1, 9)),
+])
+def test_date_range(args, start, end):
+    assert date_range(MultiDict(args), now=NOW) == (start, end)
+
+
+@pytest.mark.parametrize('args', [
+    {'from': 'tomorrow'},
+    {'from': '2031-02-30'},
+    {'to': '2031-01-08T25:00'},
+    {'from': '2031-02-01', 'to': '2031-02-01'},
+    {'from': '2031-02-02', 'to': '2031-02-01'},
+    {'window': 'month'},
+])
+def test_bad_ranges(args):
+    with pytest.raises(BadRequest):
+        date_range(MultiDict(args), now=NOW)
+
+
+@pytest.mark.parametrize('url', ['/calendar?from=soon', '/calendar?window=year',
+                                 '/api/v1/calendar?from=2031-01-01&to=2030-01-01'])
+def test_bad_ranges_are_a_400(client, url):
+    assert client.get(url).status_code == 400
+
+
+def test_api_error_is_json(client):
+    response = client.get('/api/v1/calendar?from=soon')
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'from must be an ISO 8601 date or datetime'
+
+
+def test_range_includes_from_and_excludes_to(app, client):
+    before, at_start, inside, at_end = add_shows(
+        datetime(2031, 3, 1, 19, 59), datetime(2031, 3, 1, 20, 0), datetime(2031, 3, 2, 21, 0),
+        datetime(2031, 3, 3, 20, 0))
+
+    data = client.get('/api/v1/calendar?from=2031-03-01T20:00&to=2031-03-03T20:00').get_json()
+
+    assert [day['date'] for day in data['data']] == ['2031-03-01', '2031-03-02']
+    assert [show['id'] for day in data['data'] for show in day['shows']] == [at_start, inside]
+    assert (data['start'], data['end']) == ('2031-03-01T20:00:00', '2031-03-03T20:00:00')
+
+
+def test_calendar_page_groups_shows_by_day(app, client):
+    add_shows(datetime(2031, 3, 1, 20, 0), datetime(2031, 3, 1, 22, 0), datetime(2031, 3, 4, 20, 0))
+
+    page = client.get('/calendar?from=2031-03-01&to=2031-03-05').get_data(as_text=True)
+
+    assert page.count('<div class="tile tile-show">') == 3
+    assert 'Saturday, March 01' in page and 'Tuesday, March 04' in page
+    assert 'Sunday, March 02' not in page
+    empty = client.get('/calendar?from=2031-03-02&to=2031-03-04').get_data(as_text=True)
+    assert 'No shows in this period.' in empty
+
+
+def test_calendar_pages_stay_in_range(app, client):
+    show_ids = add_shows(*[datetime(2031, 4, 1, 18) + timedelta(days=day) for day in range(5)])
+    url = '/api/v1/calendar?from=2031-04-01&to=2031-04-05&limit=2'
+
+    seen, after = [], None
+    while True:
+        data = client.get(url + ('&after=' + after if after else '')).get_json()
+        seen.extend(show['id'] for day in data['data'] for show in day['shows'])
+        after = data['next']
+        if after is None:
+            break
+
+    assert seen == show_ids[:4]
@@ -0,0 +1,134 @@
+import pytest
+
+from app import create_app
+from models import db, Artist, Show, Venue
+from seed import seed_database
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(12, 12, 60, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def get_json(client, url, status=200):
+    response = client.get(url)
+    assert response.status_code == status, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def walk(client, url):
+    """ Every item of a listing, following its `next` cursors, and the number of pages. """
+    items, pages, after = [], 0, None
+    while True:
+        page = get_json(client, url + ('&after={}'.format(after) if after else ''))
+        items.extend(page['data'])
+        pages += 1
+        after = page['next']
+        if after is None:
+            return items, pages
+
+
+def test_default_fields(client):
+    venue = get_json(client, '/api/v1/venues?limit=1')['data'][0]
+
+    assert sorted(venue) == ['city', 'id', 'name', 'state', 'upcoming_shows_count']
+
+
+@pytest.mark.parametrize('url,fields', [
+    ('/api/v1/venues?fields=name', ['id', 'name']),
+    ('/api/v1/artists?fields=genres,phone', ['genres', 'id', 'phone']),
+    ('/api/v1/shows?fields=start_time,venue_name', ['id', 'start_time', 'venue_name']),
+])
+def test_sparse_fields(client, url, fields):
+    data = get_json(client, url)['data']
+
+    assert data and all(sorted(item) == fields for item in data)
+
+
+def test_detail_fields_match_the_model(app, client):
+    show = db.session.query(Show).first()
+    venue = db.session.get(Venue, show.venue_id)
+    data = get_json(client, '/api/v1/shows/{}?fields=venue_name,start_time,upcoming'.format(show.id))['data']
+
+    assert data == {'id': show.id, 'venue_name': venue.name, 'start_time': show.start_time.isoformat(),
+                    'upcoming': show.upcoming}
+    assert get_json(client, '/api/v1/artists/{}?fields=genres'.format(show.artist_id))['data']['genres'] == \
+        sorted(genre.name for genre in db.session.get(Artist, show.artist_id).genres)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/venues?fields=name,password',
+    '/api/v1/artists/1?fields=secret',
+    '/api/v1/shows?fields=venue_id,upcoming_shows_count',
+])
+def test_unknown_fields_are_rejected(client, url):
+    error = get_json(client, url, status=400)
+
+    assert error['error'] == 'Bad Request'
+    assert error['message'].startswith('Unknown fields:')
+
+
+def test_batch_lookup_by_ids(app, client):
+    ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id.desc()).limit(3)]
+    data = get_json(client, '/api/v1/venues?fields=name&ids={},999999,{}'.format(*ids[:2]))
+
+    assert [item['id'] for item in data['data']] == sorted(ids[:2])
+    assert 'next' not in data
+
+
+@pytest.mark.parametrize('ids', ['1,x', ','.join(str(i) for i in range(101))])
+def test_bad_batch_ids(client, ids):
+    assert get_json(client, '/api/v1/artists?ids=' + ids, status=400)['error'] == 'Bad Request'
+
+
+@pytest.mark.parametrize('resource,model,limit', [
+    ('venues', Venue, 5),
+    ('artists', Artist, 4),
+    ('shows', Show, 7),
+])
+def test_next_cursors_walk_every_row_once(app, client, resource, model, limit):
+    items, pages = walk(client, '/api/v1/{}?fields=id&limit={}'.format(resource, limit))
+    ids = [item['id'] for item in items]
+    total = db.session.query(db.func.count(model.id)).scalar()
+
+    assert len(ids) == len(set(ids)) == total
+    assert pages == -(-total // limit)
+
+
+def test_shows_are_listed_by_start_time(client):
+    items, _ = walk(client, '/api/v1/shows?fields=start_time&limit=9')
+
+    assert [item['start_time'] for item in items] == sorted(item['start_time'] for item in items)
+
+
+def test_malformed_cursor_starts_over(client):
+    first = get_json(client, '/api/v1/shows?limit=3')
+
+    assert get_json(client, '/api/v1/shows?limit=3&after=yesterday') == first
+    assert get_json(client, '/api/v1/venues?limit=3&after=1_2') == get_json(client, '/api/v1/venues?limit=3')
+
+
+def test_missing_entity(client):
+    assert get_json(client, '/api/v1/venues/999999', status=404)['error'] == 'Not Found'
+
+
+@pytest.mark.parametrize('url', ['/api/v2/venues', '/api/venues', '/api/v1/venue'])
+def test_only_version_1_is_routed(client, url):
+    assert client.get(url).status_code == 404
+
+
+def test_version_1_routes(app):
+    routes = {rule.rule for rule in app.url_map.iter_rules() if rule.rule.startswith('/api/')}
+
+    assert routes and all(rule.startswith('/api/v1/') for rule in routes)
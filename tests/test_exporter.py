@@ -0,0 +1,130 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import exporter
+from app import create_app
+from models import db, Show
+from seed import seed_database
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(5, 5, 80, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def expected_shows(start=None, end=None):
+    query = db.session.query(Show.id, Show.start_time).order_by(Show.start_time, Show.id)
+    if start:
+        query = query.filter(Show.start_time >= datetime.fromisoformat(start))
+    if end:
+        query = query.filter(Show.start_time < datetime.fromisoformat(end))
+    return [(show_id, start_time.isoformat()) for show_id, start_time in query]
+
+
+def csv_shows(text):
+    rows = list(csv.DictReader(io.StringIO(text)))
+    return [(int(row['show_id']), row['start_time']) for row in rows]
+
+
+def test_csv(app, client):
+    response = client.get('/exports/shows.csv')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=shows.csv'
+    text = response.get_data(as_text=True)
+    assert text.splitlines()[0] == ','.join(exporter.EXPORT_COLUMNS)
+    assert csv_shows(text) == expected_shows()
+
+
+def test_ndjson(app, client):
+    response = client.get('/exports/shows.ndjson')
+
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(record['show_id'], record['start_time']) for record in records] == expected_shows()
+    assert set(records[0]) == set(exporter.EXPORT_COLUMNS)
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_gzip(client, fmt):
+    plain = client.get('/exports/shows.{}'.format(fmt)).get_data()
+    response = client.get('/exports/shows.{}?gzip=1'.format(fmt))
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=shows.{}.gz'.format(fmt)
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_date_filters(app, client):
+    shows = expected_shows()
+    start, end = shows[10][1], shows[30][1]
+
+    response = client.get('/exports/shows.csv?start={}&end={}'.format(start, end))
+
+    # start is inclusive, end exclusive.
+    assert csv_shows(response.get_data(as_text=True)) == expected_shows(start, end)
+    assert csv_shows(response.get_data(as_text=True))[0] == shows[10]
+    assert shows[30] not in csv_shows(response.get_data(as_text=True))
+    date_only = client.get('/exports/shows.csv?end={}'.format(end[:10]))
+    assert csv_shows(date_only.get_data(as_text=True)) == expected_shows(end=end[:10])
+
+
+@pytest.mark.parametrize('url,status', [
+    ('/exports/shows.csv?start=last-week', 400),
+    ('/exports/shows.csv?end=2031-13-01', 400),
+    ('/exports/shows.xml', 404),
+])
+def test_bad_requests(client, url, status):
+    assert client.get(url).status_code == status
+
+
+def test_response_is_streamed(app, client, monkeypatch):
+    monkeypatch.setattr(exporter, 'CHUNK_ROWS', 10)
+    fetched = []
+    stream_rows = exporter.stream_rows
+
+    def counted(query):
+        for row in stream_rows(query):
+            fetched.append(row)
+            yield row
+    monkeypatch.setattr(exporter, 'stream_rows', counted)
+
+    response = client.get('/exports/shows.csv', buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+
+    assert response.is_streamed
+    assert 'Content-Length' not in response.headers
+    # The first chunk went out after its ten rows, not after every show.
+    assert len(csv_shows(first.decode('utf-8'))) == 10
+    assert len(fetched) == 10
+    rest = b''.join(chunks)
+    response.close()
+    assert len(fetched) == len(expected_shows())
+    assert csv_shows((first + rest).decode('utf-8')) == expected_shows()
+
+
+def test_export_command(app, tmp_path):
+    output = tmp_path / 'shows.csv.gz'
+
+    result = app.test_cli_runner().invoke(args=['fyyur', 'export', str(output), '--gzip'])
+
+    assert result.exit_code == 0, result.output
+    assert csv_shows(gzip.decompress(output.read_bytes()).decode('utf-8')) == expected_shows()
@@ -0,0 +1,180 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from facets import FACETED, facet_counts
+from forms import genre_choices, state_choices
+from genres import link_genres
+from models import db, Artist, Venue
+from page_cache import LRUCache
+
+# (name, city, state, seeking, genres)
+VENUES = [
+    ('The Musical Hop', 'San Francisco', 'CA', True, 'Jazz,Reggae,Soul'),
+    ('Park Square', 'San Francisco', 'CA', False, 'Jazz,Folk'),
+    ('The Dueling Pianos', 'New York', 'NY', True, 'Classical,Jazz'),
+    ('Cafe Oaxaca', 'Oakland', 'CA', None, 'Folk'),
+    ('Blue Room', 'Kansas City', 'MO', True, ''),
+    ('The Vault', 'Kansas City', 'KS', False, 'Jazz,Blues'),
+    ('Second Line', 'New Orleans', 'LA', True, 'Jazz,Blues,Funk'),
+]
+
+ARTISTS = [
+    ('Guns N Petals', 'San Francisco', 'CA', True, 'Rock n Roll'),
+    ('Matt Quevedo', 'New York', 'NY', False, 'Jazz'),
+    ('The Wild Sax Band', 'San Francisco', 'CA', False, 'Jazz,Classical'),
+]
+
+# (states, city, genres, seeking), as parse_facet_args() gives them.
+SELECTIONS = [
+    ((), None, (), None),
+    (('CA',), None, ('Jazz',), None),
+    (('CA', 'NY'), None, ('Folk', 'Jazz'), True),
+    (('CA',), 'San Francisco', ('Jazz',), False),
+    ((), 'Kansas City', (), None),
+    ((), None, ('Blues', 'Funk'), True),
+    (('NY',), 'San Francisco', (), None),
+    ((), None, (), False),
+]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        for model, rows in ((Venue, VENUES), (Artist, ARTISTS)):
+            entities = [model(name=name, city=city, state=state, phone='234-415-555-0100',
+                              facebook_link='https://www.facebook.com/x', **{FACETED[model][1]: seeking})
+                        for name, city, state, seeking, _ in rows]
+            db.session.add_all(entities)
+            db.session.flush()
+            link_genres(model, [(entity.id, row[4]) for entity, row in zip(entities, rows)])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def expected_facets(model, selection):
+    """ The facet counts of <selection>, counted entity by entity. """
+    states, city, genres, seeking = selection
+    flag = FACETED[model][1]
+    selected = [entity for entity in model.query
+                if (not states or entity.state in states) and (not city or entity.city == city)
+                and (not genres or {genre.name for genre in entity.genres} & set(genres))
+                and (seeking is None or bool(getattr(entity, flag)) == seeking)]
+    by_state = Counter(entity.state for entity in selected)
+    by_city = Counter((entity.city, entity.state) for entity in selected)
+    by_genre = Counter(genre.name for entity in selected for genre in entity.genres)
+    by_flag = Counter(bool(getattr(entity, flag)) for entity in selected)
+    cities = sorted(by_city.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        'state': [{'value': state, 'count': by_state[state]} for state, _ in state_choices],
+        'city': [{'value': city, 'state': state, 'count': count} for (city, state), count in cities],
+        'genre': [{'value': genre, 'count': by_genre[genre]} for genre, _ in genre_choices],
+        flag: [{'value': value, 'count': by_flag[value]} for value in (True, False)],
+    }
+
+
+def nonzero(facets, name):
+    return {facet['value']: facet['count'] for facet in facets[name] if facet['count']}
+
+
+class Statements(object):
+    """ The SQL statements run while in the block. """
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+        return self.statements
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_counts_under_combined_filters(app, model, selection):
+    assert facet_counts(model, selection) == expected_facets(model, selection)
+
+
+def test_browse_returns_the_selection_and_its_counts(app):
+    response = app.test_client().get('/api/v1/browse/venues?state=CA,NY&genre=Jazz&seeking_talent=true')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert sorted(venue['name'] for venue in data['data']) == ['The Dueling Pianos', 'The Musical Hop']
+    assert data['facets'] == expected_facets(Venue, (('CA', 'NY'), None, ('Jazz',), True))
+    assert nonzero(data['facets'], 'genre') == {'Classical': 1, 'Jazz': 2, 'Reggae': 1, 'Soul': 1}
+
+
+def test_counts_are_cached(app):
+    selection = (('CA',), None, (), None)
+    facets = facet_counts(Venue, selection)
+
+    with Statements() as statements:
+        assert facet_counts(Venue, selection) == facets
+    # Only the summary's change count is read.
+    assert len(statements) == 1
+
+
+def test_entity_writes_invalidate_the_counts(app):
+    selection = (('CA',), None, ('Jazz',), None)
+    assert nonzero(facet_counts(Venue, selection), 'city') == {'San Francisco': 2}
+
+    venue = Venue.query.filter_by(name='The Vault').one()
+    venue.state, venue.city = 'CA', 'Oakland'
+    db.session.commit()
+    assert nonzero(facet_counts(Venue, selection), 'city') == {'San Francisco': 2, 'Oakland': 1}
+
+    db.session.delete(Venue.query.filter_by(name='Park Square').one())
+    db.session.commit()
+    assert facet_counts(Venue, selection) == expected_facets(Venue, selection)
+    assert nonzero(facet_counts(Venue, selection), 'city') == {'San Francisco': 1, 'Oakland': 1}
+
+
+def test_genre_and_bulk_writes_invalidate_the_counts(app):
+    selection = ((), None, ('Funk',), None)
+    assert nonzero(facet_counts(Venue, selection), 'state') == {'LA': 1}
+
+    venue = Venue.query.filter_by(name='Blue Room').one()
+    link_genres(Venue, [(venue.id, 'Funk')])
+    db.session.commit()
+    assert nonzero(facet_counts(Venue, selection), 'state') == {'LA': 1, 'MO': 1}
+
+    Venue.query.filter(Venue.state == 'MO').update({'seeking_talent': False}, synchronize_session=False)
+    db.session.commit()
+    assert nonzero(facet_counts(Venue, selection), 'seeking_talent') == {True: 1, False: 1}
+
+
+def test_writes_elsewhere_keep_the_counts(app):
+    selection = ((), None, (), None)
+    facets = facet_counts(Venue, selection)
+
+    Artist.query.filter_by(name='Matt Quevedo').one().state = 'CA'
+    db.session.commit()
+    with Statements() as statements:
+        assert facet_counts(Venue, selection) == facets
+    assert len(statements) == 1
+    assert nonzero(facet_counts(Artist, selection), 'state') == {'CA': 3}
+
+
+def test_untracked_writes_are_not_seen(app):
+    """ The cache follows the change counts, not the rows: a write that
+    bypasses the session (and so the counters) is not picked up.
+    """
+    selection = ((), None, (), None)
+    facets = facet_counts(Venue, selection)
+
+    with db.engine.begin() as connection:
+        connection.execute(Venue.__table__.update().values(state='CA'))
+
+    assert facet_counts(Venue, selection) == facets
+    app.extensions['facet_cache'] = LRUCache()
+    assert nonzero(facet_counts(Venue, selection), 'state') == {'CA': len(VENUES)}
@@ -0,0 +1,152 @@
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import create_app
+from importer import import_records, read_records
+from models import db, Artist, Show, Venue
+from page_cache import LRUCache, page_key
+from seed import seed_database
+
+NOW = datetime(2030, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.extensions['page_cache'] = LRUCache()
+    with app.app_context():
+        db.create_all()
+        seed_database(2, 2, 0, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def ids(app):
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id).order_by(Artist.id)]
+    return venue_ids, artist_ids
+
+
+def venue(name, **values):
+    record = {'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main Street',
+              'phone': '234-415-555-0100', 'genres': 'Jazz,Folk', 'facebook_link': 'https://www.facebook.com/x',
+              'image_link': '', 'website_link': '', 'seeking_talent': 'false', 'seeking_description': ''}
+    record.update(values)
+    return record
+
+
+def ndjson(*records):
+    return read_records(io.StringIO(''.join(json.dumps(record) + '\n' for record in records)), 'ndjson')
+
+
+def counts(model, entity_id):
+    entity = db.session.get(model, entity_id)
+    db.session.refresh(entity)
+    return entity.upcoming_shows_count, entity.past_shows_count
+
+
+def test_invalid_rows_are_reported_by_line(app):
+    stream = io.StringIO(json.dumps(venue('Good Hall')) + '\n{not json\n' +
+                         json.dumps(venue('Bad Phone', phone='555')) + '\n' +
+                         json.dumps(venue('Bad Genre', genres='Polka')) + '\n')
+
+    report = import_records('venues', read_records(stream, 'ndjson'), batch_size=2)
+
+    assert report.inserted == 1
+    assert [error['line'] for error in report.errors] == [2, 3, 4]
+    assert list(report.errors[0]['errors']) == ['record']
+    assert report.errors[1]['errors'] == {'phone': ['Invalid phone.']}
+    assert report.errors[2]['errors'] == {'genres': ['Invalid genres.']}
+    assert db.session.query(Venue).filter(Venue.name == 'Good Hall').count() == 1
+
+
+def test_csv_shows_resolve_names(app, ids):
+    venue_ids, artist_ids = ids
+    venue_name = db.session.get(Venue, venue_ids[0]).name
+    artist_name = db.session.get(Artist, artist_ids[0]).name
+    stream = io.StringIO('venue_name,artist_name,start_time\n"{}","{}",2031-01-01T20:00:00\n'
+                         '"No Such Venue","{}",2031-01-02T20:00:00\n'.format(venue_name, artist_name, artist_name))
+
+    report = import_records('shows', read_records(stream, 'csv'), now=NOW)
+
+    assert report.inserted == 1
+    assert report.errors == [{'line': 3, 'errors': {'venue_id': ['Unknown venue.']}}]
+
+
+def test_double_bookings_are_rejected(app, ids):
+    venue_ids, artist_ids = ids
+    db.session.add(Show(venue_id=venue_ids[0], artist_id=artist_ids[0],
+                        start_time=datetime(2031, 1, 1, 20, 0), duration_minutes=120))
+    db.session.commit()
+
+    report = import_records('shows', ndjson(
+        # Against the database: the venue is booked until 22:00.
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[1], 'start_time': '2031-01-01T21:00:00'},
+        {'venue_id': venue_ids[1], 'artist_id': artist_ids[1], 'start_time': '2031-01-02T20:00:00'},
+        # Against the row above: the artist plays elsewhere at 20:00.
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[1], 'start_time': '2031-01-02T20:30:00'},
+    ), now=NOW)
+
+    assert report.inserted == 1
+    assert [error['line'] for error in report.errors] == [1, 3]
+    assert db.session.query(Show).count() == 2
+
+
+def test_show_counters_and_hooks_follow_each_batch(app, ids):
+    venue_ids, artist_ids = ids
+    cache = app.extensions['page_cache']
+    for venue_id in venue_ids:
+        cache.set(page_key('venue', venue_id), 'cached')
+    cache.set(page_key('artist', artist_ids[0]), 'cached')
+    typeahead = app.extensions['typeahead']
+    typeahead.get_index()
+    before = counts(Venue, venue_ids[0])
+
+    report = import_records('shows', ndjson(
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[0], 'start_time': '2031-01-01T20:00:00'},
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[0], 'start_time': '2031-01-02T20:00:00'},
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[0], 'start_time': '2029-01-01T20:00:00'},
+    ), batch_size=2, now=NOW)
+
+    assert report.inserted == 3
+    assert counts(Venue, venue_ids[0]) == (before[0] + 2, before[1] + 1)
+    assert cache.get(page_key('venue', venue_ids[0])) is None
+    assert cache.get(page_key('artist', artist_ids[0])) is None
+    # No show at the other venue.
+    assert cache.get(page_key('venue', venue_ids[1])) == 'cached'
+    name = db.session.get(Venue, venue_ids[0]).name
+    [match] = [result for result in typeahead.get_index().search(name, 10)
+               if result[:2] == ('venue', venue_ids[0])]
+    assert match[3] == before[0] + 2
+
+
+def test_new_venues_are_indexed(app):
+    typeahead = app.extensions['typeahead']
+    typeahead.get_index()
+
+    import_records('venues', ndjson(venue('Zanzibar Lounge')))
+
+    assert [result[2] for result in typeahead.get_index().search('zanzib', 10)] == ['Zanzibar Lounge']
+
+
+def test_start_times_with_offsets_and_fractions(app, ids):
+    venue_ids, artist_ids = ids
+    start_time = datetime(2031, 1, 1, 20, 0, 0, 250000, tzinfo=timezone(timedelta(hours=-5)))
+
+    report = import_records('shows', ndjson(
+        {'venue_id': venue_ids[0], 'artist_id': artist_ids[0], 'start_time': start_time.isoformat()},
+        {'venue_id': venue_ids[1], 'artist_id': artist_ids[1], 'start_time': '2031-01-01T20:00:00.5Z'},
+        {'venue_id': venue_ids[1], 'artist_id': artist_ids[1], 'start_time': '2031-01-01 8pm'},
+    ), now=NOW)
+
+    assert report.inserted == 2
+    assert report.errors == [{'line': 3, 'errors': {'start_time': ['Not a valid datetime value.']}}]
+    stored = dict(db.session.query(Show.venue_id, Show.start_time))
+    assert stored[venue_ids[0]] == start_time.astimezone().replace(tzinfo=None)
+    assert stored[venue_ids[1]] == datetime(2031, 1, 1, 20, 0, 0, 500000, tzinfo=timezone.utc) \
+        .astimezone().replace(tzinfo=None)
@@ -0,0 +1,168 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import create_app
+from forms import genre_choices
+from genres import genres_named
+from matchmaking import Scorer, Side, top_matches
+from models import db, Artist, Show, Venue
+from seed import seed_database
+
+# Few cities, so that many entities share a location and genres.
+LOCATIONS = [('San Francisco', 'CA'), ('Oakland', 'CA'), ('New York', 'NY'), ('Buffalo', 'NY'),
+             ('Austin', 'TX'), ('', 'TX'), ('Austin', ''), (None, None)]
+
+
+def random_rows(n, first_id, rng, genres):
+    rows = []
+    for i in range(n):
+        city, state = rng.choice(LOCATIONS)
+        rows.append((first_id + i, city, state, ','.join(rng.sample(genres, rng.randint(0, 3)))))
+    return rows
+
+
+def random_sides(seed, artists, venues, co_shows):
+    rng = random.Random(seed)
+    # A handful of genres: plenty of ties.
+    genres = [genre for genre, _ in genre_choices][:rng.choice([3, 6, len(genre_choices)])]
+    codes = {}
+    artist_side = Side.encode(random_rows(artists, 1, rng, genres), codes, -1)
+    venue_side = Side.encode(random_rows(venues, 1000, rng, genres), codes, -2)
+    pairs = sorted({(rng.randrange(artists), rng.randrange(venues)) for _ in range(co_shows)})
+    counts = [float(rng.randint(1, 4)) for _ in pairs]
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return artist_side, venue_side, (pairs[:, 0], pairs[:, 1], np.array(counts, dtype=np.float32))
+
+
+def brute_force(side, other, co_shows, k):
+    """ (positions, scores) of the <k> best of all of <other> for each of <side>. """
+    scorer = Scorer(side, other, co_shows)
+    scores = scorer.score(np.arange(len(side))[:, None], np.arange(len(other))[None, :])
+    best = []
+    for row in scores:
+        order = sorted((position for position in range(len(other)) if row[position] > 0),
+                       key=lambda position: (-row[position], position))[:k]
+        best.append([(position, row[position]) for position in order])
+    return best
+
+
+def pruned(matches):
+    return [[(position, score) for position, score in zip(positions, scores) if position >= 0]
+            for positions, scores in zip(matches.positions, matches.scores)]
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('artists,venues,k,block_size', [
+    (60, 40, 5, 1024),
+    (60, 40, 5, 3),
+    (200, 30, 12, 16),
+    (25, 8, 20, 4),
+    (1, 50, 3, 2),
+])
+def test_pruned_top_k_is_brute_force_top_k(seed, artists, venues, k, block_size):
+    artist_side, venue_side, co_shows = random_sides(seed, artists, venues, co_shows=artists)
+    artist_positions, venue_positions, counts = co_shows
+
+    assert pruned(top_matches(artist_side, venue_side, co_shows, k, block_size)) == \
+        brute_force(artist_side, venue_side, co_shows, k)
+    venue_co_shows = (venue_positions, artist_positions, counts)
+    assert pruned(top_matches(venue_side, artist_side, venue_co_shows, k, block_size)) == \
+        brute_force(venue_side, artist_side, venue_co_shows, k)
+
+
+def test_empty_sides():
+    artist_side, venue_side, co_shows = random_sides(0, 10, 0, co_shows=0)
+
+    matches = top_matches(artist_side, venue_side, co_shows, 5, 8)
+
+    assert matches.positions.shape == (10, 0)
+    assert matches.lookup(int(artist_side.ids[0])) == []
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(20, 20, 0, seed=3)
+        Artist.query.update({'seeking_venue': True}, synchronize_session=False)
+        Venue.query.update({'seeking_talent': True}, synchronize_session=False)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def matches_of(app, kind, entity_id):
+    """ The matches of an entity once any rebuild they started has finished. """
+    matchmaker = app.extensions['matchmaking']
+    matchmaker.get_matches(kind)
+    for thread in threading.enumerate():
+        if thread.name == 'matchmaking':
+            thread.join()
+    return matchmaker.get_matches(kind).lookup(entity_id)
+
+
+def test_route(app):
+    artist_id = db.session.query(Artist.id).first()[0]
+
+    data = app.test_client().get('/artists/{}/matches?limit=3'.format(artist_id)).get_json()
+
+    assert data['type'] == 'artist'
+    assert [(result['id'], result['score']) for result in data['results']] == \
+        matches_of(app, 'artist', artist_id)[:3]
+    assert all(result['type'] == 'venue' for result in data['results'])
+
+
+@pytest.mark.parametrize('change', [
+    lambda venue: setattr(venue, 'genres', genres_named(['Punk', 'Soul', 'Funk'])),
+    lambda venue: setattr(venue, 'seeking_talent', False),
+    lambda venue: setattr(venue, 'city', 'Nowhere'),
+])
+def test_writes_to_what_matches_depend_on_rebuild_them(app, change):
+    venue = Venue.query.order_by(Venue.id).first()
+    before = matches_of(app, 'venue', venue.id)
+    matchmaker = app.extensions['matchmaking']
+
+    change(venue)
+    db.session.commit()
+
+    assert matchmaker.is_stale()
+    after = matches_of(app, 'venue', venue.id)
+    assert not matchmaker.is_stale()
+    assert after != before
+    matchmaker.rebuild()
+    assert matchmaker.get_matches('venue').lookup(venue.id) == after
+
+
+def test_bulk_writes_rebuild_them(app):
+    matchmaker = app.extensions['matchmaking']
+    venue_id = db.session.query(Venue.id).first()[0]
+    assert matches_of(app, 'venue', venue_id)
+
+    Venue.query.filter(Venue.id == venue_id).update({'seeking_talent': False}, synchronize_session=False)
+    db.session.commit()
+
+    assert matchmaker.is_stale()
+    assert matches_of(app, 'venue', venue_id) == []
+
+
+def test_other_writes_keep_them(app):
+    matchmaker = app.extensions['matchmaking']
+    venue = Venue.query.order_by(Venue.id).first()
+    artist_id = db.session.query(Artist.id).first()[0]
+    matches_of(app, 'venue', venue.id)
+
+    venue.name = 'Renamed Hall'
+    venue.phone = '234-415-555-0199'
+    db.session.commit()
+    # The show counters are bulk updates of the venues and artists.
+    db.session.add(Show(venue_id=venue.id, artist_id=artist_id, duration_minutes=60,
+                        start_time=datetime.now() + timedelta(days=3)))
+    db.session.commit()
+
+    assert not matchmaker.is_stale()
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+import page_cache
+from page_cache import SQLiteCache
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """ Every connection the page cache opens. """
+    opened = []
+    sqlite3_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        opened.append(sqlite3_connect(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(page_cache.sqlite3, 'connect', connect)
+    return opened
+
+
+def is_closed(conn):
+    try:
+        conn.execute('SELECT 1')
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def test_sqlite_cache_closes_its_connections(tmp_path, connections):
+    cache = SQLiteCache(str(tmp_path / 'page_cache.sqlite'), maxsize=2)
+    cache.set('venue:1', 'one')
+    cache.set('venue:2', 'two')
+    cache.set('venue:3', 'three')
+    assert cache.get('venue:3') == 'three'
+    assert cache.get('venue:1') is None
+    cache.delete('venue:3')
+    assert len(cache) == 1
+
+    assert connections and all(is_closed(conn) for conn in connections)
+
+
+def test_sqlite_cache_rolls_back_and_closes_on_error(tmp_path, connections):
+    cache = SQLiteCache(str(tmp_path / 'page_cache.sqlite'))
+    with pytest.raises(sqlite3.OperationalError):
+        with cache._connect() as conn:
+            conn.execute("INSERT INTO page_cache VALUES ('venue:1', 'one', 0, 0)")
+            conn.execute('SELECT * FROM no_such_table')
+
+    assert len(cache) == 0
+    assert all(is_closed(conn) for conn in connections)
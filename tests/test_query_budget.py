@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Artist, Venue
+from query_budget import QueryBudgetExceeded, query_budget
+from seed import seed_database
+
+SEARCH = {'search_term': 'a'}
+
+# (method, path, form) of every view with a query budget.
+BUDGETED_REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('POST', '/venues/search', SEARCH),
+    ('GET', '/venues/1', None),
+    ('GET', '/venues/1/edit', None),
+    ('GET', '/venues/1/matches', None),
+    ('GET', '/artists', None),
+    ('POST', '/artists/search', SEARCH),
+    ('GET', '/artists/1', None),
+    ('GET', '/artists/1/edit', None),
+    ('GET', '/artists/1/matches', None),
+    ('GET', '/shows', None),
+    ('GET', '/calendar', None),
+    ('GET', '/autocomplete?q=a', None),
+    ('GET', '/api/v1/venues', None),
+    ('GET', '/api/v1/venues/1', None),
+    ('GET', '/api/v1/browse/venues', None),
+    ('GET', '/api/v1/artists', None),
+    ('GET', '/api/v1/artists/1', None),
+    ('GET', '/api/v1/browse/artists', None),
+    ('GET', '/api/v1/shows', None),
+    ('GET', '/api/v1/shows/1', None),
+    ('GET', '/api/v1/calendar', None),
+]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(5, 8, 30, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """ The statements executed on the test's thread; background refreshes
+    run their own queries.
+    """
+    executed = []
+    thread = threading.get_ident()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+
+def view_budget(app, method, path):
+    endpoint, _ = app.url_map.bind('localhost').match(path.split('?')[0], method)
+    return app.view_functions[endpoint].query_budget
+
+
+@pytest.mark.parametrize('method,path,form', BUDGETED_REQUESTS)
+def test_view_within_query_budget(app, client, statements, method, path, form):
+    budget = view_budget(app, method, path)
+    response = client.open(path, method=method, data=form)
+    response.get_data()
+
+    assert response.status_code == 200
+    assert len(statements) <= budget, '{} {} issued {} queries, budget is {}:\n{}'.format(
+        method, path, len(statements), budget, '\n'.join(statements))
+
+
+def test_every_budgeted_view_is_covered(app):
+    covered = {app.url_map.bind('localhost').match(path.split('?')[0], method)[0]
+               for method, path, _ in BUDGETED_REQUESTS}
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, 'query_budget')}
+    assert budgeted == covered
+
+
+def test_over_budget_view_fails(app, client):
+    @app.route('/_test/over_budget')
+    @query_budget(1)
+    def over_budget():
+        # One query per venue: the N+1 shape the budgets are there to catch.
+        names = [db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+                 for venue_id, in db.session.query(Venue.id)]
+        return ', '.join(names)
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/_test/over_budget')
+
+
+def test_over_budget_is_logged_outside_testing(app, client, caplog):
+    app.testing = False
+
+    @app.route('/_test/over_budget')
+    @query_budget(0)
+    def over_budget():
+        return str(db.session.query(db.func.count(Artist.id)).scalar())
+
+    response = client.get('/_test/over_budget')
+
+    assert response.status_code == 200
+    assert 'over_budget issued 1 queries, budget is 0' in caplog.text
@@ -0,0 +1,157 @@
+import json
+import re
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Artist, Show, Venue
+from seed import seed_database
+from venue_directory import venue_directory
+
+# (route, table) pairs allowed to read a whole table, and why. Any other full
+# read fails, and so does an exemption no route needs any more.
+FULL_READ_EXEMPTIONS = {
+    ('browse_venues', 'venues'):
+        'unfiltered facet counts group every venue by state, city and seeking; '
+        'facets.py caches them until the next write',
+    ('browse_artists', 'artists'):
+        'unfiltered facet counts group every artist by state, city and seeking; '
+        'facets.py caches them until the next write',
+}
+
+
+def build_routes(venue_id, artist_id, show_cursor):
+    """ (name, method, url, form) for every read route. """
+    return [
+        ('venues', 'GET', '/venues', None),
+        ('venues_by_genre', 'GET', '/venues?genre=Jazz', None),
+        ('artists', 'GET', '/artists', None),
+        ('artists_next_page', 'GET', '/artists?after={}'.format(artist_id), None),
+        ('artists_by_genre', 'GET', '/artists?genre=Jazz', None),
+        ('shows', 'GET', '/shows', None),
+        ('shows_next_page', 'GET', '/shows?after={}'.format(show_cursor), None),
+        ('calendar_weekend', 'GET', '/calendar?window=weekend', None),
+        ('calendar_city', 'GET', '/calendar?window=week&city=Chicago&state=IL', None),
+        ('calendar_venue', 'GET', '/calendar?from=2020-01-01&to=2040-01-01&venue_id={}'.format(venue_id), None),
+        ('browse_venues', 'GET', '/api/v1/browse/venues', None),
+        ('browse_artists', 'GET', '/api/v1/browse/artists', None),
+        ('browse_venues_jazz', 'GET', '/api/v1/browse/venues?genre=Jazz', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': 'velvet'}),
+        ('search_artists', 'POST', '/artists/search', {'search_term': 'band'}),
+        ('show_venue', 'GET', '/venues/{}'.format(venue_id), None),
+        ('show_artist', 'GET', '/artists/{}'.format(artist_id), None),
+        ('edit_venue', 'GET', '/venues/{}/edit'.format(venue_id), None),
+        ('edit_artist', 'GET', '/artists/{}/edit'.format(artist_id), None),
+    ]
+
+
+ROUTE_NAMES = [name for name, _, _, _ in build_routes(0, 0, '')]
+
+
+def explain(connection, statement, parameters):
+    """ (plan lines, tables read in full) for one statement: a bare SCAN on
+    SQLite, a Seq Scan on PostgreSQL.
+    """
+    if connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        lines, scans = [], []
+
+        def walk(node, depth):
+            relation = node.get('Relation Name')
+            lines.append('{}{}{}'.format('  ' * depth, node['Node Type'],
+                                         ' on ' + relation if relation else ''))
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(relation)
+            for child in node.get('Plans', ()):
+                walk(child, depth + 1)
+
+        walk(plan[0]['Plan'], 0)
+        return lines, scans
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    lines = [row[-1] for row in rows]
+    ordered_limit = ' LIMIT ' in statement.upper() and not any('TEMP B-TREE' in line for line in lines)
+    # Plans name tables by alias; subqueries and materialized joins resolve
+    # to no table and are not reported themselves.
+    tables = set(db.metadata.tables) | {venue_directory.name}
+    aliases = {alias: table for table, alias in re.findall(r'\b(\w+) AS (\w+)\b', statement)
+               if table in tables}
+    scans = []
+    for line in lines:
+        words = line.split()
+        # "SCAN t" reads every row; "SCAN t USING INDEX ..." walks an index in
+        # order. A rowid-ordered SCAN under a LIMIT stops early and is fine.
+        if words[:1] == ['SCAN'] and 'USING' not in words and not ordered_limit:
+            table = aliases.get(words[1], words[1])
+            if table in tables:
+                scans.append(table)
+    return lines, scans
+
+
+@pytest.fixture(scope='module')
+def app():
+    # Seeded once: the plans depend on the data, not on test order.
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(200, 500, 5000, seed=1)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='module')
+def routes(app):
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    first_show = db.session.query(Show.start_time, Show.id).order_by(Show.start_time, Show.id).first()
+    show_cursor = '{}_{}'.format(first_show.start_time.isoformat(), first_show.id)
+    return {route[0]: route for route in build_routes(venue_id, artist_id, show_cursor)}
+
+
+@pytest.fixture(scope='module')
+def full_reads(app, routes):
+    """ {route name: {table read in full: plan}} over every route. """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    reads = {}
+    for name, method, url, form in routes.values():
+        del captured[:]
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            response = client.open(url, method=method, data=form)
+            response.get_data()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        assert response.status_code == 200, '{} {}: HTTP {}'.format(method, url, response.status_code)
+
+        reads[name] = {}
+        with db.engine.connect() as connection:
+            for statement, parameters in captured:
+                lines, scans = explain(connection, statement, parameters)
+                for table in scans:
+                    reads[name][table] = '{}\n  {}'.format(' '.join(statement.split()), '\n  '.join(lines))
+    return reads
+
+
+@pytest.mark.parametrize('name', ROUTE_NAMES)
+def test_route_reads_no_whole_table(full_reads, name):
+    unexpected = {table: plan for table, plan in full_reads[name].items()
+                  if (name, table) not in FULL_READ_EXEMPTIONS}
+    assert not unexpected, '{} reads every row of {}:\n{}'.format(
+        name, ', '.join(sorted(unexpected)), '\n'.join(unexpected.values()))
+
+
+@pytest.mark.parametrize('name,table', sorted(FULL_READ_EXEMPTIONS))
+def test_exemption_still_needed(full_reads, name, table):
+    assert table in full_reads[name], '{} no longer reads all of {}: drop its exemption'.format(name, table)
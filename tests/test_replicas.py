@@ -0,0 +1,71 @@
+import pytest
+
+from app import create_app
+from config import TestingConfig
+from models import db, Venue
+from replicas import LAG_QUERIES
+from seed import seed_database
+
+
+@pytest.fixture
+def app(tmp_path):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(tmp_path / 'primary.db')
+        SQLALCHEMY_REPLICA_URIS = ['sqlite:///{}'.format(tmp_path / 'replica.db')]
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        REPLICA_MAX_LAG = 5
+        # Measure the lag on every request, so a test can change it.
+        REPLICA_LAG_CHECK_INTERVAL = 0
+        PAGE_CACHE_BACKEND = 'memory'
+
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        seed_database(2, 2, 2, seed=1)
+    assert app.test_cli_runner().invoke(args=['sync-replicas']).exit_code == 0
+
+    # A write the replica has not received yet.
+    with app.app_context():
+        venue = Venue.query.first()
+        venue.name = 'Renamed On The Primary'
+        db.session.commit()
+        app.config['VENUE_ID'] = venue.id
+    return app
+
+
+def fake_lag(monkeypatch, seconds):
+    monkeypatch.setitem(LAG_QUERIES, 'sqlite', lambda connection: seconds)
+
+
+def venue_page(app):
+    return app.test_client().get('/venues/{}'.format(app.config['VENUE_ID'])).get_data(as_text=True)
+
+
+def test_reads_come_from_an_up_to_date_replica(app):
+    assert 'Renamed On The Primary' not in venue_page(app)
+
+
+def test_lagging_replica_falls_back_to_the_primary(app, monkeypatch):
+    fake_lag(monkeypatch, 60)
+
+    assert 'Renamed On The Primary' in venue_page(app)
+
+
+def test_unreachable_replica_falls_back_to_the_primary(app, monkeypatch):
+    def unreachable(connection):
+        raise OSError('replica down')
+    monkeypatch.setitem(LAG_QUERIES, 'sqlite', unreachable)
+
+    assert 'Renamed On The Primary' in venue_page(app)
+
+
+def test_pages_from_a_lagging_replica_are_not_cached(app, monkeypatch):
+    cache = app.extensions['page_cache']
+    fake_lag(monkeypatch, 1)
+
+    assert 'Renamed On The Primary' not in venue_page(app)
+    assert len(cache) == 0
+
+    fake_lag(monkeypatch, 0)
+    venue_page(app)
+    assert len(cache) == 1
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from genres import link_genres
+from models import db, Artist, Show, Venue
+from pages import name_search_query, search_results
+from search import FTS_MIN_TERM_LENGTH, fts_table_name, name_contains
+from seed import seed_database
+
+NAMES = ['The Musical Hop', 'Park Square Live Music & Coffee', 'The Dueling Pianos Bar',
+         'HOPSCOTCH HALL', '100% Jazz_Club']
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(0, 1, 0, seed=1)
+        for name in NAMES:
+            db.session.add(Venue(name=name, city='San Francisco', state='CA', address='1 Main Street',
+                                 phone='234-415-555-0100', facebook_link='https://www.facebook.com/x'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def search(term, model=Venue, genres=()):
+    return search_results(name_search_query(model, term, list(genres), db.engine.dialect.name).all())
+
+
+def names(term, model=Venue):
+    return [row['name'] for row in search(term, model)['data']]
+
+
+@pytest.mark.parametrize('term,expected', [
+    ('Hop', ['HOPSCOTCH HALL', 'The Musical Hop']),
+    ('music', ['Park Square Live Music & Coffee', 'The Musical Hop']),
+    ('  MUSIC  ', ['Park Square Live Music & Coffee', 'The Musical Hop']),
+    ('ano', ['The Dueling Pianos Bar']),
+    ('e M', ['Park Square Live Music & Coffee', 'The Musical Hop']),
+    ('"Hop"', []),
+    ('zzz', []),
+])
+def test_trigram_terms_match_case_insensitive_substrings(app, term, expected):
+    assert len(term.strip()) >= FTS_MIN_TERM_LENGTH
+    filter_sql = str(name_contains(Venue, term, 'sqlite'))
+    assert fts_table_name('venues') in filter_sql
+
+    result = search(term)
+
+    assert result['count'] == len(expected)
+    assert sorted(row['name'] for row in result['data']) == expected
+
+
+@pytest.mark.parametrize('term,expected', [
+    ('ho', ['HOPSCOTCH HALL', 'The Musical Hop']),
+    ('Hp', []),
+    ('%', ['100% Jazz_Club']),
+    ('_', ['100% Jazz_Club']),
+    ('', sorted(NAMES)),
+])
+def test_short_terms_use_like(app, term, expected):
+    assert len(term) < FTS_MIN_TERM_LENGTH
+    assert fts_table_name('venues') not in str(name_contains(Venue, term, 'sqlite'))
+
+    assert sorted(names(term)) == expected
+
+
+def test_fts_mirror_follows_renames_and_deletes(app):
+    venue = Venue.query.filter_by(name='The Musical Hop').one()
+    venue.name = 'The Lyrical Skip'
+    db.session.commit()
+
+    assert names('musical') == []
+    assert names('lyrical') == ['The Lyrical Skip']
+
+    db.session.delete(venue)
+    db.session.commit()
+    assert names('lyrical') == []
+
+
+def test_upcoming_show_counts_come_with_the_results(app):
+    venue = Venue.query.filter_by(name='The Musical Hop').one()
+    artist_id = db.session.query(Artist.id).scalar()
+    for days in (1, 2, -1):
+        db.session.add(Show(venue_id=venue.id, artist_id=artist_id, duration_minutes=60,
+                            start_time=datetime.now() + timedelta(days=days)))
+    db.session.commit()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = app.test_client().post('/venues/search', data={'search_term': 'musical'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    page = response.get_data(as_text=True)
+    assert 'Number of search results for "musical": 1' in page
+    assert len(statements) == 1
+    assert search('musical')['data'] == [{'id': venue.id, 'name': 'The Musical Hop', 'num_upcoming_shows': 2}]
+
+
+def test_genre_filter_narrows_the_search(app):
+    venue = Venue.query.filter_by(name='HOPSCOTCH HALL').one()
+    link_genres(Venue, [(venue.id, ['Jazz'])])
+    db.session.commit()
+
+    assert [row['name'] for row in search('hop', genres=['Jazz'])['data']] == ['HOPSCOTCH HALL']
+    assert search('hop', genres=['Folk'])['count'] == 0
+
+
+def test_artist_search(app):
+    artist = Artist.query.one()
+
+    assert names(artist.name[1:-1].upper(), Artist) == [artist.name]
+    response = app.test_client().post('/artists/search', data={'search_term': artist.name.lower()})
+    assert 'Number of search results for "{}": 1'.format(artist.name.lower()) in response.get_data(as_text=True)
@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from models import db, Artist, Show, Venue
+from seed import seed_database
+from show_counters import ROLLOVER_LEASE, acquire_lease, rebuild_show_counters, roll_over_shows
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(3, 3, 0, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def ids(app):
+    return db.session.query(db.func.min(Venue.id)).scalar(), db.session.query(db.func.min(Artist.id)).scalar()
+
+
+def add_show(venue_id, artist_id, start_time):
+    show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time, duration_minutes=60)
+    db.session.add(show)
+    db.session.commit()
+    return show.id
+
+
+def counters():
+    """ {(model name, id): (upcoming, past)} of every venue and artist. """
+    db.session.expire_all()
+    return {(model.__name__, entity.id): (entity.upcoming_shows_count or 0, entity.past_shows_count or 0)
+            for model in (Venue, Artist) for entity in db.session.query(model)}
+
+
+def test_insert_counts_upcoming_and_past(ids):
+    venue_id, artist_id = ids
+    add_show(venue_id, artist_id, datetime.now() + timedelta(days=3))
+    add_show(venue_id, artist_id, datetime.now() - timedelta(days=3))
+
+    assert counters()[('Venue', venue_id)] == (1, 1)
+    assert counters()[('Artist', artist_id)] == (1, 1)
+
+
+def test_delete_uncounts(ids):
+    venue_id, artist_id = ids
+    show_id = add_show(venue_id, artist_id, datetime.now() + timedelta(days=3))
+
+    db.session.delete(db.session.get(Show, show_id))
+    db.session.commit()
+
+    assert counters()[('Venue', venue_id)] == (0, 0)
+    assert counters()[('Artist', artist_id)] == (0, 0)
+
+
+def test_rollover_moves_started_shows(ids):
+    venue_id, artist_id = ids
+    add_show(venue_id, artist_id, datetime.now() + timedelta(days=1))
+    add_show(venue_id, artist_id, datetime.now() + timedelta(days=3))
+
+    assert roll_over_shows(now=datetime.now() + timedelta(days=2)) == 1
+    assert counters()[('Venue', venue_id)] == (1, 1)
+    assert roll_over_shows(now=datetime.now() + timedelta(days=2)) == 0
+    assert counters()[('Artist', artist_id)] == (1, 1)
+
+
+def test_rollover_skips_shows_another_rollover_flipped(ids, monkeypatch):
+    venue_id, artist_id = ids
+    add_show(venue_id, artist_id, datetime.now() + timedelta(days=1))
+    add_show(venue_id, artist_id, datetime.now() + timedelta(days=1, hours=1))
+    before = counters()
+
+    # Another process flips one of the shows between the read and the update.
+    query = db.session.query
+
+    def racing_query(*entities):
+        result = query(*entities)
+        if entities[0] is Show:
+            db.session.execute(Show.__table__.update().where(Show.id == result.session.query(
+                db.func.min(Show.id)).scalar_subquery()).values(upcoming=False))
+        return result
+
+    monkeypatch.setattr(db.session, 'query', racing_query)
+    assert roll_over_shows(now=datetime.now() + timedelta(days=2)) == 0
+    monkeypatch.undo()
+
+    assert counters() == before
+    assert db.session.query(Show).filter(Show.upcoming.is_(True)).count() == 2
+
+
+def test_rebuild_matches_incremental_counters(app):
+    rng = random.Random(3)
+    venue_ids = [venue_id for venue_id, in db.session.query(Venue.id)]
+    artist_ids = [artist_id for artist_id, in db.session.query(Artist.id)]
+    now = datetime.now()
+    show_ids = [add_show(rng.choice(venue_ids), rng.choice(artist_ids), now + timedelta(hours=hours))
+                for hours in rng.sample(range(-500, 500), 40)]
+    for show_id in rng.sample(show_ids, 10):
+        db.session.delete(db.session.get(Show, show_id))
+        db.session.commit()
+    later = now + timedelta(hours=200)
+    roll_over_shows(now=later)
+    incremental = counters()
+
+    rebuild_show_counters(now=later)
+
+    assert counters() == incremental
+    assert sum(upcoming + past for upcoming, past in incremental.values()) == 2 * 30
+
+
+def test_rebuild_show_counters_command(app, ids):
+    venue_id, artist_id = ids
+    add_show(venue_id, artist_id, datetime.now() - timedelta(days=1))
+    db.session.execute(Venue.__table__.update().values(past_shows_count=7))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-show-counters'])
+
+    assert 'Show counters rebuilt.' in result.output
+    assert counters()[('Venue', venue_id)] == (0, 1)
+
+
+def test_one_lease_holder_at_a_time(app):
+    now = datetime.now()
+
+    assert acquire_lease(ROLLOVER_LEASE, 'worker-1', 60, now=now)
+    assert not acquire_lease(ROLLOVER_LEASE, 'worker-2', 60, now=now + timedelta(seconds=30))
+    assert acquire_lease(ROLLOVER_LEASE, 'worker-1', 60, now=now + timedelta(seconds=30))
+    # worker-1 stopped renewing.
+    assert acquire_lease(ROLLOVER_LEASE, 'worker-2', 60, now=now + timedelta(seconds=91))
+    assert not acquire_lease(ROLLOVER_LEASE, 'worker-1', 60, now=now + timedelta(seconds=92))
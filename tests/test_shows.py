@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from models import db, Artist, Show, Venue
+from seed import seed_database
+from validation import SHOW_RULES
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(2, 2, 0, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def show_form(app, **values):
+    with app.app_context():
+        form = {'venue_id': str(db.session.query(db.func.min(Venue.id)).scalar()),
+                'artist_id': str(db.session.query(db.func.min(Artist.id)).scalar()),
+                'start_time': '2031-01-01 20:00:00', 'duration_minutes': '90'}
+    form.update(values)
+    return form
+
+
+def show_count(app):
+    with app.app_context():
+        return db.session.query(db.func.count(Show.id)).scalar()
+
+
+def test_show_is_created(app, client):
+    response = client.post('/shows/create', data=show_form(app))
+
+    assert response.status_code == 200
+    assert show_count(app) == 1
+
+
+@pytest.mark.parametrize('field,value,message', [
+    ('venue_id', '', 'This field is required.'),
+    ('artist_id', '', 'This field is required.'),
+    ('venue_id', 'abc', 'Not a valid integer value.'),
+    ('artist_id', '1.5', 'Not a valid integer value.'),
+    ('venue_id', '999999', 'Unknown venue.'),
+    ('artist_id', '999999', 'Unknown artist.'),
+])
+def test_invalid_ids_rerender_the_form(app, client, field, value, message):
+    response = client.post('/shows/create', data=show_form(app, **{field: value}))
+
+    page = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'class="form"' in page
+    assert '{}: {}'.format(field, message) in page
+    assert show_count(app) == 0
+
+
+@pytest.mark.parametrize('value,message', [
+    ('2031-01-01 8pm', 'start_time: Not a valid datetime value.'),
+    ('', 'start_time: This field is required.'),
+])
+def test_invalid_start_times_rerender_the_form(app, client, value, message):
+    response = client.post('/shows/create', data=show_form(app, start_time=value))
+
+    assert message in response.get_data(as_text=True)
+    assert show_count(app) == 0
+
+
+def test_iso_start_times_are_accepted_as_in_imports(app, client):
+    client.post('/shows/create', data=show_form(app, start_time='2031-01-01T20:00:00'))
+
+    with app.app_context():
+        assert db.session.query(Show.start_time).scalar() == datetime(2031, 1, 1, 20, 0)
+
+
+def test_show_rules_coerce_ids():
+    record, errors = SHOW_RULES.validate({'venue_id': '3', 'artist_id': 4, 'start_time': '2031-01-01 20:00'})
+    assert errors == {}
+    assert (record['venue_id'], record['artist_id']) == (3, 4)
+
+    _, errors = SHOW_RULES.validate({'venue_id': 'x', 'start_time': '2031-01-01 20:00'})
+    assert errors == {'venue_id': ['Not a valid integer value.'], 'artist_id': ['This field is required.']}
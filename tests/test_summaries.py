@@ -0,0 +1,76 @@
+import pytest
+
+from app import create_app
+from models import db, SummaryChange, Venue
+from summaries import record_refresh, summary_changes_query, summary_slots
+from venue_directory import DIRECTORY, refresh_venue_directory
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    # No refresh after each commit: the tests refresh by hand.
+    app.extensions.pop('venue_directory')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def add_venue(name='Summary Hall'):
+    db.session.add(Venue(name=name, city='San Francisco', state='CA', address='1 Main Street',
+                         phone='234-415-555-0100', facebook_link='https://www.facebook.com/hall'))
+    db.session.commit()
+
+
+def state(name):
+    return db.session.execute(summary_changes_query(name)).first()
+
+
+def test_write_marks_summaries_changed(app):
+    add_venue()
+
+    directory = state(DIRECTORY)
+    assert (directory.changes, directory.refreshed_changes) == (1, 0)
+    assert directory.stale_since is not None
+    facets = state('venue_facets')
+    assert facets.changes == 1
+    # Facet counts are never rebuilt, so nothing would ever clear it.
+    assert facets.stale_since is None
+    assert state('artist_facets').changes == 0
+
+
+def test_writers_spread_over_counters(app):
+    for i in range(40):
+        add_venue('Summary Hall {}'.format(i))
+
+    counts = summary_slots(db.session.connection(), DIRECTORY)
+    assert sum(counts.values()) == 40
+    assert len([count for count in counts.values() if count]) > 1
+
+
+def test_refresh_clears_stale_since(app):
+    add_venue()
+    with db.engine.begin() as connection:
+        assert refresh_venue_directory(connection)
+
+    directory = state(DIRECTORY)
+    assert directory.changes == directory.refreshed_changes == 1
+    assert directory.stale_since is None
+
+
+def test_write_during_refresh_stays_stale(app):
+    add_venue()
+    with db.engine.begin() as connection:
+        slots = summary_slots(connection, DIRECTORY)
+    add_venue('Committed During The Refresh')
+    with db.engine.begin() as connection:
+        record_refresh(connection, DIRECTORY, slots)
+
+    directory = state(DIRECTORY)
+    assert (directory.changes, directory.refreshed_changes) == (2, 1)
+    assert directory.stale_since is not None
+    stale_slots = SummaryChange.query.filter(SummaryChange.name == DIRECTORY,
+                                             SummaryChange.stale_since.isnot(None)).count()
+    assert stale_slots == 1
@@ -0,0 +1,127 @@
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Artist, Venue
+from seed import seed_database
+from typeahead import Typeahead
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed_database(3, 3, 0, seed=1)
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def typeahead(app):
+    return app.extensions['typeahead']
+
+
+def during_load(monkeypatch, before=None, after=None):
+    """ Run <before> and <after> around the rebuild's read of every name. """
+    load = Typeahead.load
+
+    def patched(self, keys=None):
+        if keys is not None:
+            return load(self, keys)
+        if before:
+            before(self)
+        entities = load(self, keys)
+        if after:
+            after(self)
+        return entities
+    monkeypatch.setattr(Typeahead, 'load', patched)
+
+
+def venue_entry(typeahead, venue_id):
+    return typeahead.index.entities.get(('venue', venue_id))
+
+
+def test_change_during_rebuild_is_kept(typeahead, monkeypatch):
+    venue = Venue.query.first()
+
+    def rename(typeahead):
+        venue.name = 'Renamed While Rebuilding'
+        db.session.commit()
+        typeahead.apply('add', 'venue', venue.id, venue.name, None)
+    during_load(monkeypatch, after=rename)
+    typeahead.rebuild()
+
+    assert venue_entry(typeahead, venue.id)[0] == 'Renamed While Rebuilding'
+    assert typeahead.index.search('renamed while', 1)[0][1] == venue.id
+
+
+def test_change_read_by_rebuild_is_not_counted_twice(typeahead, monkeypatch):
+    typeahead.rebuild()
+    venue = Venue.query.first()
+    upcoming = venue_entry(typeahead, venue.id)[1]
+
+    # Committed before the names are read, applied to the index after.
+    def add_show(typeahead):
+        venue.upcoming_shows_count = upcoming + 1
+        db.session.commit()
+    during_load(monkeypatch, before=add_show,
+                after=lambda typeahead: typeahead.apply('count_shows', 'venue', venue.id, 1))
+    typeahead.rebuild()
+
+    assert venue_entry(typeahead, venue.id)[1] == upcoming + 1
+
+
+def test_removal_during_rebuild_is_kept(typeahead, monkeypatch):
+    venue = Venue.query.first()
+
+    def delete(typeahead):
+        db.session.delete(venue)
+        db.session.commit()
+        typeahead.apply('remove', 'venue', venue.id)
+    during_load(monkeypatch, before=delete)
+    typeahead.rebuild()
+
+    assert venue_entry(typeahead, venue.id) is None
+
+
+def test_show_submission_counts_in_the_index(app, typeahead):
+    typeahead.rebuild()
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    venue_upcoming = venue_entry(typeahead, venue_id)[1]
+    artist_upcoming = typeahead.index.entities['artist', artist_id][1]
+
+    response = app.test_client().post('/shows/create', data={
+        'venue_id': str(venue_id), 'artist_id': str(artist_id), 'start_time': '2031-01-01 20:00:00'})
+
+    assert response.status_code == 200
+    assert venue_entry(typeahead, venue_id)[1] == venue_upcoming + 1
+    assert typeahead.index.entities['artist', artist_id][1] == artist_upcoming + 1
+
+
+@pytest.mark.parametrize('changed,queries', [((), 2), (('venue', 'artist'), 4)])
+def test_autocomplete_cold_start_within_budget(app, typeahead, monkeypatch, changed, queries):
+    # Entities changed while the first request reads the names are read again.
+    def change(typeahead):
+        for kind in changed:
+            typeahead.apply('count_shows', kind, 1, 0)
+    during_load(monkeypatch, after=change)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        client = app.test_client()
+        cold = client.get('/autocomplete?q=a')
+        cold_queries = len(statements)
+        warm = client.get('/autocomplete?q=a')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert cold.status_code == warm.status_code == 200
+    assert cold.get_json() == warm.get_json()
+    assert cold_queries == queries
+    assert len(statements) == queries
@@ -0,0 +1,114 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import create_app
+from forms import ArtistForm, ShowForm, VenueForm, apply_rules
+from validation import ARTIST_RULES, SHOW_RULES, URL_PATTERN, VENUE_RULES
+
+VENUE = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+         'phone': '234-415-555-0100', 'genres': ['Jazz', 'Folk'], 'facebook_link': 'https://www.facebook.com/x',
+         'image_link': '', 'website_link': '', 'seeking_description': ''}
+
+SHOW = {'venue_id': '1', 'artist_id': '2', 'start_time': '2031-01-01 20:00:00', 'duration_minutes': '90'}
+
+BAD_CONTACTS = [
+    {'phone': '555'},
+    {'phone': ''},
+    {'phone': '234-415-555-0100x'},
+    {'name': '  '},
+    {'state': 'XX'},
+    {'state': ''},
+    {'genres': ['Polka']},
+    {'genres': ['Jazz', 'Polka']},
+    {'genres': []},
+    {'facebook_link': ''},
+    {'facebook_link': 'facebook'},
+    {'facebook_link': 'http://localhost:80/x'},
+    {'facebook_link': 'http://-a.com'},
+    {'facebook_link': 'http://999.1.1.1/x'},
+    {'facebook_link': 'https://www.facebook.com/x', 'phone': '1', 'state': 'ZZ', 'genres': ['Polka']},
+]
+
+BAD_SHOWS = [
+    {'start_time': ''},
+    {'start_time': 'tomorrow'},
+    {'start_time': '2031-02-30 20:00:00'},
+    {'duration_minutes': '0'},
+    {'duration_minutes': '800'},
+    {'duration_minutes': 'ab'},
+    {'venue_id': 'x', 'artist_id': ''},
+]
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.test_request_context():
+        yield app
+
+
+def form_errors(form):
+    return {field.name: field.errors for field in form if field.errors}
+
+
+def batch_errors(rules, record):
+    """ The errors of <record> when validated in a batch among valid ones. """
+    _, errors = rules.validate_batch([record, record, record])
+    return errors.get(1, {})
+
+
+def with_values(record, values):
+    record = dict(record, **values)
+    # The importer gets the genres of a CSV row as one string.
+    record['genres'] = ','.join(record['genres'])
+    return record
+
+
+@pytest.mark.parametrize('values', BAD_CONTACTS)
+@pytest.mark.parametrize('form_class,rules,record', [
+    (VenueForm, VENUE_RULES, dict(VENUE, seeking_talent='y')),
+    (ArtistForm, ARTIST_RULES, dict(VENUE, seeking_venue='y')),
+])
+def test_forms_and_batches_give_the_same_errors(app, form_class, rules, record, values):
+    record = {name: value for name, value in record.items() if name in rules.names}
+    form = form_class(formdata=MultiDict(dict(record, **values)))
+
+    assert not form.validate()
+    assert form_errors(form) == batch_errors(rules, with_values(record, values))
+    assert batch_errors(rules, with_values(record, {})) == {}
+
+
+@pytest.mark.parametrize('values', BAD_SHOWS)
+def test_show_form_and_batches_give_the_same_errors(app, values):
+    form = ShowForm(formdata=MultiDict(dict(SHOW, **values)))
+
+    assert apply_rules(form, SHOW_RULES) is None
+    assert form_errors(form) == batch_errors(SHOW_RULES, dict(SHOW, **values))
+
+
+def test_valid_records_pass_both(app):
+    form = VenueForm(formdata=MultiDict(VENUE))
+    show_form = ShowForm(formdata=MultiDict(SHOW))
+
+    assert form.validate()
+    assert apply_rules(show_form, SHOW_RULES)['start_time'] == show_form.start_time.data
+    assert batch_errors(VENUE_RULES, with_values(VENUE, {})) == {}
+
+
+@pytest.mark.parametrize('url,valid', [
+    ('https://www.facebook.com/x?y=1', True),
+    ('http://a.b-c.co.uk:8080/x', True),
+    ('https://1.2.3.4/', True),
+    ('http://xn--bcher-kva.example', True),
+    ('http://localhost', False),
+    ('http://example', False),
+    ('http://a..com', False),
+    ('http://256.1.1.1', False),
+    ('http://a.com#frag', False),
+    ('mailto:x@y.com', False),
+])
+def test_url_pattern_matches_wtforms(app, url, valid):
+    form = VenueForm(formdata=MultiDict({'facebook_link': url}))
+
+    assert form.facebook_link.validate(form) is valid
+    assert bool(URL_PATTERN.match(url)) is valid
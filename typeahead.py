@@ -0,0 +1,276 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+
+from models import db, Artist, Venue
+from query_budget import query_budget
+
+# ----------------------------------------------------------------------------#
+# Typeahead.
+#
+# /autocomplete?q= answers from an in-process index of venue and artist
+# names and issues no SQL once the index is built. Every word of a
+# normalized name starts a key ("the musical hop", "musical hop", "hop") in
+# sorted lists, so the names with a word starting with the query are found
+# by bisection. Matches are ranked by upcoming show count.
+#
+# The index is built on first use and kept current by the views that create,
+# edit and delete venues, artists and shows in this process. Writes made
+# elsewhere (other workers, `flask import`) show up when it is rebuilt in the
+# background, once it is older than TYPEAHEAD_MAX_AGE seconds.
+#
+# A rebuild starts a journal of the entities changed in this process before
+# it reads the names. It then reloads the journaled entities into the new
+# index and swaps it in under the lock that changes take, so no change made
+# during the rebuild is lost or applied twice. (A view applies its change
+# right after its commit: one that commits before the reload but reaches the
+# index after the swap is still counted twice, until the next rebuild.)
+# ----------------------------------------------------------------------------#
+
+KINDS = {
+    'venue': (Venue, 'main.show_venue', 'venue_id'),
+    'artist': (Artist, 'main.show_artist', 'artist_id'),
+}
+NON_WORD = re.compile(r'\W+')
+
+typeahead = Blueprint('typeahead', __name__)
+
+
+def normalize(text):
+    """ <text> casefolded, without accents or punctuation, one space between words. """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(NON_WORD.sub(' ', stripped.casefold()).split())
+
+
+def name_keys(name):
+    """ The index keys of <name>: its normalized form from each word on. """
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex(object):
+    """ Venue and artist names, searchable by the prefix of any word.
+
+    Keys are kept in one sorted list per upcoming show count, so a lookup
+    walks the counts from the highest down and stops at <limit> names,
+    however many names share a short prefix like "t".
+    """
+
+    def __init__(self, entities=()):
+        # (kind, id) -> (name, upcoming show count)
+        self.entities = {}
+        # upcoming show count -> sorted [(key, kind, id)]
+        self.tiers = {}
+        for kind, entity_id, name, upcoming in entities:
+            upcoming = upcoming or 0
+            self.entities[kind, entity_id] = (name, upcoming)
+            self.tiers.setdefault(upcoming, []).extend((key, kind, entity_id) for key in name_keys(name))
+        for keys in self.tiers.values():
+            keys.sort()
+        # Counts with a tier, ascending.
+        self.counts = sorted(self.tiers)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def _insert(self, kind, entity_id, name, upcoming):
+        self.entities[kind, entity_id] = (name, upcoming)
+        keys = self.tiers.get(upcoming)
+        if keys is None:
+            keys = self.tiers[upcoming] = []
+            insort(self.counts, upcoming)
+        for key in name_keys(name):
+            insort(keys, (key, kind, entity_id))
+
+    def _delete(self, kind, entity_id):
+        previous = self.entities.pop((kind, entity_id), None)
+        if previous is None:
+            return None
+        name, upcoming = previous
+        keys = self.tiers[upcoming]
+        for key in name_keys(name):
+            position = bisect_left(keys, (key, kind, entity_id))
+            if position < len(keys) and keys[position] == (key, kind, entity_id):
+                del keys[position]
+        if not keys:
+            del self.tiers[upcoming]
+            self.counts.remove(upcoming)
+        return previous
+
+    def add(self, kind, entity_id, name, upcoming=None):
+        """ Index a new or renamed entity; <upcoming> None keeps its count. """
+        with self._lock:
+            previous = self._delete(kind, entity_id)
+            if upcoming is None:
+                upcoming = previous[1] if previous is not None else 0
+            self._insert(kind, entity_id, name, upcoming)
+
+    def remove(self, kind, entity_id):
+        with self._lock:
+            self._delete(kind, entity_id)
+
+    def count_shows(self, kind, entity_id, delta):
+        with self._lock:
+            previous = self._delete(kind, entity_id)
+            if previous is not None:
+                self._insert(kind, entity_id, previous[0], max(previous[1] + delta, 0))
+
+    def search(self, query, limit):
+        """ Up to <limit> (kind, id, name, upcoming) matching <query>, most
+        upcoming shows first, then by the matching words.
+        """
+        prefix = normalize(query)
+        results = []
+        if not prefix:
+            return results
+        seen = set()
+        with self._lock:
+            for upcoming in reversed(self.counts):
+                keys = self.tiers[upcoming]
+                position = bisect_left(keys, (prefix,))
+                while position < len(keys) and keys[position][0].startswith(prefix):
+                    match = keys[position][1:]
+                    position += 1
+                    if match in seen:
+                        continue
+                    seen.add(match)
+                    results.append(match + self.entities[match])
+                    if len(results) == limit:
+                        return results
+        return results
+
+
+class Typeahead(object):
+    """ The index of an app: built on first use, rebuilt in the background
+    once older than <max_age> seconds.
+    """
+
+    def __init__(self, app, max_age):
+        self.app = app
+        self.max_age = max_age
+        self.index = None
+        self.built_at = 0
+        # (kind, id) of the entities changed since a rebuild started reading
+        # the names; None when no rebuild runs.
+        self._journal = None
+        # Held to change the index, write the journal and swap in a rebuilt index.
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def load(self, keys=None):
+        """ (kind, id, name, upcoming) of every venue and artist, or of the
+        (kind, id) <keys>.
+        """
+        entities = []
+        for kind, (model, _, _) in KINDS.items():
+            query = db.session.query(model.id, model.name, model.upcoming_shows_count)
+            if keys is not None:
+                ids = [entity_id for key_kind, entity_id in keys if key_kind == kind]
+                if not ids:
+                    continue
+                query = query.filter(model.id.in_(ids))
+            entities.extend((kind,) + tuple(row) for row in query)
+        return entities
+
+    def rebuild(self):
+        with self._lock:
+            self._journal = set()
+        try:
+            index = PrefixIndex(self.load())
+            with self._lock:
+                # The journaled entities as they are now: changed after the
+                # names were read, or before, and already in the new index.
+                # Reloading them instead of replaying the changes counts
+                # neither twice.
+                reloaded = self.load(self._journal)
+                for kind, entity_id, name, upcoming in reloaded:
+                    index.add(kind, entity_id, name, upcoming or 0)
+                for kind, entity_id in self._journal - {entity[:2] for entity in reloaded}:
+                    index.remove(kind, entity_id)
+                self.index, self._journal = index, None
+                self.built_at = time.monotonic()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception:
+            self.app.logger.exception('Typeahead rebuild failed')
+        finally:
+            self._building.release()
+
+    def get_index(self):
+        if self.index is None:
+            with self._building:
+                if self.index is None:
+                    self.rebuild()
+        elif self.max_age and time.monotonic() - self.built_at > self.max_age \
+                and self._building.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name='typeahead', daemon=True).start()
+        return self.index
+
+    def apply(self, change, kind, entity_id, *args):
+        with self._lock:
+            if self.index is not None:
+                getattr(self.index, change)(kind, entity_id, *args)
+            if self._journal is not None:
+                self._journal.add((kind, entity_id))
+
+
+def _apply(change, *args):
+    typeahead_state = current_app.extensions.get('typeahead')
+    if typeahead_state is not None:
+        typeahead_state.apply(change, *args)
+
+
+# The hooks below run after the views' commits and take the integer ids
+# the views wrote, never raw form data: nothing may fail past the commit.
+
+def index_name(kind, entity_id, name, upcoming=None):
+    """ Record a created or renamed venue or artist. """
+    _apply('add', kind, entity_id, name, upcoming)
+
+
+def unindex_name(kind, entity_id):
+    _apply('remove', kind, entity_id)
+
+
+def count_upcoming_show(venue_id, artist_id, delta=1):
+    _apply('count_shows', 'venue', venue_id, delta)
+    _apply('count_shows', 'artist', artist_id, delta)
+
+
+# A warm index answers without a query. The first request builds it: the
+# names of each kind, then again those of each kind changed meanwhile.
+@typeahead.route('/autocomplete')
+@query_budget(4)
+def autocomplete():
+    query = request.args.get('q', '')
+    limit = current_app.config['TYPEAHEAD_LIMIT']
+    index = current_app.extensions['typeahead'].get_index()
+    results = []
+    for kind, entity_id, name, upcoming in index.search(query, limit):
+        _, endpoint, argument = KINDS[kind]
+        results.append({
+            'type': kind,
+            'id': entity_id,
+            'name': name,
+            'num_upcoming_shows': upcoming,
+            'url': url_for(endpoint, **{argument: entity_id}),
+        })
+    return jsonify({'query': query, 'results': results})
+
+
+def init_typeahead(app):
+    app.extensions['typeahead'] = Typeahead(app, app.config.get('TYPEAHEAD_MAX_AGE'))
+    app.register_blueprint(typeahead)
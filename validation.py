@@ -0,0 +1,200 @@
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from scheduling import MAX_SHOW_DURATION
+
+# ----------------------------------------------------------------------------#
+# Record validation.
+#
+# The rules for venue, artist and show records, shared by the forms, the bulk
+# importer and anything else that accepts records. Allowed values are
+# frozensets and patterns are compiled once, at import.
+#
+# Validation is columnar: each field's values are checked in one tight loop
+# over the column, so a batch costs a few bound-method calls per value and no
+# per-record objects. Every field is checked; a record's errors cover all of
+# its invalid fields, as {field: [message]}.
+# ----------------------------------------------------------------------------#
+
+STATES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID',
+    'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM',
+    'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'PA',
+    'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+)
+
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+)
+
+VALID_STATES = frozenset(STATES)
+VALID_GENRES = frozenset(GENRES)
+
+# +2348194126780, +234.819.412.6780, +234-819-412-6780, +234 819 412 6780,
+# +234,819,412,6780, and the same with the country code in parentheses.
+PHONE_PATTERN = re.compile(
+    r'^\(?\+?([0-9]{3})\)?[-. ,]?([0-9]{3})\)?[-. ,]?([0-9]{3})[-. ,]?([0-9]{4})$'
+)
+# The shape WTForms' URL() accepts: a scheme, a host whose labels end in a
+# top level domain (or an IPv4 address), an optional port, path and query.
+URL_PATTERN = re.compile(
+    r'^[a-z]+://'
+    r'(((xn-|[a-z0-9_]+)(-[a-z0-9_-]+)?\.)+([a-z]{2,20}|xn--([a-z0-9]+-)*[a-z0-9]+)'
+    r'|((25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9])\.){3}(25[0-5]|2[0-4][0-9]|1[0-9]{2}|[1-9]?[0-9]))'
+    r'(:[0-9]+)?(/[^?]*)?(\?.*)?$',
+    re.IGNORECASE
+)
+
+BOOLEAN_FALSE = frozenset(('', '0', 'false', 'no', 'off'))
+
+REQUIRED = 'This field is required.'
+
+
+# Coercions turn a raw value (form data, JSON, CSV text) into the stored
+# type, raising ValueError or TypeError when they cannot.
+
+def text(value):
+    return value if value.__class__ is str else str(value)
+
+
+def flag(value):
+    if value.__class__ is bool:
+        return value
+    return str(value).strip().lower() not in BOOLEAN_FALSE
+
+
+def string_list(value):
+    """ A list as given, or a comma separated string. """
+    if value.__class__ is str:
+        return [item for item in map(str.strip, value.split(',')) if item]
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value]
+    return string_list(str(value))
+
+
+def timestamp(value):
+    """ A naive datetime in the server's local time, as datetime.now() gives
+    and start_time is stored. ISO 8601 strings may have fractions of a second
+    and a UTC offset.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+class Field(object):
+    """ How to validate one field: whether it must be present, how to coerce
+    it, and (predicate, message) checks on the coerced value, in order. Only
+    the first failing check of a field is reported.
+    """
+
+    def __init__(self, name, required=False, coerce=text, invalid='Not a valid value.',
+                 checks=(), default=None):
+        self.name = name
+        self.required = required
+        self.coerce = coerce
+        self.invalid = invalid
+        self.checks = checks
+        self.default = default
+
+    def validate_column(self, values, errors):
+        """ The coerced column; messages for invalid values are added to
+        <errors> ({index: {field: [message]}}).
+        """
+        name, required, coerce, invalid, default = \
+            self.name, self.required, self.coerce, self.invalid, self.default
+        checks = self.checks
+        # Strings are already text; skip the call for them.
+        coerce_text = coerce is not text
+        column = []
+        append = column.append
+        for index, value in enumerate(values):
+            if value.__class__ is str:
+                empty = not value or value.isspace()
+            else:
+                empty = value is None or value == []
+            if empty:
+                if required:
+                    errors[index][name] = [REQUIRED]
+                append(default)
+                continue
+            if coerce_text or value.__class__ is not str:
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError):
+                    errors[index][name] = [invalid]
+                    append(None)
+                    continue
+            for check, message in checks:
+                if not check(value):
+                    errors[index][name] = [message]
+                    break
+            append(value)
+        return column
+
+
+class Rules(object):
+    """ The fields of one kind of record. """
+
+    def __init__(self, *fields):
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+
+    def validate_columns(self, columns, size):
+        """ ({field: coerced column}, {index: errors}) for <size> records
+        given as {field: [value, ...]}. Missing columns count as empty.
+        """
+        errors = defaultdict(dict)
+        empty = [None] * size
+        coerced = {field.name: field.validate_column(columns.get(field.name, empty), errors)
+                   for field in self.fields}
+        return coerced, dict(errors)
+
+    def validate_batch(self, records):
+        """ ([coerced record, ...], {index: errors}) for a list of dicts. """
+        columns = {name: [record.get(name) for record in records] for name in self.names}
+        coerced, errors = self.validate_columns(columns, len(records))
+        rows = [dict(zip(self.names, values)) for values in zip(*[coerced[name] for name in self.names])]
+        return rows, errors
+
+    def validate(self, record):
+        """ (coerced record, errors) for one dict. """
+        rows, errors = self.validate_batch([record])
+        return rows[0], errors.get(0, {})
+
+
+_CONTACT_FIELDS = (
+    Field('name', required=True),
+    Field('city', required=True),
+    Field('state', required=True, checks=((VALID_STATES.__contains__, 'Invalid state.'),)),
+    Field('phone', required=True, checks=((PHONE_PATTERN.match, 'Invalid phone.'),)),
+    Field('image_link'),
+    Field('genres', required=True, coerce=string_list,
+          checks=((VALID_GENRES.issuperset, 'Invalid genres.'),)),
+    Field('facebook_link', required=True, checks=((URL_PATTERN.match, 'Invalid URL.'),)),
+    Field('website_link'),
+    Field('seeking_description'),
+)
+
+VENUE_RULES = Rules(
+    *_CONTACT_FIELDS[:3] + (Field('address', required=True),) + _CONTACT_FIELDS[3:] +
+    (Field('seeking_talent', coerce=flag, default=False),)
+)
+
+ARTIST_RULES = Rules(
+    *_CONTACT_FIELDS + (Field('seeking_venue', coerce=flag, default=False),)
+)
+
+SHOW_RULES = Rules(
+    Field('venue_id', required=True, coerce=int, invalid='Not a valid integer value.'),
+    Field('artist_id', required=True, coerce=int, invalid='Not a valid integer value.'),
+    Field('start_time', required=True, coerce=timestamp, invalid='Not a valid datetime value.'),
+    Field('duration_minutes', coerce=int, invalid='Not a valid integer value.',
+          checks=((lambda minutes: 1 <= minutes <= MAX_SHOW_DURATION,
+                   'Number must be between 1 and {}.'.format(MAX_SHOW_DURATION)),)),
+)
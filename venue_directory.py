@@ -0,0 +1,199 @@
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import Column, DDL, Integer, MetaData, String, Table, event, select, text
+
+from models import db, Show, SummaryRefresh, Venue
+from summaries import record_refresh, register_summary, summary_changes_query, summary_slots
+
+# ----------------------------------------------------------------------------#
+# Venue directory.
+#
+# /venues lists every venue grouped by (city, state). Instead of reading the
+# venues table in directory order on each request, the rows are kept
+# precomputed in `venue_directory`: a materialized view on PostgreSQL,
+# refreshed CONCURRENTLY so reads never wait on a refresh, and a summary
+# table on SQLite, rebuilt in one transaction.
+#
+# Transactions writing venues or shows count a change on the directory's
+# summary counters as they commit (summaries.py), and the directory is
+# refreshed right after the commit on a background thread. Changes committed by processes
+# without a refresher (`flask import`, ...) are picked up every
+# VENUE_DIRECTORY_REFRESH_INTERVAL seconds, or when /venues notices them.
+# A directory missing changes for more than VENUE_DIRECTORY_MAX_STALENESS
+# seconds is not served: /venues reads the venues table until it is
+# refreshed.
+# ----------------------------------------------------------------------------#
+
+DIRECTORY = 'venue_directory'
+
+# Outside db.metadata: create_all() would build it as a plain table. The DDL
+# below creates and drops it.
+venue_directory = Table(
+    DIRECTORY, MetaData(),
+    Column('venue_id', Integer, primary_key=True),
+    Column('city', String(120)),
+    Column('state', String(120)),
+    Column('name', String),
+    Column('upcoming_shows_count', Integer),
+)
+
+DIRECTORY_SELECT = ('SELECT id AS venue_id, city, state, name, '
+                    'COALESCE(upcoming_shows_count, 0) AS upcoming_shows_count FROM venues')
+
+CREATE_STATEMENTS = {
+    'postgresql': [
+        'CREATE MATERIALIZED VIEW IF NOT EXISTS venue_directory AS ' + DIRECTORY_SELECT,
+        # REFRESH ... CONCURRENTLY needs a unique index.
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_venue_directory_venue_id ON venue_directory (venue_id)',
+        'CREATE INDEX IF NOT EXISTS ix_venue_directory_city_state_name '
+        'ON venue_directory (city, state, name)',
+    ],
+    'sqlite': [
+        'CREATE TABLE IF NOT EXISTS venue_directory (venue_id INTEGER PRIMARY KEY, '
+        'city VARCHAR(120), state VARCHAR(120), name VARCHAR, upcoming_shows_count INTEGER)',
+        'CREATE INDEX IF NOT EXISTS ix_venue_directory_city_state_name '
+        'ON venue_directory (city, state, name)',
+        'INSERT OR REPLACE INTO venue_directory ' + DIRECTORY_SELECT,
+    ],
+}
+DROP_STATEMENTS = {
+    'postgresql': 'DROP MATERIALIZED VIEW IF EXISTS venue_directory',
+    'sqlite': 'DROP TABLE IF EXISTS venue_directory',
+}
+
+
+def _with_venues(ddl, target, bind, tables=(), **kw):
+    # Only alongside the venues table: create_all() also runs on the replica
+    # binds, which have no tables.
+    return any(table.name == 'venues' for table in tables)
+
+
+for _dialect, _statements in CREATE_STATEMENTS.items():
+    for _statement in _statements:
+        event.listen(db.metadata, 'after_create',
+                     DDL(_statement).execute_if(dialect=_dialect, callable_=_with_venues))
+    event.listen(db.metadata, 'before_drop',
+                 DDL(DROP_STATEMENTS[_dialect]).execute_if(dialect=_dialect, callable_=_with_venues))
+
+
+def _refresh_after_commit():
+    refresher = current_app.extensions.get('venue_directory')
+    if refresher is not None:
+        refresher.request_refresh()
+
+
+register_summary(DIRECTORY, (Venue, Show), ('venues', 'shows'), after_commit=_refresh_after_commit)
+
+
+# ----------------------------------------------------------------------------#
+# Refresh.
+# ----------------------------------------------------------------------------#
+
+def refresh_venue_directory(connection, force=False):
+    """ Rebuild the directory on <connection> if it is missing changes, or
+    always with <force>. Returns whether it was rebuilt.
+    """
+    table = SummaryRefresh.__table__
+    refreshed_changes = connection.execute(
+        select(table.c.refreshed_changes).where(table.c.name == DIRECTORY)
+    ).scalar()
+    slots = summary_slots(connection, DIRECTORY)
+    if refreshed_changes is None or (sum(slots.values()) == refreshed_changes and not force):
+        return False
+
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY venue_directory'))
+    else:
+        connection.execute(venue_directory.delete())
+        connection.execute(text('INSERT INTO venue_directory ' + DIRECTORY_SELECT))
+
+    # Writers that committed during the rebuild bumped a counter; the
+    # directory stays stale for them.
+    record_refresh(connection, DIRECTORY, slots)
+    return True
+
+
+class DirectoryRefresher(object):
+    """ Refreshes the directory of <app> when asked, on a daemon thread when
+    <background>, and every <interval> seconds when set.
+    """
+
+    def __init__(self, app, interval, background):
+        self.app = app
+        self.interval = interval or None
+        self.background = background
+        self.wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request_refresh(self):
+        if not self.background:
+            self.refresh()
+            return
+        self.start()
+        self.wake.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='venue-directory', daemon=True)
+                self._thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            with self.app.app_context():
+                self.refresh()
+
+    def refresh(self, force=False):
+        try:
+            with db.engine.begin() as connection:
+                return refresh_venue_directory(connection, force)
+        except Exception:
+            self.app.logger.exception('Venue directory refresh failed')
+            return False
+
+
+# ----------------------------------------------------------------------------#
+# Reads.
+# ----------------------------------------------------------------------------#
+
+def directory_state_query():
+    return summary_changes_query(DIRECTORY)
+
+
+def serve_venue_directory(state, now=None):
+    """ Whether /venues may read the directory whose summary state is
+    <state>, a row of directory_state_query(). A directory missing changes
+    gets a refresh queued.
+    """
+    if state is None:
+        return False
+    if state.changes == state.refreshed_changes:
+        return True
+    refresher = current_app.extensions.get('venue_directory')
+    if refresher is not None:
+        refresher.request_refresh()
+    max_staleness = timedelta(seconds=current_app.config['VENUE_DIRECTORY_MAX_STALENESS'])
+    return state.stale_since is not None and (now or datetime.now()) - state.stale_since <= max_staleness
+
+
+def init_venue_directory(app):
+    refresher = DirectoryRefresher(app, app.config.get('VENUE_DIRECTORY_REFRESH_INTERVAL'),
+                                   app.config.get('VENUE_DIRECTORY_BACKGROUND_REFRESH', True))
+    app.extensions['venue_directory'] = refresher
+
+    @app.cli.command('refresh-venue-directory')
+    def refresh_venue_directory_command():
+        """Rebuild the precomputed venue directory."""
+        with db.engine.begin() as connection:
+            refreshed = refresh_venue_directory(connection, force=True)
+        click.echo('Venue directory refreshed.' if refreshed else
+                   'No venue directory; run `flask db upgrade`.')
+
+    if refresher.interval:
+        refresher.start()